@@ -0,0 +1,97 @@
+"""
+CPU cost per message of each installed JSON backend on the queue and file hot paths.
+
+    python -m benchmarks.codec_bench [--software 200] [--number 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any
+
+from legacy.src.agent import codec
+from legacy.src.agent.inventory.providers import DEFAULT_SNAPSHOT_DIR, SimulatedProvider
+from legacy.src.agent.inventory.simulated import SimulatedRegistry
+from services.common.envelope import (
+    WIRE_FORMAT_JSON,
+    ResultMessage,
+    TaskMessage,
+    decode_result,
+    decode_task,
+    encode_result,
+    encode_task,
+)
+
+SNAPSHOT = DEFAULT_SNAPSHOT_DIR / "windows11_23h2.json"
+
+
+def build_payload(software_count: int) -> dict[str, Any]:
+    """Payload of the bundled snapshot with the software list grown to ``software_count`` entries."""
+    payload = SimulatedProvider(SimulatedRegistry.from_file(SNAPSHOT)).collect()
+    software = payload.get("software") or [{"DisplayName": "Program", "DisplayVersion": "1.0"}]
+    grown = []
+    for index in range(software_count):
+        entry = software[index % len(software)]
+        grown.append({**entry, "DisplayName": f"{entry['DisplayName']} {index}"})
+    payload["software"] = grown
+    return payload
+
+
+def cpu_us_per_op(operation: Callable[[], object], number: int) -> float:
+    operation()
+    started_at = time.process_time()
+    for _ in range(number):
+        operation()
+    return (time.process_time() - started_at) / number * 1_000_000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--software", type=int, default=200, help="software entries in the payload")
+    parser.add_argument("--number", type=int, default=2000, help="iterations per measurement")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    payload = build_payload(args.software)
+    task = TaskMessage(task_id=str(uuid.uuid4()), command="inventory", created_at=now)
+    result = ResultMessage(task_id=task.task_id, task_ids=[task.task_id], status="ok", payload=payload, ts=now)
+
+    cases: dict[str, Callable[[], object]] = {
+        "encode task": lambda: encode_task(task, WIRE_FORMAT_JSON),
+        "decode task": lambda: decode_task(encoded_task),
+        "encode result": lambda: encode_result(result, WIRE_FORMAT_JSON),
+        "decode result": lambda: decode_result(encoded_result),
+        "payload.json (indent=2)": lambda: codec.dumps(payload, pretty=True),
+    }
+
+    default = codec.CODEC
+    timings: dict[str, dict[str, float]] = {}
+    try:
+        for name, backend in codec.CODECS.items():
+            codec.CODEC = backend
+            encoded_task = encode_task(task, WIRE_FORMAT_JSON)
+            encoded_result = encode_result(result, WIRE_FORMAT_JSON)
+            timings[name] = {case: cpu_us_per_op(operation, args.number) for case, operation in cases.items()}
+    finally:
+        codec.CODEC = default
+
+    print(f"result message: {len(encode_result(result, WIRE_FORMAT_JSON))} bytes, CPU µs per operation")
+    backends = list(timings)
+    speedup = f"{'speedup':>11}" if len(backends) > 1 else ""
+    print(f"{'':<26}" + "".join(f"{name:>12}" for name in backends) + speedup)
+    for case in cases:
+        row = "".join(f"{timings[name][case]:>12.1f}" for name in backends)
+        if len(backends) > 1:
+            row += f"{timings[backends[0]][case] / timings[backends[-1]][case]:>10.1f}x"
+        print(f"{case:<26}{row}")
+    if codec.CODEC_ORJSON not in codec.CODECS:
+        print("orjson is not installed, only the stdlib backend was measured (pip install orjson)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
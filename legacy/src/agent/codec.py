@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import importlib
+import json
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+# JSON encoding for queue messages, the result store and payload.json. orjson
+# is used when installed (pip install orjson), stdlib json otherwise; both give
+# the same data back, but the bytes may differ (float formatting), so nothing
+# may depend on two backends producing identical output. Queue messages are
+# compact; only payload.json, which people read, is indented.
+
+CODEC_JSON = "json"
+CODEC_ORJSON = "orjson"
+
+
+@dataclass(frozen=True)
+class JsonCodec:
+    """A JSON backend: ``dumps(value, pretty)`` returns UTF-8 bytes, ``loads`` raises ValueError on bad input."""
+
+    name: str
+    dumps: Callable[[Any, bool], bytes]
+    loads: Callable[[bytes | str], Any]
+
+
+def _json_dumps(value: Any, pretty: bool) -> bytes:
+    if pretty:
+        return json.dumps(value, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _load_orjson() -> JsonCodec | None:
+    try:
+        orjson: Any = importlib.import_module("orjson")
+    except ImportError:
+        return None
+
+    def dumps(value: Any, pretty: bool) -> bytes:
+        return bytes(orjson.dumps(value, option=orjson.OPT_INDENT_2 if pretty else 0))
+
+    return JsonCodec(CODEC_ORJSON, dumps, orjson.loads)
+
+
+CODECS: dict[str, JsonCodec] = {CODEC_JSON: JsonCodec(CODEC_JSON, _json_dumps, json.loads)}
+_orjson = _load_orjson()
+if _orjson is not None:
+    CODECS[CODEC_ORJSON] = _orjson
+
+CODEC = CODECS.get(CODEC_ORJSON, CODECS[CODEC_JSON])
+
+
+def dumps(value: Any, pretty: bool = False) -> bytes:
+    return CODEC.dumps(value, pretty)
+
+
+def loads(data: bytes | str) -> Any:
+    return CODEC.loads(data)
@@ -4,6 +4,16 @@ from configparser import ConfigParser
 from dataclasses import dataclass
 from pathlib import Path
 
+from legacy.src.agent.inventory.collectors import DEFAULT_COLLECTORS, parse_collectors
+from legacy.src.agent.inventory.providers import (
+    DEFAULT_COLLECTOR_TIMEOUT_SECONDS,
+    DEFAULT_SNAPSHOT_DIR,
+    PROVIDER_WINREG,
+    ProviderSettings,
+    validate_provider_settings,
+)
+from legacy.src.agent.result_writer import DURABILITY_NONE, validate_durability
+
 
 @dataclass(frozen=True)
 class LoggingConfig:
@@ -23,11 +33,19 @@ class QueueConfig:
     put_timeout_seconds: float
 
 
+@dataclass(frozen=True)
+class ResultWriterConfig:
+    durability: str = DURABILITY_NONE
+    group_commit_seconds: float = 0.0
+
+
 @dataclass(frozen=True)
 class AppConfig:
     logging: LoggingConfig
     workers: WorkersConfig
     queue: QueueConfig
+    inventory: ProviderSettings
+    result_writer: ResultWriterConfig = ResultWriterConfig()
 
 
 def load_config(config_path: Path) -> AppConfig:
@@ -54,6 +72,26 @@ def load_config(config_path: Path) -> AppConfig:
     if put_timeout_seconds <= 0:
         raise ValueError("queue.put_timeout_seconds must be > 0")
 
+    snapshot_raw = Path(parser.get("inventory", "snapshot_path", fallback=str(DEFAULT_SNAPSHOT_DIR)))
+    inventory = validate_provider_settings(
+        ProviderSettings(
+            name=parser.get("inventory", "provider", fallback=PROVIDER_WINREG).lower().strip(),
+            collectors=parse_collectors(parser.get("inventory", "collectors", fallback=",".join(DEFAULT_COLLECTORS))),
+            collector_timeout_seconds=parser.getfloat(
+                "inventory", "collector_timeout_seconds", fallback=DEFAULT_COLLECTOR_TIMEOUT_SECONDS
+            ),
+            snapshot_path=snapshot_raw if snapshot_raw.is_absolute() else (config_path.parent / snapshot_raw).resolve(),
+            latency_ms=parser.getfloat("inventory", "latency_ms", fallback=0.0),
+            jitter_ms=parser.getfloat("inventory", "jitter_ms", fallback=0.0),
+            error_rate=parser.getfloat("inventory", "error_rate", fallback=0.0),
+        )
+    )
+
+    durability = validate_durability(parser.get("result_writer", "durability", fallback=DURABILITY_NONE))
+    group_commit_ms = parser.getfloat("result_writer", "group_commit_ms", fallback=0.0)
+    if group_commit_ms < 0:
+        raise ValueError("result_writer.group_commit_ms must be >= 0")
+
     return AppConfig(
         logging=LoggingConfig(level=log_level, log_path=log_dir),
         workers=WorkersConfig(inventory_workers=inventory_workers),
@@ -62,4 +100,6 @@ def load_config(config_path: Path) -> AppConfig:
             results_maxsize=results_maxsize,
             put_timeout_seconds=put_timeout_seconds,
         ),
+        inventory=inventory,
+        result_writer=ResultWriterConfig(durability=durability, group_commit_seconds=group_commit_ms / 1000),
     )
@@ -1,16 +1,27 @@
 from __future__ import annotations
 
 import logging
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
 from pathlib import Path
 from queue import Full, Queue
 
 INVENTORY_COMMAND = "inventory"
+READ_BUFFER_SIZE = 1 << 20
+
+
+@dataclass
+class DispatchResult:
+    accepted: int = 0
+    rejected: int = 0
+    throttled: int = 0
 
 
 def dispatch_commands(
     commands_file: Path,
     task_queue: Queue,
     put_timeout_seconds: float,
+    batch_size: int = 1,
 ) -> int:
     """
     Read commands from file and enqueue only allowed commands.
@@ -20,21 +31,120 @@ def dispatch_commands(
     if not commands_file.exists():
         raise FileNotFoundError(f"Commands file not found: {commands_file}")
 
-    accepted = 0
-    for line in commands_file.read_text(encoding="utf-8").splitlines():
+    result = dispatch_lines(
+        read_command_lines(commands_file),
+        task_queue=task_queue,
+        put_timeout_seconds=put_timeout_seconds,
+        batch_size=batch_size,
+    )
+    return result.accepted
+
+
+def read_command_lines(commands_file: Path) -> Iterator[str]:
+    """
+    Yield lines of a commands file one by one, without line terminators.
+
+    The file is read through a fixed-size buffer, so memory use does not
+    depend on the file size and the first command can be queued as soon as
+    the first line is read.
+    """
+    with commands_file.open("r", encoding="utf-8", buffering=READ_BUFFER_SIZE) as commands:
+        for line in commands:
+            yield line.rstrip("\r\n")
+
+
+def dispatch_lines(
+    lines: Iterable[str],
+    task_queue: Queue,
+    put_timeout_seconds: float,
+    batch_size: int = 1,
+) -> DispatchResult:
+    """
+    Validate command lines as they arrive and enqueue only allowed commands.
+
+    When ``batch_size`` > 1 and the queue provides ``put_many(items, timeout)``
+    (returning how many items were enqueued), accepted commands are handed
+    over in chunks of up to ``batch_size``.
+    """
+    put_many: Callable[..., int] | None = getattr(task_queue, "put_many", None) if batch_size > 1 else None
+    batcher = CommandBatcher(batch_size if put_many is not None else 1)
+
+    for line in lines:
+        batch = batcher.add(line)
+        if batch:
+            _enqueue(task_queue, put_many, batch, put_timeout_seconds, batcher)
+
+    tail = batcher.drain()
+    if tail:
+        _enqueue(task_queue, put_many, tail, put_timeout_seconds, batcher)
+
+    return batcher.result
+
+
+class CommandBatcher:
+    """
+    Validate command lines and group accepted commands into batches, without doing I/O.
+
+    Unsupported commands are counted as rejected and commands that did not
+    fit into the queue as throttled; blank lines are not counted at all.
+    """
+
+    def __init__(self, batch_size: int) -> None:
+        self._batch_size = max(batch_size, 1)
+        self._pending: list[str] = []
+        self.result = DispatchResult()
+
+    def add(self, line: str) -> list[str] | None:
+        """Consume one line; return a full batch when it is ready to be enqueued."""
         command = line.strip().lower()
         if not command:
-            continue
+            return None
 
         if command != INVENTORY_COMMAND:
             logging.info("Ignored unsupported command: %s", line.strip())
-            continue
+            self.result.rejected += 1
+            return None
 
+        self._pending.append(INVENTORY_COMMAND)
+        if len(self._pending) < self._batch_size:
+            return None
+        return self.drain()
+
+    def drain(self) -> list[str]:
+        """Return accepted commands not yet handed out."""
+        batch, self._pending = self._pending, []
+        return batch
+
+    def record(self, batch: Sequence[str], queued: int) -> None:
+        """Account for a batch of which ``queued`` commands were enqueued."""
+        if queued:
+            logging.info("Queued %s commands: %s", queued, INVENTORY_COMMAND)
+        if queued < len(batch):
+            logging.error("Task queue overflow: %s inventory commands skipped", len(batch) - queued)
+        self.result.accepted += queued
+        self.result.throttled += len(batch) - queued
+
+    def throttle(self, batch: Sequence[str]) -> None:
+        """Account for a batch not offered to the queue because an earlier one was throttled."""
+        self.result.throttled += len(batch)
+
+
+def _enqueue(
+    task_queue: Queue,
+    put_many: Callable[..., int] | None,
+    batch: Sequence[str],
+    timeout: float,
+    batcher: CommandBatcher,
+) -> None:
+    if put_many is not None:
+        batcher.record(batch, put_many(batch, timeout=timeout))
+        return
+
+    queued = 0
+    for command in batch:
         try:
-            task_queue.put(INVENTORY_COMMAND, timeout=put_timeout_seconds)
-            accepted += 1
-            logging.info("Queued command: %s", INVENTORY_COMMAND)
+            task_queue.put(command, timeout=timeout)
+            queued += 1
         except Full:
-            logging.error("Task queue overflow: inventory command skipped")
-
-    return accepted
+            pass
+    batcher.record(batch, queued)
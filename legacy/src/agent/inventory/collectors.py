@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import logging
+import re
+import time
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any
+
+from legacy.src.agent.inventory.windows_registry import (
+    REG_PATH,
+    FieldSpec,
+    as_number,
+    collect_windows_inventory,
+    pick_fields,
+    read_values,
+)
+
+# winreg access flags selecting the 64-bit (native) or 32-bit (WOW6432Node) registry view.
+KEY_WOW64_64KEY = 0x0100
+KEY_WOW64_32KEY = 0x0200
+
+UNINSTALL_PATH = r"Software\Microsoft\Windows\CurrentVersion\Uninstall"
+CBS_PACKAGES_PATH = r"Software\Microsoft\Windows\CurrentVersion\Component Based Servicing\Packages"
+SERVICES_PATH = r"System\CurrentControlSet\Services"
+
+# Payload key listing collectors that timed out or failed.
+ERRORS_SECTION = "collector_errors"
+
+SOFTWARE_FIELDS = (
+    FieldSpec("DisplayName"),
+    FieldSpec("DisplayVersion"),
+    FieldSpec("Publisher"),
+    FieldSpec("InstallDate"),
+)
+
+_SERVICE_START_TYPES = {0: "boot", 1: "system", 2: "automatic", 3: "manual", 4: "disabled"}
+# SERVICE_WIN32_OWN_PROCESS | SERVICE_WIN32_SHARE_PROCESS; anything else is a driver.
+_WIN32_SERVICE_TYPES = 0x10 | 0x20
+# Component Based Servicing package state "Installed".
+_CBS_INSTALLED = 112
+_KB_PATTERN = re.compile(r"KB(\d+)", re.IGNORECASE)
+
+
+def as_start_type(value: Any, value_type: int) -> str:
+    number = as_number(value, value_type)
+    return _SERVICE_START_TYPES.get(int(number), "") if number else ""
+
+
+SERVICE_FIELDS = (
+    FieldSpec("DisplayName"),
+    FieldSpec("Start", coerce=as_start_type),
+    FieldSpec("ImagePath"),
+    FieldSpec("ObjectName"),
+)
+
+
+@dataclass(frozen=True)
+class Collector:
+    """
+    One payload section and the keys whose last-write time reveals changes to it.
+
+    ``watched_keys`` are (path under HKLM, registry view flag) pairs. A value
+    change only touches the last-write time of its own key, so collectors that
+    read the subkeys of a watched key set ``watch_subkeys`` and the probe
+    checks every direct subkey too.
+    """
+
+    name: str
+    collect: Callable[[Any], Any]
+    watched_keys: tuple[tuple[str, int], ...]
+    watch_subkeys: bool = False
+
+
+def collect_os(winreg: Any) -> dict[str, str]:
+    return collect_windows_inventory(winreg)["os"]
+
+
+def collect_software(winreg: Any) -> list[dict[str, str]]:
+    """Installed programs from the Uninstall keys of the native and the 32-bit registry views."""
+    seen: set[tuple[str, str, str]] = set()
+    software: list[dict[str, str]] = []
+    for architecture, view in (("x64", KEY_WOW64_64KEY), ("x86", KEY_WOW64_32KEY)):
+        for _, values in iter_subkey_values(winreg, UNINSTALL_PATH, view):
+            entry = pick_fields(values, SOFTWARE_FIELDS)
+            if not entry["DisplayName"] or as_number(*values.get("systemcomponent", (0, 0))) == "1":
+                continue
+            identity = (entry["DisplayName"], entry["DisplayVersion"], entry["Publisher"])
+            # On 32-bit Windows both views are the same key.
+            if identity in seen:
+                continue
+            seen.add(identity)
+            entry["Architecture"] = architecture
+            software.append(entry)
+    return sorted(software, key=lambda entry: entry["DisplayName"].lower())
+
+
+def collect_hotfixes(winreg: Any) -> list[str]:
+    """Installed KB updates from Component Based Servicing packages."""
+    hotfixes: set[str] = set()
+    for name, values in iter_subkey_values(winreg, CBS_PACKAGES_PATH, name_filter=_KB_PATTERN.search):
+        match = _KB_PATTERN.search(name)
+        if match and as_number(*values.get("currentstate", (0, 0))) == str(_CBS_INSTALLED):
+            hotfixes.add(f"KB{match.group(1)}")
+    return sorted(hotfixes, key=lambda kb: int(kb[2:]))
+
+
+def collect_services(winreg: Any) -> list[dict[str, str]]:
+    """Win32 services (drivers are skipped) with start type and account."""
+    services: list[dict[str, str]] = []
+    for name, values in iter_subkey_values(winreg, SERVICES_PATH):
+        service_type = as_number(*values.get("type", (0, 0)))
+        if not service_type or not int(service_type) & _WIN32_SERVICE_TYPES:
+            continue
+        services.append({"Name": name, **pick_fields(values, SERVICE_FIELDS)})
+    return services
+
+
+COLLECTORS = {
+    collector.name: collector
+    for collector in (
+        Collector("os", collect_os, ((REG_PATH, 0),)),
+        Collector(
+            "software",
+            collect_software,
+            ((UNINSTALL_PATH, KEY_WOW64_64KEY), (UNINSTALL_PATH, KEY_WOW64_32KEY)),
+            watch_subkeys=True,
+        ),
+        Collector("hotfixes", collect_hotfixes, ((CBS_PACKAGES_PATH, 0),), watch_subkeys=True),
+        Collector("services", collect_services, ((SERVICES_PATH, 0),), watch_subkeys=True),
+    )
+}
+DEFAULT_COLLECTORS = tuple(COLLECTORS)
+
+
+def parse_collectors(raw: str) -> tuple[str, ...]:
+    """Parse a comma-separated collector list, e.g. ``"os, software"``."""
+    return tuple(name.strip().lower() for name in raw.split(",") if name.strip())
+
+
+def select_collectors(names: Sequence[str]) -> list[Collector]:
+    unknown = [name for name in names if name not in COLLECTORS]
+    if unknown:
+        raise ValueError(f"Unknown inventory collectors: {unknown}, expected some of {DEFAULT_COLLECTORS}")
+    if not names:
+        raise ValueError("At least one inventory collector must be enabled")
+    return [COLLECTORS[name] for name in names]
+
+
+def collector_executor(collectors: Sequence[Collector]) -> ThreadPoolExecutor:
+    """
+    Thread pool for repeated ``run_collectors`` calls.
+
+    It has room for a second set of collectors, so one that timed out and is
+    still running in the background does not delay the next collection.
+    Threads are only started when needed.
+    """
+    return ThreadPoolExecutor(max_workers=2 * max(len(collectors), 1), thread_name_prefix="inventory-collector")
+
+
+def run_collectors(
+    winreg: Any,
+    collectors: Sequence[Collector],
+    timeout_seconds: float,
+    executor: Executor | None = None,
+) -> dict[str, Any]:
+    """
+    Run collectors concurrently and merge their sections into one payload.
+
+    A collector that fails or does not finish within ``timeout_seconds`` is
+    left out and reported under ``collector_errors``; the other sections are
+    still returned. Timed-out collectors cannot be interrupted and finish in
+    the background. Callers collecting repeatedly pass a long-lived
+    ``executor`` (see ``collector_executor``); otherwise one is made per call.
+    """
+    own_executor = executor is None
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=len(collectors), thread_name_prefix="inventory-collector")
+    started_at = time.monotonic()
+    futures = {collector.name: executor.submit(collector.collect, winreg) for collector in collectors}
+    payload: dict[str, Any] = {}
+    errors: dict[str, str] = {}
+    try:
+        for name, future in futures.items():
+            remaining = started_at + timeout_seconds - time.monotonic()
+            try:
+                payload[name] = future.result(timeout=max(remaining, 0.0))
+            except FutureTimeoutError:
+                logging.error("inventory collector %s timed out after %.1fs", name, timeout_seconds)
+                errors[name] = f"timed out after {timeout_seconds:g}s"
+                future.cancel()
+            except Exception as exc:
+                logging.exception("inventory collector %s failed", name)
+                errors[name] = str(exc) or type(exc).__name__
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if errors:
+        payload[ERRORS_SECTION] = errors
+    return payload
+
+
+def watched_last_write_time(winreg: Any, collectors: Sequence[Collector]) -> int:
+    """
+    Latest last-write time among keys watched by ``collectors``; missing keys are skipped.
+
+    With ``watch_subkeys`` each direct subkey is opened for ``QueryInfoKey``
+    as well; values are not read, so this stays far cheaper than collecting.
+    """
+    latest = 0
+    for collector in collectors:
+        for path, view in collector.watched_keys:
+            access = winreg.KEY_READ | view
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path, 0, access) as key:
+                    subkey_count, _, last_write_time = winreg.QueryInfoKey(key)
+                    latest = max(latest, int(last_write_time))
+                    if collector.watch_subkeys:
+                        latest = max(latest, _subkeys_last_write_time(winreg, key, subkey_count, access))
+            except FileNotFoundError:
+                continue
+    return latest
+
+
+def _subkeys_last_write_time(winreg: Any, parent: Any, subkey_count: int, access: int) -> int:
+    latest = 0
+    for index in range(subkey_count):
+        try:
+            with winreg.OpenKey(parent, winreg.EnumKey(parent, index), 0, access) as key:
+                latest = max(latest, int(winreg.QueryInfoKey(key)[2]))
+        except OSError:
+            continue
+    return latest
+
+
+def iter_subkey_values(
+    winreg: Any,
+    path: str,
+    view: int = 0,
+    name_filter: Callable[[str], Any] | None = None,
+) -> Iterator[tuple[str, dict[str, tuple[Any, int]]]]:
+    """
+    Yield (subkey name, values) for every subkey of an HKLM key, one enumeration pass per subkey.
+
+    Subkeys that vanish or deny access while enumerating are skipped; so is a missing parent key.
+    """
+    access = winreg.KEY_READ | view
+    try:
+        parent = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path, 0, access)
+    except FileNotFoundError:
+        return
+    with parent:
+        subkey_count, _, _ = winreg.QueryInfoKey(parent)
+        for index in range(subkey_count):
+            name = winreg.EnumKey(parent, index)
+            if name_filter is not None and not name_filter(name):
+                continue
+            try:
+                with winreg.OpenKey(parent, name, 0, access) as key:
+                    values = read_values(winreg, key)
+            except OSError:
+                continue
+            yield name, values
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Protocol
+
+from legacy.src.agent.inventory.collectors import (
+    DEFAULT_COLLECTORS,
+    Collector,
+    collector_executor,
+    run_collectors,
+    select_collectors,
+    watched_last_write_time,
+)
+from legacy.src.agent.inventory.simulated import SimulatedRegistry, iter_snapshot_files
+from legacy.src.agent.inventory.windows_registry import import_winreg
+
+PROVIDER_WINREG = "winreg"
+PROVIDER_SIMULATED = "simulated"
+PROVIDERS = (PROVIDER_WINREG, PROVIDER_SIMULATED)
+
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parent / "snapshots"
+DEFAULT_COLLECTOR_TIMEOUT_SECONDS = 30.0
+
+
+class InventoryProvider(Protocol):
+    name: str
+
+    def collect(self) -> dict[str, Any]:
+        """Collect the inventory payload."""
+        ...
+
+    def last_write_time(self) -> int:
+        """Cheap probe that changes whenever ``collect()`` may return something new."""
+        ...
+
+
+class SimulatedInventoryError(RuntimeError):
+    """Failure injected by the simulated provider."""
+
+
+@dataclass(frozen=True)
+class ProviderSettings:
+    name: str = PROVIDER_WINREG
+    collectors: tuple[str, ...] = DEFAULT_COLLECTORS
+    collector_timeout_seconds: float = DEFAULT_COLLECTOR_TIMEOUT_SECONDS
+    snapshot_path: Path = DEFAULT_SNAPSHOT_DIR
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+
+class WinregProvider:
+    """Reads the live registry through ``winreg``; Windows only."""
+
+    name = PROVIDER_WINREG
+
+    def __init__(
+        self,
+        collectors: list[Collector] | None = None,
+        collector_timeout_seconds: float = DEFAULT_COLLECTOR_TIMEOUT_SECONDS,
+    ) -> None:
+        self._collectors = collectors or select_collectors(DEFAULT_COLLECTORS)
+        self._collector_timeout_seconds = collector_timeout_seconds
+        self._executor = collector_executor(self._collectors)
+
+    def collect(self) -> dict[str, Any]:
+        return run_collectors(import_winreg(), self._collectors, self._collector_timeout_seconds, self._executor)
+
+    def last_write_time(self) -> int:
+        return watched_last_write_time(import_winreg(), self._collectors)
+
+
+class SimulatedProvider:
+    """
+    Runs the real collectors against a registry snapshot, for tests and load tests off Windows.
+
+    Each ``collect()`` sleeps ``latency_ms`` ± ``jitter_ms`` and fails with
+    probability ``error_rate``, mimicking slow or broken hosts.
+    """
+
+    name = PROVIDER_SIMULATED
+
+    def __init__(
+        self,
+        registry: SimulatedRegistry,
+        collectors: list[Collector] | None = None,
+        collector_timeout_seconds: float = DEFAULT_COLLECTOR_TIMEOUT_SECONDS,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._registry = registry
+        self._collectors = collectors or select_collectors(DEFAULT_COLLECTORS)
+        self._collector_timeout_seconds = collector_timeout_seconds
+        self._executor = collector_executor(self._collectors)
+        self._latency_ms = latency_ms
+        self._jitter_ms = jitter_ms
+        self._error_rate = error_rate
+        self._rng = rng or random.Random()
+
+    def collect(self) -> dict[str, Any]:
+        delay_ms = self._latency_ms + self._rng.uniform(-self._jitter_ms, self._jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if self._error_rate and self._rng.random() < self._error_rate:
+            raise SimulatedInventoryError("simulated registry read failure")
+        return run_collectors(self._registry, self._collectors, self._collector_timeout_seconds, self._executor)
+
+    def last_write_time(self) -> int:
+        return watched_last_write_time(self._registry, self._collectors)
+
+
+def validate_provider_settings(settings: ProviderSettings) -> ProviderSettings:
+    if settings.name not in PROVIDERS:
+        raise ValueError(f"Unsupported inventory provider: {settings.name!r}, expected one of {PROVIDERS}")
+    if settings.latency_ms < 0 or settings.jitter_ms < 0:
+        raise ValueError("inventory provider latency and jitter must be >= 0")
+    if not 0.0 <= settings.error_rate <= 1.0:
+        raise ValueError("inventory provider error rate must be between 0 and 1")
+    if settings.collector_timeout_seconds <= 0:
+        raise ValueError("inventory collector timeout must be > 0")
+    select_collectors(settings.collectors)
+    return settings
+
+
+def create_provider(settings: ProviderSettings, rng: random.Random | None = None) -> InventoryProvider:
+    """
+    Build the configured provider.
+
+    With a snapshot directory, the simulated provider picks one snapshot at
+    random, so a fleet of simulated workers reports a mix of hosts.
+    """
+    settings = validate_provider_settings(settings)
+    collectors = select_collectors(settings.collectors)
+    if settings.name == PROVIDER_WINREG:
+        return WinregProvider(collectors, settings.collector_timeout_seconds)
+
+    rng = rng or random.Random()
+    snapshots = list(iter_snapshot_files(settings.snapshot_path))
+    if not snapshots:
+        raise FileNotFoundError(f"No registry snapshots found in {settings.snapshot_path}")
+    return SimulatedProvider(
+        SimulatedRegistry.from_file(rng.choice(snapshots)),
+        collectors,
+        settings.collector_timeout_seconds,
+        latency_ms=settings.latency_ms,
+        jitter_ms=settings.jitter_ms,
+        error_rate=settings.error_rate,
+        rng=rng,
+    )
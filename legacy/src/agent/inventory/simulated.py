@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from legacy.src.agent.inventory.windows_registry import REG_DWORD, REG_EXPAND_SZ, REG_MULTI_SZ, REG_QWORD, REG_SZ
+
+# Root key and access flags of the real winreg module.
+HKEY_LOCAL_MACHINE = "HKEY_LOCAL_MACHINE"
+KEY_READ = 0x20019
+KEY_WOW64_64KEY = 0x0100
+KEY_WOW64_32KEY = 0x0200
+_WOW64_ROOT = f"{HKEY_LOCAL_MACHINE}\\Software\\".lower()
+
+_ERROR_NO_MORE_ITEMS = 259
+
+
+@dataclass
+class SimulatedKey:
+    path: str
+    values: dict[str, tuple[Any, int]] = field(default_factory=dict)
+    subkeys: list[str] = field(default_factory=list)
+    last_write_time: int = 0
+
+    def __enter__(self) -> SimulatedKey:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.Close()
+
+    def Close(self) -> None:
+        """Keys hold no handles; kept for winreg API compatibility."""
+
+
+class SimulatedRegistry:
+    """
+    In-memory stand-in for the ``winreg`` module built from a registry snapshot.
+
+    Implements the subset used by the collectors: ``OpenKey``, ``QueryValueEx``,
+    ``QueryInfoKey``, ``EnumValue`` and ``EnumKey``. Key paths are matched
+    case-insensitively, like in the real registry, and ``KEY_WOW64_32KEY``
+    redirects ``Software`` to ``Software\\WOW6432Node``. A snapshot is a JSON object::
+
+        {
+          "last_write_time": 133497000000000000,
+          "keys": {
+            "HKEY_LOCAL_MACHINE\\\\Software\\\\Microsoft\\\\Windows NT\\\\CurrentVersion": {
+              "ProductName": "Windows 10 Pro",
+              "UBR": 3448
+            }
+          }
+        }
+
+    Integers become REG_DWORD (REG_QWORD when they do not fit), strings
+    REG_SZ and lists REG_MULTI_SZ. Parent keys are created implicitly.
+    """
+
+    REG_SZ = REG_SZ
+    REG_EXPAND_SZ = REG_EXPAND_SZ
+    REG_DWORD = REG_DWORD
+    REG_MULTI_SZ = REG_MULTI_SZ
+    REG_QWORD = REG_QWORD
+    HKEY_LOCAL_MACHINE = HKEY_LOCAL_MACHINE
+    KEY_READ = KEY_READ
+    KEY_WOW64_64KEY = KEY_WOW64_64KEY
+    KEY_WOW64_32KEY = KEY_WOW64_32KEY
+
+    def __init__(self, keys: dict[str, dict[str, Any]], last_write_time: int = 0) -> None:
+        self._keys: dict[str, SimulatedKey] = {}
+        for path, values in keys.items():
+            key = self._ensure_key(path, last_write_time)
+            key.values.update({name: _typed_value(value) for name, value in values.items()})
+
+    @classmethod
+    def from_file(cls, path: Path) -> SimulatedRegistry:
+        snapshot = json.loads(path.read_text(encoding="utf-8"))
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("keys"), dict):
+            raise ValueError(f"Registry snapshot must be an object with 'keys': {path}")
+        return cls(snapshot["keys"], last_write_time=int(snapshot.get("last_write_time", 0)))
+
+    def OpenKey(self, key: str | SimulatedKey, sub_key: str, reserved: int = 0, access: int = KEY_READ) -> SimulatedKey:
+        del reserved
+        parent = key.path if isinstance(key, SimulatedKey) else key
+        path = _join(parent, sub_key)
+        if access & KEY_WOW64_32KEY:
+            path = _wow64_path(path)
+        found = self._keys.get(path.lower())
+        if found is None:
+            raise FileNotFoundError(2, "The system cannot find the file specified", path)
+        return found
+
+    def CloseKey(self, key: SimulatedKey) -> None:
+        key.Close()
+
+    def QueryValueEx(self, key: SimulatedKey, value_name: str) -> tuple[Any, int]:
+        for name, value in key.values.items():
+            if name.lower() == value_name.lower():
+                return value
+        raise FileNotFoundError(2, "The system cannot find the file specified", value_name)
+
+    def QueryInfoKey(self, key: SimulatedKey) -> tuple[int, int, int]:
+        return len(key.subkeys), len(key.values), key.last_write_time
+
+    def EnumValue(self, key: SimulatedKey, index: int) -> tuple[str, Any, int]:
+        items = list(key.values.items())
+        if index >= len(items):
+            raise OSError(_ERROR_NO_MORE_ITEMS, "No more data is available")
+        name, (value, value_type) = items[index]
+        return name, value, value_type
+
+    def EnumKey(self, key: SimulatedKey, index: int) -> str:
+        if index >= len(key.subkeys):
+            raise OSError(_ERROR_NO_MORE_ITEMS, "No more data is available")
+        return key.subkeys[index]
+
+    def _ensure_key(self, path: str, last_write_time: int) -> SimulatedKey:
+        existing = self._keys.get(path.lower())
+        if existing is not None:
+            return existing
+
+        key = SimulatedKey(path=path, last_write_time=last_write_time)
+        self._keys[path.lower()] = key
+        parent_path, sep, name = path.rpartition("\\")
+        if sep:
+            self._ensure_key(parent_path, last_write_time).subkeys.append(name)
+        return key
+
+
+def iter_snapshot_files(snapshot_path: Path) -> Iterator[Path]:
+    """Snapshot file itself, or every ``*.json`` file of a snapshot directory."""
+    if snapshot_path.is_dir():
+        yield from sorted(snapshot_path.glob("*.json"))
+    else:
+        yield snapshot_path
+
+
+def _join(parent: str, sub_key: str) -> str:
+    sub_key = sub_key.strip("\\")
+    return f"{parent}\\{sub_key}" if sub_key else parent
+
+
+def _wow64_path(path: str) -> str:
+    if not path.lower().startswith(_WOW64_ROOT) or path.lower().startswith(_WOW64_ROOT + "wow6432node"):
+        return path
+    prefix = path[: len(_WOW64_ROOT)]
+    return f"{prefix}WOW6432Node\\{path[len(_WOW64_ROOT) :]}"
+
+
+def _typed_value(value: Any) -> tuple[Any, int]:
+    if isinstance(value, bool):
+        return int(value), REG_DWORD
+    if isinstance(value, int):
+        return value, REG_DWORD if 0 <= value < 1 << 32 else REG_QWORD
+    if isinstance(value, list):
+        return [str(item) for item in value], REG_MULTI_SZ
+    return str(value), REG_SZ
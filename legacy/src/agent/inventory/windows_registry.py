@@ -1,40 +1,98 @@
 from __future__ import annotations
 
 import importlib
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
 from typing import Any
 
 REG_PATH = r"Software\Microsoft\Windows NT\CurrentVersion"
 
+# Registry value types (same numbers as the winreg constants).
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+REG_QWORD = 11
 
-def collect_windows_inventory() -> dict[str, dict[str, str]]:
-    """Collect OS details from Windows registry."""
-    try:
-        winreg = importlib.import_module("winreg")
-    except ImportError as exc:
-        raise RuntimeError("winreg is available only on Windows") from exc
 
-    fields = {
-        "ProductName": "",
-        "DisplayVersion": "",
-        "CurrentBuild": "",
-        "UBR": "",
-        "InstallDate": "",
-        "EditionID": "",
-    }
+def as_text(value: Any, value_type: int) -> str:
+    if value_type == REG_MULTI_SZ and isinstance(value, list):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def as_number(value: Any, value_type: int) -> str:
+    """DWORD/QWORD as a decimal string; numeric REG_SZ is accepted, anything else is blank."""
+    if value_type in (REG_DWORD, REG_QWORD) and isinstance(value, int):
+        return str(value)
+    text = str(value).strip()
+    return str(int(text)) if text.isdigit() else ""
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """Payload field read from the first present value of ``name`` and then ``fallbacks``."""
+
+    name: str
+    fallbacks: tuple[str, ...] = ()
+    coerce: Callable[[Any, int], str] = as_text
+
 
+OS_FIELDS = (
+    FieldSpec("ProductName"),
+    FieldSpec("DisplayVersion", fallbacks=("ReleaseId",)),
+    FieldSpec("CurrentBuild", fallbacks=("CurrentBuildNumber",)),
+    FieldSpec("UBR", coerce=as_number),
+    FieldSpec("InstallDate", coerce=as_number),
+    FieldSpec("EditionID"),
+)
+
+
+def collect_windows_inventory(winreg_module: Any | None = None) -> dict[str, dict[str, str]]:
+    """
+    Collect OS details from Windows registry.
+
+    ``winreg_module`` replaces the real ``winreg``, e.g. with a simulated registry.
+    """
+    winreg = winreg_module or import_winreg()
     with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, REG_PATH) as key:
-        for name in list(fields):
-            fields[name] = _read_reg_string(winreg, key, name)
+        values = read_values(winreg, key)
+    return {"os": pick_fields(values, OS_FIELDS)}
+
+
+def read_values(winreg_module: Any, key: Any) -> dict[str, tuple[Any, int]]:
+    """
+    Read all values of an open key in one pass: QueryInfoKey, then EnumValue per value.
 
-        if not fields["DisplayVersion"]:
-            fields["DisplayVersion"] = _read_reg_string(winreg, key, "ReleaseId")
+    Returns ``{lowercased name: (data, type)}``; registry value names are case-insensitive.
+    """
+    _, value_count, _ = winreg_module.QueryInfoKey(key)
+    values: dict[str, tuple[Any, int]] = {}
+    for index in range(value_count):
+        name, data, value_type = winreg_module.EnumValue(key, index)
+        values[name.lower()] = (data, value_type)
+    return values
 
-    return {"os": fields}
 
+def pick_fields(values: dict[str, tuple[Any, int]], specs: Sequence[FieldSpec]) -> dict[str, str]:
+    """Build payload fields from enumerated values; absent or blank values fall through to fallbacks."""
+    fields: dict[str, str] = {}
+    for spec in specs:
+        fields[spec.name] = ""
+        for source in (spec.name, *spec.fallbacks):
+            found = values.get(source.lower())
+            if found is None:
+                continue
+            text = spec.coerce(*found)
+            if text:
+                fields[spec.name] = text
+                break
+    return fields
 
-def _read_reg_string(winreg_module: Any, key: Any, name: str) -> str:
+
+def import_winreg() -> Any:
+    """Return the ``winreg`` module; raises RuntimeError off Windows."""
     try:
-        value, _ = winreg_module.QueryValueEx(key, name)
-    except FileNotFoundError:
-        return ""
-    return str(value)
+        return importlib.import_module("winreg")
+    except ImportError as exc:
+        raise RuntimeError("winreg is available only on Windows") from exc
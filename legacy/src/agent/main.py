@@ -3,6 +3,7 @@ from __future__ import annotations
 import argparse
 import logging
 import sys
+import time
 from pathlib import Path
 from queue import Empty, Full, Queue
 from threading import Thread
@@ -10,9 +11,15 @@ from typing import Any
 
 from legacy.src.agent.config import AppConfig, load_config
 from legacy.src.agent.dispatcher import INVENTORY_COMMAND, dispatch_commands
-from legacy.src.agent.inventory.windows_registry import collect_windows_inventory
+from legacy.src.agent.inventory.providers import InventoryProvider, create_provider
 from legacy.src.agent.logging_setup import setup_logging
-from legacy.src.agent.result_writer import write_payload_atomic
+from legacy.src.agent.result_writer import (
+    DURABILITY_NONE,
+    FsyncStats,
+    PayloadFingerprints,
+    payload_fingerprint,
+    write_payload_atomic,
+)
 
 TASK_STOP = object()
 RESULT_STOP = object()
@@ -43,6 +50,7 @@ def inventory_worker(
     task_queue: Queue,
     result_queue: Queue,
     config: AppConfig,
+    provider: InventoryProvider,
 ) -> None:
     while True:
         task = task_queue.get()
@@ -56,7 +64,7 @@ def inventory_worker(
                 continue
 
             try:
-                payload: dict[str, Any] = collect_windows_inventory()
+                payload: dict[str, Any] = provider.collect()
                 if not payload["os"].get("DisplayVersion"):
                     logging.warning(
                         "Worker-%s: DisplayVersion missing; fallback value may be used",
@@ -81,29 +89,72 @@ def result_writer(
     result_queue: Queue,
     payload_path: Path,
     workers_count: int,
+    durability: str = DURABILITY_NONE,
+    group_commit_seconds: float = 0.0,
 ) -> None:
+    """
+    Write results to payload.json.
+
+    With ``group_commit_seconds`` > 0, results arriving within that window
+    after the first one form a batch: only the newest is written, so one
+    write (and fsync) covers the whole batch.
+
+    A payload identical to the one last written (or found on disk at start)
+    is not written again; such writes are counted as skipped.
+    """
+    stats = FsyncStats()
+    fingerprints = PayloadFingerprints()
     stopped_workers = 0
     while stopped_workers < workers_count:
         try:
-            result = result_queue.get(timeout=0.5)
+            batch = [result_queue.get(timeout=0.5)]
         except Empty:
             continue
+        deadline = time.monotonic() + group_commit_seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(result_queue.get(timeout=remaining))
+            except Empty:
+                break
 
         try:
-            if result is RESULT_STOP:
-                stopped_workers += 1
+            latest = None
+            for result in batch:
+                if result is RESULT_STOP:
+                    stopped_workers += 1
+                    continue
+                if "os" not in result:
+                    logging.error("ResultWriter got error payload: %s", result)
+                else:
+                    latest = result
+            if latest is None:
                 continue
 
-            if "os" not in result:
-                logging.error("ResultWriter got error payload: %s", result)
+            fingerprint = payload_fingerprint(latest)
+            if fingerprints.is_unchanged(payload_path, fingerprint):
+                stats.record_skip()
+                logging.info("payload.json unchanged, write skipped: %s", payload_path)
                 continue
 
-            write_payload_atomic(payload_path, result)
-            logging.info("payload.json updated: %s", payload_path)
+            try:
+                fsync_seconds = write_payload_atomic(payload_path, latest, durability)
+            except Exception:
+                fingerprints.forget(payload_path)
+                raise
+            fingerprints.commit(payload_path, fingerprint)
+            stats.record(1, fsync_seconds)
+            logging.info(
+                "payload.json updated: %s (%s result(s), fsync %.1f ms)",
+                payload_path,
+                sum(result is not RESULT_STOP for result in batch),
+                fsync_seconds * 1000,
+            )
         except Exception:
             logging.exception("ResultWriter failed to write payload")
         finally:
-            result_queue.task_done()
+            for _ in batch:
+                result_queue.task_done()
+    logging.info("ResultWriter fsync stats: %s", stats.as_dict())
 
 
 def main() -> int:
@@ -119,17 +170,24 @@ def main() -> int:
     try:
         config = load_config(config_path)
         log_file = setup_logging(config.logging.log_path, config.logging.level)
+        provider = create_provider(config.inventory)
     except Exception as exc:
         print(f"Failed to initialize app: {exc}", file=sys.stderr)
         return 1
 
-    logging.info("Agent started, log file: %s", log_file)
+    logging.info("Agent started, log file: %s, inventory provider: %s", log_file, provider.name)
     task_queue: Queue = Queue(maxsize=config.queue.tasks_maxsize)
     result_queue: Queue = Queue(maxsize=config.queue.results_maxsize)
 
     writer_thread = Thread(
         target=result_writer,
-        args=(result_queue, payload_path, config.workers.inventory_workers),
+        args=(
+            result_queue,
+            payload_path,
+            config.workers.inventory_workers,
+            config.result_writer.durability,
+            config.result_writer.group_commit_seconds,
+        ),
         daemon=True,
         name="ResultWriter",
     )
@@ -138,7 +196,7 @@ def main() -> int:
     workers = [
         Thread(
             target=inventory_worker,
-            args=(idx + 1, task_queue, result_queue, config),
+            args=(idx + 1, task_queue, result_queue, config, provider),
             daemon=True,
             name=f"InventoryWorker-{idx + 1}",
         )
@@ -1,21 +1,165 @@
 from __future__ import annotations
 
-import json
+import hashlib
+import logging
+import os
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
 from pathlib import Path
 from tempfile import NamedTemporaryFile
+from typing import Any
 
+from legacy.src.agent.codec import dumps, loads
 
-def write_payload_atomic(payload_path: Path, payload: dict[str, dict[str, str]]) -> None:
-    """Write payload.json atomically to keep file consistent on failures."""
-    payload_path.parent.mkdir(parents=True, exist_ok=True)
-    with NamedTemporaryFile(
-        "w",
-        encoding="utf-8",
-        dir=payload_path.parent,
-        delete=False,
-    ) as temp_file:
-        json.dump(payload, temp_file, indent=2, ensure_ascii=False)
-        temp_file.write("\n")
-        temp_name = temp_file.name
-
-    Path(temp_name).replace(payload_path)
+# What a payload write survives once it returns: "none" leaves the data in the
+# page cache (a power loss may lose or, on some filesystems, empty the file),
+# "fsync-file" flushes the file contents before the rename, and
+# "fsync-file-and-dir" also flushes the directory so the rename itself is durable.
+DURABILITY_NONE = "none"
+DURABILITY_FSYNC_FILE = "fsync-file"
+DURABILITY_FSYNC_FILE_AND_DIR = "fsync-file-and-dir"
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_FSYNC_FILE, DURABILITY_FSYNC_FILE_AND_DIR)
+
+
+@dataclass
+class FsyncStats:
+    """
+    Time spent in fsync by payload flushes, to weigh latency against durability,
+    and the number of writes skipped because the payload was unchanged.
+    """
+
+    flushes: int = 0
+    files: int = 0
+    skipped: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, files: int, seconds: float) -> None:
+        self.flushes += 1
+        self.files += files
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def record_skip(self) -> None:
+        self.skipped += 1
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "flushes": self.flushes,
+            "files": self.files,
+            "skipped": self.skipped,
+            "fsync_ms_total": round(self.total_seconds * 1000, 3),
+            "fsync_ms_max": round(self.max_seconds * 1000, 3),
+        }
+
+
+def payload_fingerprint(payload: dict[str, Any]) -> str:
+    """Digest of the payload content; cheaper than the indented dump it stands for."""
+    return hashlib.blake2b(dumps(payload), digest_size=16).hexdigest()
+
+
+def read_payload_fingerprint(payload_path: Path) -> str | None:
+    """Fingerprint of the payload file on disk; None when it is missing or unreadable."""
+    try:
+        payload = loads(payload_path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logging.warning("cannot read %s, the next payload will be written", payload_path)
+        return None
+    return payload_fingerprint(payload) if isinstance(payload, dict) else None
+
+
+class PayloadFingerprints:
+    """
+    Fingerprint of the last payload committed to each file.
+
+    A file's fingerprint is read from disk on first use, so an unchanged
+    payload is not rewritten after a restart either. Call ``forget`` after a
+    failed write: the file is then read again.
+    """
+
+    def __init__(self) -> None:
+        self._committed: dict[Path, str | None] = {}
+
+    def is_unchanged(self, payload_path: Path, fingerprint: str) -> bool:
+        if payload_path not in self._committed:
+            self._committed[payload_path] = read_payload_fingerprint(payload_path)
+        return self._committed[payload_path] == fingerprint
+
+    def commit(self, payload_path: Path, fingerprint: str) -> None:
+        self._committed[payload_path] = fingerprint
+
+    def forget(self, payload_path: Path) -> None:
+        self._committed.pop(payload_path, None)
+
+
+def validate_durability(mode: str) -> str:
+    normalized = mode.strip().lower()
+    if normalized not in DURABILITY_MODES:
+        raise ValueError(f"Unsupported durability mode: {mode!r}, expected one of {DURABILITY_MODES}")
+    return normalized
+
+
+def write_payload_atomic(
+    payload_path: Path,
+    payload: dict[str, Any],
+    durability: str = DURABILITY_NONE,
+) -> float:
+    """
+    Write payload.json atomically to keep file consistent on failures.
+
+    Returns the seconds spent in fsync.
+    """
+    return write_payloads_atomic([(payload_path, payload)], durability)
+
+
+def write_payloads_atomic(
+    items: Sequence[tuple[Path, dict[str, Any]]],
+    durability: str = DURABILITY_NONE,
+) -> float:
+    """
+    Group commit: write several payload files atomically under one durability barrier.
+
+    All temp files are written and fsynced first, then renamed, and each
+    directory is fsynced once for all renames in it. Returns the seconds
+    spent in fsync. Directories are not fsynced on Windows, which cannot
+    open them; NTFS journals the rename itself.
+    """
+    fsync_seconds = 0.0
+    staged: list[tuple[Path, Path]] = []
+    try:
+        for payload_path, payload in items:
+            data = dumps(payload, pretty=True) + b"\n"
+            payload_path.parent.mkdir(parents=True, exist_ok=True)
+            with NamedTemporaryFile(dir=payload_path.parent, delete=False) as temp_file:
+                staged.append((Path(temp_file.name), payload_path))
+                temp_file.write(data)
+                if durability != DURABILITY_NONE:
+                    temp_file.flush()
+                    started_at = time.perf_counter()
+                    os.fsync(temp_file.fileno())
+                    fsync_seconds += time.perf_counter() - started_at
+        for temp_path, payload_path in staged:
+            temp_path.replace(payload_path)
+    except BaseException:
+        # Renamed temp files are gone already.
+        for temp_path, _ in staged:
+            temp_path.unlink(missing_ok=True)
+        raise
+
+    if durability == DURABILITY_FSYNC_FILE_AND_DIR and os.name != "nt":
+        for directory in dict.fromkeys(payload_path.parent for _, payload_path in staged):
+            started_at = time.perf_counter()
+            _fsync_directory(directory)
+            fsync_seconds += time.perf_counter() - started_at
+    return fsync_seconds
+
+
+def _fsync_directory(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
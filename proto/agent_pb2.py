@@ -14,25 +14,45 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x61gent.proto\x12\x05\x61gent\"#\n\nRunRequest\x12\x15\n\rcommands_file\x18\x01 \x01(\t\":\n\x0bRunResponse\x12\n\n\x02ok\x18\x01 \x01(\x08\x12\x10\n\x08\x61\x63\x63\x65pted\x18\x02 \x01(\x05\x12\r\n\x05\x65rror\x18\x03 \x01(\t\"\x0f\n\rHealthRequest\"-\n\x0eHealthResponse\x12\n\n\x02ok\x18\x01 \x01(\x08\x12\x0f\n\x07service\x18\x02 \x01(\t2s\n\x0c\x41gentGateway\x12,\n\x03Run\x12\x11.agent.RunRequest\x1a\x12.agent.RunResponse\x12\x35\n\x06Health\x12\x14.agent.HealthRequest\x1a\x15.agent.HealthResponse2I\n\x10InventoryService\x12\x35\n\x06Health\x12\x14.agent.HealthRequest\x1a\x15.agent.HealthResponse2E\n\x0cResultWriter\x12\x35\n\x06Health\x12\x14.agent.HealthRequest\x1a\x15.agent.HealthResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x61gent.proto\x12\x05\x61gent\"#\n\nRunRequest\x12\x15\n\rcommands_file\x18\x01 \x01(\t\" \n\x0c\x43ommandChunk\x12\x10\n\x08\x63ommands\x18\x01 \x03(\t\"w\n\x0bRunResponse\x12\n\n\x02ok\x18\x01 \x01(\x08\x12\x10\n\x08\x61\x63\x63\x65pted\x18\x02 \x01(\x05\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12\x10\n\x08rejected\x18\x04 \x01(\x05\x12\x11\n\tthrottled\x18\x05 \x01(\x05\x12\x16\n\x0eretry_after_ms\x18\x06 \x01(\x05\"Y\n\x0cTaskEnvelope\x12\x0f\n\x07task_id\x18\x01 \x01(\x0c\x12\x0f\n\x07\x63ommand\x18\x02 \x01(\t\x12\x15\n\rcreated_at_ms\x18\x03 \x01(\x03\x12\x10\n\x08text_ids\x18\x04 \x01(\x08\"\x96\x02\n\x0eResultEnvelope\x12\x0f\n\x07task_id\x18\x01 \x01(\x0c\x12\x10\n\x08task_ids\x18\x02 \x03(\x0c\x12\x0e\n\x06status\x18\x03 \x01(\t\x12\x0f\n\x07payload\x18\x04 \x01(\x0c\x12\r\n\x05\x65rror\x18\x05 \x01(\t\x12\r\n\x05ts_ms\x18\x06 \x01(\x03\x12H\n\x12unchanged_sections\x18\x07 \x03(\x0b\x32,.agent.ResultEnvelope.UnchangedSectionsEntry\x12\x0c\n\x04host\x18\x08 \x01(\t\x12\x10\n\x08text_ids\x18\t \x01(\x08\x1a\x38\n\x16UnchangedSectionsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"\x0f\n\rHealthRequest\"-\n\x0eHealthResponse\x12\n\n\x02ok\x18\x01 \x01(\x08\x12\x0f\n\x07service\x18\x02 \x01(\t\"\x83\x01\n\x0cStoredResult\x12\x0f\n\x07task_id\x18\x01 \x01(\t\x12\x10\n\x08task_ids\x18\x02 \x03(\t\x12\x0e\n\x06status\x18\x03 \x01(\t\x12\x14\n\x0cpayload_json\x18\x04 \x01(\t\x12\r\n\x05\x65rror\x18\x05 \x01(\t\x12\r\n\x05ts_ms\x18\x06 \x01(\x03\x12\x0c\n\x04host\x18\x07 \x01(\t\"#\n\x10GetResultRequest\x12\x0f\n\x07task_id\x18\x01 \x01(\t\"8\n\x11GetResultResponse\x12#\n\x06result\x18\x01 \x01(\x0b\x32\x13.agent.StoredResult\"~\n\x13QueryResultsRequest\x12\x0c\n\x04host\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\x12\x10\n\x08since_ms\x18\x03 \x01(\x03\x12\x10\n\x08until_ms\x18\x04 \x01(\x03\x12\x11\n\tpage_size\x18\x05 \x01(\x05\x12\x12\n\npage_token\x18\x06 \x01(\t\"U\n\x14QueryResultsResponse\x12$\n\x07results\x18\x01 \x03(\x0b\x32\x13.agent.StoredResult\x12\x17\n\x0fnext_page_token\x18\x02 \x01(\t2\xab\x01\n\x0c\x41gentGateway\x12,\n\x03Run\x12\x11.agent.RunRequest\x1a\x12.agent.RunResponse\x12\x36\n\tRunStream\x12\x13.agent.CommandChunk\x1a\x12.agent.RunResponse(\x01\x12\x35\n\x06Health\x12\x14.agent.HealthRequest\x1a\x15.agent.HealthResponse2I\n\x10InventoryService\x12\x35\n\x06Health\x12\x14.agent.HealthRequest\x1a\x15.agent.HealthResponse2\xce\x01\n\x0cResultWriter\x12\x35\n\x06Health\x12\x14.agent.HealthRequest\x1a\x15.agent.HealthResponse\x12>\n\tGetResult\x12\x17.agent.GetResultRequest\x1a\x18.agent.GetResultResponse\x12G\n\x0cQueryResults\x12\x1a.agent.QueryResultsRequest\x1a\x1b.agent.QueryResultsResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'agent_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_RESULTENVELOPE_UNCHANGEDSECTIONSENTRY']._loaded_options = None
+  _globals['_RESULTENVELOPE_UNCHANGEDSECTIONSENTRY']._serialized_options = b'8\001'
   _globals['_RUNREQUEST']._serialized_start=22
   _globals['_RUNREQUEST']._serialized_end=57
-  _globals['_RUNRESPONSE']._serialized_start=59
-  _globals['_RUNRESPONSE']._serialized_end=117
-  _globals['_HEALTHREQUEST']._serialized_start=119
-  _globals['_HEALTHREQUEST']._serialized_end=134
-  _globals['_HEALTHRESPONSE']._serialized_start=136
-  _globals['_HEALTHRESPONSE']._serialized_end=181
-  _globals['_AGENTGATEWAY']._serialized_start=183
-  _globals['_AGENTGATEWAY']._serialized_end=298
-  _globals['_INVENTORYSERVICE']._serialized_start=300
-  _globals['_INVENTORYSERVICE']._serialized_end=373
-  _globals['_RESULTWRITER']._serialized_start=375
-  _globals['_RESULTWRITER']._serialized_end=444
+  _globals['_COMMANDCHUNK']._serialized_start=59
+  _globals['_COMMANDCHUNK']._serialized_end=91
+  _globals['_RUNRESPONSE']._serialized_start=93
+  _globals['_RUNRESPONSE']._serialized_end=212
+  _globals['_TASKENVELOPE']._serialized_start=214
+  _globals['_TASKENVELOPE']._serialized_end=303
+  _globals['_RESULTENVELOPE']._serialized_start=306
+  _globals['_RESULTENVELOPE']._serialized_end=584
+  _globals['_RESULTENVELOPE_UNCHANGEDSECTIONSENTRY']._serialized_start=528
+  _globals['_RESULTENVELOPE_UNCHANGEDSECTIONSENTRY']._serialized_end=584
+  _globals['_HEALTHREQUEST']._serialized_start=586
+  _globals['_HEALTHREQUEST']._serialized_end=601
+  _globals['_HEALTHRESPONSE']._serialized_start=603
+  _globals['_HEALTHRESPONSE']._serialized_end=648
+  _globals['_STOREDRESULT']._serialized_start=651
+  _globals['_STOREDRESULT']._serialized_end=782
+  _globals['_GETRESULTREQUEST']._serialized_start=784
+  _globals['_GETRESULTREQUEST']._serialized_end=819
+  _globals['_GETRESULTRESPONSE']._serialized_start=821
+  _globals['_GETRESULTRESPONSE']._serialized_end=877
+  _globals['_QUERYRESULTSREQUEST']._serialized_start=879
+  _globals['_QUERYRESULTSREQUEST']._serialized_end=1005
+  _globals['_QUERYRESULTSRESPONSE']._serialized_start=1007
+  _globals['_QUERYRESULTSRESPONSE']._serialized_end=1092
+  _globals['_AGENTGATEWAY']._serialized_start=1095
+  _globals['_AGENTGATEWAY']._serialized_end=1266
+  _globals['_INVENTORYSERVICE']._serialized_start=1268
+  _globals['_INVENTORYSERVICE']._serialized_end=1341
+  _globals['_RESULTWRITER']._serialized_start=1344
+  _globals['_RESULTWRITER']._serialized_end=1550
 # @@protoc_insertion_point(module_scope)
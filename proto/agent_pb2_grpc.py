@@ -44,6 +44,11 @@ class AgentGatewayStub(object):
                 request_serializer=agent__pb2.RunRequest.SerializeToString,
                 response_deserializer=agent__pb2.RunResponse.FromString,
                 _registered_method=True)
+        self.RunStream = channel.stream_unary(
+                '/agent.AgentGateway/RunStream',
+                request_serializer=agent__pb2.CommandChunk.SerializeToString,
+                response_deserializer=agent__pb2.RunResponse.FromString,
+                _registered_method=True)
         self.Health = channel.unary_unary(
                 '/agent.AgentGateway/Health',
                 request_serializer=agent__pb2.HealthRequest.SerializeToString,
@@ -60,6 +65,12 @@ class AgentGatewayServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RunStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Health(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -74,6 +85,11 @@ def add_AgentGatewayServicer_to_server(servicer, server):
                     request_deserializer=agent__pb2.RunRequest.FromString,
                     response_serializer=agent__pb2.RunResponse.SerializeToString,
             ),
+            'RunStream': grpc.stream_unary_rpc_method_handler(
+                    servicer.RunStream,
+                    request_deserializer=agent__pb2.CommandChunk.FromString,
+                    response_serializer=agent__pb2.RunResponse.SerializeToString,
+            ),
             'Health': grpc.unary_unary_rpc_method_handler(
                     servicer.Health,
                     request_deserializer=agent__pb2.HealthRequest.FromString,
@@ -117,6 +133,33 @@ class AgentGateway(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def RunStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/agent.AgentGateway/RunStream',
+            agent__pb2.CommandChunk.SerializeToString,
+            agent__pb2.RunResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def Health(request,
             target,
@@ -231,6 +274,16 @@ class ResultWriterStub(object):
                 request_serializer=agent__pb2.HealthRequest.SerializeToString,
                 response_deserializer=agent__pb2.HealthResponse.FromString,
                 _registered_method=True)
+        self.GetResult = channel.unary_unary(
+                '/agent.ResultWriter/GetResult',
+                request_serializer=agent__pb2.GetResultRequest.SerializeToString,
+                response_deserializer=agent__pb2.GetResultResponse.FromString,
+                _registered_method=True)
+        self.QueryResults = channel.unary_unary(
+                '/agent.ResultWriter/QueryResults',
+                request_serializer=agent__pb2.QueryResultsRequest.SerializeToString,
+                response_deserializer=agent__pb2.QueryResultsResponse.FromString,
+                _registered_method=True)
 
 
 class ResultWriterServicer(object):
@@ -242,6 +295,19 @@ class ResultWriterServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetResult(self, request, context):
+        """Fails with NOT_FOUND when the task has no stored result.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def QueryResults(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ResultWriterServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -250,6 +316,16 @@ def add_ResultWriterServicer_to_server(servicer, server):
                     request_deserializer=agent__pb2.HealthRequest.FromString,
                     response_serializer=agent__pb2.HealthResponse.SerializeToString,
             ),
+            'GetResult': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetResult,
+                    request_deserializer=agent__pb2.GetResultRequest.FromString,
+                    response_serializer=agent__pb2.GetResultResponse.SerializeToString,
+            ),
+            'QueryResults': grpc.unary_unary_rpc_method_handler(
+                    servicer.QueryResults,
+                    request_deserializer=agent__pb2.QueryResultsRequest.FromString,
+                    response_serializer=agent__pb2.QueryResultsResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'agent.ResultWriter', rpc_method_handlers)
@@ -287,3 +363,57 @@ class ResultWriter(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetResult(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agent.ResultWriter/GetResult',
+            agent__pb2.GetResultRequest.SerializeToString,
+            agent__pb2.GetResultResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def QueryResults(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agent.ResultWriter/QueryResults',
+            agent__pb2.QueryResultsRequest.SerializeToString,
+            agent__pb2.QueryResultsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+
+# Time kept back from the RPC deadline so the response still reaches the client.
+DEADLINE_MARGIN_SECONDS = 0.1
+_INITIAL_BACKOFF_SECONDS = 0.05
+_MAX_BACKOFF_SECONDS = 1.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate_per_second`` tokens refill up to ``burst``."""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be > 0")
+        self._rate = rate_per_second
+        self._burst = max(burst, 1)
+        self._clock = clock
+        self._tokens = float(self._burst)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def take(self, count: int) -> int:
+        """Take up to ``count`` whole tokens; returns how many were granted."""
+        with self._lock:
+            self._refill()
+            granted = min(count, int(self._tokens))
+            self._tokens -= granted
+            return granted
+
+    def give_back(self, count: int) -> None:
+        if count <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self._tokens + count, float(self._burst))
+
+    def delay_for(self, count: int) -> float:
+        """Seconds until ``count`` tokens (capped at burst) are available."""
+        with self._lock:
+            self._refill()
+            missing = min(count, self._burst) - self._tokens
+            return max(missing, 0.0) / self._rate
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._tokens + (now - self._updated_at) * self._rate, float(self._burst))
+        self._updated_at = now
+
+
+@dataclass(frozen=True)
+class EnqueueOutcome:
+    queued: int
+    retry_after_seconds: float = 0.0
+
+
+class AdmissionController:
+    """
+    Gateway admission control: a command is admitted only when the token
+    bucket (if configured) grants it and the queue has room for it.
+
+    A batch that cannot be admitted right away is retried with backoff while
+    the wait budget lasts: ``max_wait_seconds`` capped by the time left before
+    the RPC deadline. What is still not queued after that is reported back
+    with a retry-after hint instead of being retried further.
+    """
+
+    def __init__(self, rate_per_second: float = 0.0, burst: int = 0, max_wait_seconds: float = 0.0) -> None:
+        self._bucket = TokenBucket(rate_per_second, burst or int(rate_per_second) or 1) if rate_per_second > 0 else None
+        self._max_wait_seconds = max(max_wait_seconds, 0.0)
+
+    def wait_budget(self, time_remaining: float | None) -> float:
+        """Seconds a batch may wait for admission given the call's remaining time."""
+        if time_remaining is None:
+            return self._max_wait_seconds
+        return max(min(self._max_wait_seconds, time_remaining - DEADLINE_MARGIN_SECONDS), 0.0)
+
+    def enqueue(
+        self,
+        put_many: Callable[[Sequence[str]], int],
+        batch: Sequence[str],
+        time_remaining: float | None,
+    ) -> EnqueueOutcome:
+        deadline = time.monotonic() + self.wait_budget(time_remaining)
+        queued = 0
+        backoff = _INITIAL_BACKOFF_SECONDS
+        while True:
+            granted = self._take(len(batch) - queued)
+            queue_full = False
+            if granted:
+                pushed = put_many(batch[queued : queued + granted])
+                self._give_back(granted - pushed)
+                queued += pushed
+                queue_full = pushed < granted
+            if queued == len(batch):
+                return EnqueueOutcome(queued)
+
+            delay = backoff if queue_full else max(self._token_delay(len(batch) - queued), 0.001)
+            if time.monotonic() + delay > deadline:
+                return EnqueueOutcome(queued, retry_after_seconds=delay)
+            time.sleep(delay)
+            if queue_full:
+                backoff = min(backoff * 2, _MAX_BACKOFF_SECONDS)
+
+    async def enqueue_async(
+        self,
+        put_many: Callable[[Sequence[str]], Awaitable[int]],
+        batch: Sequence[str],
+        time_remaining: float | None,
+    ) -> EnqueueOutcome:
+        """asyncio counterpart of ``enqueue``; waits without blocking the event loop."""
+        deadline = time.monotonic() + self.wait_budget(time_remaining)
+        queued = 0
+        backoff = _INITIAL_BACKOFF_SECONDS
+        while True:
+            granted = self._take(len(batch) - queued)
+            queue_full = False
+            if granted:
+                pushed = await put_many(batch[queued : queued + granted])
+                self._give_back(granted - pushed)
+                queued += pushed
+                queue_full = pushed < granted
+            if queued == len(batch):
+                return EnqueueOutcome(queued)
+
+            delay = backoff if queue_full else max(self._token_delay(len(batch) - queued), 0.001)
+            if time.monotonic() + delay > deadline:
+                return EnqueueOutcome(queued, retry_after_seconds=delay)
+            await asyncio.sleep(delay)
+            if queue_full:
+                backoff = min(backoff * 2, _MAX_BACKOFF_SECONDS)
+
+    def _take(self, count: int) -> int:
+        return self._bucket.take(count) if self._bucket is not None else count
+
+    def _give_back(self, count: int) -> None:
+        if self._bucket is not None:
+            self._bucket.give_back(count)
+
+    def _token_delay(self, count: int) -> float:
+        return self._bucket.delay_for(count) if self._bucket is not None else 0.0
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+import grpc
+import redis.asyncio as aioredis
+
+from legacy.src.agent.dispatcher import CommandBatcher, DispatchResult, read_command_lines
+from proto import agent_pb2_grpc
+from services.agent_gateway.admission import AdmissionController
+from services.agent_gateway.app import (
+    _ENQUEUE_SCRIPT,
+    _MAX_PUSH_BATCH,
+    HealthResponse,
+    RunResponse,
+    enqueue_args,
+    enqueue_keys,
+    run_failed_response,
+    run_response,
+)
+from services.common.envelope import WIRE_FORMAT_JSON
+from services.common.queue_transport import TRANSPORT_LIST
+from services.common.redis_client import RedisSettings, create_async_redis_client, log_pool_stats
+
+
+class AsyncRedisTaskQueueAdapter:
+    """asyncio counterpart of ``RedisTaskQueueAdapter`` sharing the same enqueue script."""
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        queue_name: str,
+        maxsize: int,
+        coalesce: bool = False,
+        coalesce_ttl_seconds: float = 300.0,
+        wire_format: str = WIRE_FORMAT_JSON,
+        compress_min_bytes: int = 0,
+        transport: str = TRANSPORT_LIST,
+    ) -> None:
+        self._keys = enqueue_keys(queue_name)
+        self._maxsize = maxsize
+        self._coalesce = coalesce
+        self._coalesce_ttl_seconds = coalesce_ttl_seconds
+        self._wire_format = wire_format
+        self._compress_min_bytes = compress_min_bytes
+        self._transport = transport
+        self._push_script = redis_client.register_script(_ENQUEUE_SCRIPT)
+
+    async def put_many(self, commands: Sequence[str]) -> int:
+        pushed = 0
+        for start in range(0, len(commands), _MAX_PUSH_BATCH):
+            chunk = commands[start : start + _MAX_PUSH_BATCH]
+            args = enqueue_args(
+                chunk,
+                self._maxsize,
+                self._coalesce,
+                self._coalesce_ttl_seconds,
+                self._wire_format,
+                self._transport,
+                self._compress_min_bytes,
+            )
+            count = int(await self._push_script(keys=self._keys, args=args))
+            pushed += count
+            if count < len(chunk):
+                break
+        return pushed
+
+
+class AsyncAgentGatewayServicer(agent_pb2_grpc.AgentGatewayServicer):
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        task_queue_name: str,
+        task_queue_maxsize: int,
+        dispatch_batch_size: int = 1,
+        coalesce: bool = False,
+        coalesce_ttl_seconds: float = 300.0,
+        wire_format: str = WIRE_FORMAT_JSON,
+        compress_min_bytes: int = 0,
+        transport: str = TRANSPORT_LIST,
+        admission: AdmissionController | None = None,
+    ) -> None:
+        self._redis = redis_client
+        self._queue_adapter = AsyncRedisTaskQueueAdapter(
+            redis_client=redis_client,
+            queue_name=task_queue_name,
+            maxsize=task_queue_maxsize,
+            coalesce=coalesce,
+            coalesce_ttl_seconds=coalesce_ttl_seconds,
+            wire_format=wire_format,
+            compress_min_bytes=compress_min_bytes,
+            transport=transport,
+        )
+        self._admission = admission or AdmissionController()
+        self._dispatch_batch_size = dispatch_batch_size
+
+    async def Run(self, request: Any, context: grpc.aio.ServicerContext) -> Any:
+        commands_file = Path(request.commands_file)
+        if not await asyncio.to_thread(commands_file.exists):
+            return RunResponse(ok=False, accepted=0, error="commands file not found")
+
+        return await self._dispatch(
+            _read_file_chunks(commands_file, self._dispatch_batch_size), str(commands_file), context
+        )
+
+    async def RunStream(self, request_iterator: AsyncIterator[Any], context: grpc.aio.ServicerContext) -> Any:
+        return await self._dispatch(_stream_chunks(request_iterator), "stream", context)
+
+    async def Health(self, request: Any, context: grpc.aio.ServicerContext) -> Any:
+        del request, context
+        log_pool_stats("agent-gateway", self._redis)
+        return HealthResponse(ok=True, service="agent-gateway")
+
+    async def _dispatch(
+        self,
+        chunks: AsyncIterator[Iterable[str]],
+        source: str,
+        context: grpc.aio.ServicerContext,
+    ) -> Any:
+        try:
+            result, retry_after_seconds = await self._dispatch_chunks(chunks, context)
+        except Exception as exc:
+            return run_failed_response(exc, source, context)
+        return run_response(result, source, context, retry_after_seconds)
+
+    async def _dispatch_chunks(
+        self,
+        chunks: AsyncIterator[Iterable[str]],
+        context: grpc.aio.ServicerContext,
+    ) -> tuple[DispatchResult, float]:
+        """Async counterpart of ``AgentGatewayServicer._dispatch_lines``; reads all input after a throttle too."""
+        batcher = CommandBatcher(self._dispatch_batch_size)
+        retry_after_seconds = 0.0
+        async for lines in chunks:
+            for line in lines:
+                batch = batcher.add(line)
+                if batch:
+                    retry_after_seconds = await self._offer(batch, batcher, context, retry_after_seconds)
+
+        tail = batcher.drain()
+        if tail:
+            retry_after_seconds = await self._offer(tail, batcher, context, retry_after_seconds)
+        return batcher.result, retry_after_seconds
+
+    async def _offer(
+        self,
+        batch: Sequence[str],
+        batcher: CommandBatcher,
+        context: grpc.aio.ServicerContext,
+        retry_after_seconds: float,
+    ) -> float:
+        if retry_after_seconds:
+            batcher.throttle(batch)
+            return retry_after_seconds
+        return await self._admit(batch, batcher, context)
+
+    async def _admit(
+        self,
+        batch: Sequence[str],
+        batcher: CommandBatcher,
+        context: grpc.aio.ServicerContext,
+    ) -> float:
+        outcome = await self._admission.enqueue_async(self._queue_adapter.put_many, batch, context.time_remaining())
+        batcher.record(batch, outcome.queued)
+        return outcome.retry_after_seconds if outcome.queued < len(batch) else 0.0
+
+
+async def _stream_chunks(request_iterator: AsyncIterator[Any]) -> AsyncIterator[Iterable[str]]:
+    async for chunk in request_iterator:
+        yield chunk.commands
+
+
+async def _read_file_chunks(commands_file: Path, chunk_size: int) -> AsyncIterator[Iterable[str]]:
+    """Read the commands file off the event loop, ``chunk_size`` lines at a time."""
+    lines = await asyncio.to_thread(read_command_lines, commands_file)
+    while True:
+        chunk = await asyncio.to_thread(_take, lines, max(chunk_size, 1))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _take(lines: Iterator[str], count: int) -> list[str]:
+    return list(itertools.islice(lines, count))
+
+
+async def serve_async(
+    redis_settings: RedisSettings,
+    task_queue_name: str,
+    task_queue_maxsize: int,
+    dispatch_batch_size: int,
+    coalesce: bool,
+    coalesce_ttl_seconds: float,
+    wire_format: str,
+    compress_min_bytes: int,
+    transport: str,
+    admission: AdmissionController,
+    listen_addr: str,
+) -> None:
+    """Run the gateway on grpc.aio with a pooled redis.asyncio client."""
+    redis_client = create_async_redis_client(redis_settings)
+    await redis_client.ping()
+
+    server = grpc.aio.server()
+    agent_pb2_grpc.add_AgentGatewayServicer_to_server(
+        AsyncAgentGatewayServicer(
+            redis_client=redis_client,
+            task_queue_name=task_queue_name,
+            task_queue_maxsize=task_queue_maxsize,
+            dispatch_batch_size=dispatch_batch_size,
+            coalesce=coalesce,
+            coalesce_ttl_seconds=coalesce_ttl_seconds,
+            wire_format=wire_format,
+            compress_min_bytes=compress_min_bytes,
+            transport=transport,
+            admission=admission,
+        ),
+        server,
+    )
+
+    server.add_insecure_port(listen_addr)
+    await server.start()
+    logging.info("agent-gateway (asyncio) listening on %s", listen_addr)
+    try:
+        await server.wait_for_termination()
+    finally:
+        await redis_client.connection_pool.disconnect()
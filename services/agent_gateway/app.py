@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import os
 import uuid
+from collections.abc import Iterable, Iterator, Sequence
 from concurrent import futures
 from datetime import datetime, timezone
 from pathlib import Path
@@ -13,14 +14,22 @@ from typing import Any, cast
 import grpc
 import redis
 
-from legacy.src.agent.dispatcher import dispatch_commands
+from legacy.src.agent.dispatcher import CommandBatcher, DispatchResult, read_command_lines
 from legacy.src.agent.logging_setup import setup_logging
 from proto import agent_pb2, agent_pb2_grpc
+from services.agent_gateway.admission import AdmissionController
+from services.common.envelope import WIRE_FORMAT_JSON, TaskMessage, encode_task, validate_wire_format
+from services.common.queue_transport import TRANSPORT_LIST, validate_transport
+from services.common.redis_client import create_redis_client, load_redis_settings, log_pool_stats
+from services.common.task_coalescing import inflight_key, requesters_key
 
 _agent_pb2 = cast(Any, agent_pb2)
 HealthResponse = _agent_pb2.HealthResponse
 RunResponse = _agent_pb2.RunResponse
 
+# Trailing metadata key carrying the retry hint of a throttled Run.
+RETRY_AFTER_METADATA_KEY = "retry-after-ms"
+
 
 def _env_str(name: str, default: str) -> str:
     return os.getenv(name, default).strip() or default
@@ -40,30 +49,218 @@ def _env_float(name: str, default: float) -> float:
     return float(raw)
 
 
+# Capacity check, coalescing and push run as one script so concurrent Run calls
+# cannot overshoot maxsize. KEYS: queue, in-flight hash, requesters hash.
+# ARGV: maxsize (0 = unbounded), coalesce flag, in-flight ttl ms, transport,
+# then (command, task_id, message) triples. Returns count of accepted commands;
+# a command joining an in-flight task is accepted without taking queue space.
+# A leader not claimed within the ttl is presumed lost: the next identical
+# command is pushed as the new leader and inherits its requesters.
+_ENQUEUE_SCRIPT = """
+local maxsize = tonumber(ARGV[1])
+local coalesce = ARGV[2] == '1'
+local ttl_ms = tonumber(ARGV[3])
+-- Lists of either kind (list, reliable-list) are pushed the same way.
+local stream = ARGV[4] == 'stream'
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+local bounded = maxsize > 0
+local free = 0
+if bounded then
+  -- Negative when the queue is already over maxsize (requeued tasks, lowered limit).
+  if stream then
+    free = maxsize - redis.call('XLEN', KEYS[1])
+  else
+    free = maxsize - redis.call('LLEN', KEYS[1])
+  end
+end
+
+local joined = {}
+local accepted = 0
+for i = 5, #ARGV, 3 do
+  local command, task_id, message = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+  local leader = nil
+  local stale = nil
+  if coalesce then
+    local entry = redis.call('HGET', KEYS[2], command)
+    if entry then
+      local sep = string.find(entry, '|', 1, true)
+      if now_ms - tonumber(string.sub(entry, sep + 1)) < ttl_ms then
+        leader = string.sub(entry, 1, sep - 1)
+      else
+        stale = string.sub(entry, 1, sep - 1)
+      end
+    end
+  end
+
+  if leader then
+    joined[leader] = joined[leader] or {}
+    table.insert(joined[leader], task_id)
+  else
+    if bounded and free <= 0 then
+      break
+    end
+    if stream then
+      redis.call('XADD', KEYS[1], '*', 'm', message)
+    else
+      redis.call('LPUSH', KEYS[1], message)
+    end
+    free = free - 1
+    if coalesce then
+      local requesters = task_id
+      if stale then
+        local inherited = redis.call('HGET', KEYS[3], stale)
+        if inherited then
+          requesters = requesters .. ',' .. inherited
+          redis.call('HDEL', KEYS[3], stale)
+        end
+      end
+      redis.call('HSET', KEYS[2], command, task_id .. '|' .. now_ms)
+      redis.call('HSET', KEYS[3], task_id, requesters)
+    end
+  end
+  accepted = accepted + 1
+end
+
+for leader, ids in pairs(joined) do
+  local current = redis.call('HGET', KEYS[3], leader)
+  local added = table.concat(ids, ',')
+  if current then
+    added = current .. ',' .. added
+  end
+  redis.call('HSET', KEYS[3], leader, added)
+end
+return accepted
+"""
+# Redis blocks other clients while a script runs, so larger batches are split.
+_MAX_PUSH_BATCH = 1000
+
+
+def build_task_message(command: str, task_id: str, wire_format: str, compress_min_bytes: int = 0) -> bytes:
+    task = TaskMessage(task_id=task_id, command=command, created_at=datetime.now(timezone.utc))
+    return encode_task(task, wire_format, compress_min_bytes)
+
+
+def enqueue_keys(queue_name: str) -> list[str]:
+    return [queue_name, inflight_key(queue_name), requesters_key(queue_name)]
+
+
+def enqueue_args(
+    commands: Sequence[str],
+    maxsize: int,
+    coalesce: bool,
+    coalesce_ttl_seconds: float,
+    wire_format: str,
+    transport: str,
+    compress_min_bytes: int = 0,
+) -> list[Any]:
+    args: list[Any] = [maxsize, "1" if coalesce else "0", int(coalesce_ttl_seconds * 1000), transport]
+    for command in commands:
+        task_id = str(uuid.uuid4())
+        args.extend((command, task_id, build_task_message(command, task_id, wire_format, compress_min_bytes)))
+    return args
+
+
+def run_response(
+    result: DispatchResult,
+    source: str,
+    context: grpc.ServicerContext | grpc.aio.ServicerContext,
+    retry_after_seconds: float = 0.0,
+) -> Any:
+    """
+    Build the Run response; throttled calls carry a retry-after hint.
+
+    When nothing could be queued the call fails with RESOURCE_EXHAUSTED, so the
+    client can retry it as a whole. Partially queued calls succeed with
+    ``ok=False`` and the counts, letting the client resend only the rest.
+    """
+    logging.info(
+        "Run accepted %s, rejected %s, throttled %s commands from %s",
+        result.accepted,
+        result.rejected,
+        result.throttled,
+        source,
+    )
+    if not result.throttled:
+        return RunResponse(ok=True, accepted=result.accepted, rejected=result.rejected, error="")
+
+    retry_after_ms = max(int(retry_after_seconds * 1000), 1)
+    error = f"task queue is busy, retry after {retry_after_ms} ms"
+    context.set_trailing_metadata(((RETRY_AFTER_METADATA_KEY, str(retry_after_ms)),))
+    if result.accepted == 0:
+        context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        context.set_details(error)
+    return RunResponse(
+        ok=False,
+        accepted=result.accepted,
+        rejected=result.rejected,
+        throttled=result.throttled,
+        retry_after_ms=retry_after_ms,
+        error=error,
+    )
+
+
+def run_failed_response(exc: Exception, source: str, context: grpc.ServicerContext | grpc.aio.ServicerContext) -> Any:
+    logging.error("Failed to dispatch commands from %s", source, exc_info=exc)
+    context.set_code(grpc.StatusCode.INTERNAL)
+    context.set_details(str(exc))
+    return RunResponse(ok=False, accepted=0, error=str(exc))
+
+
 class RedisTaskQueueAdapter:
     def __init__(
         self,
         redis_client: redis.Redis,
         queue_name: str,
         maxsize: int,
+        coalesce: bool = False,
+        coalesce_ttl_seconds: float = 300.0,
+        wire_format: str = WIRE_FORMAT_JSON,
+        compress_min_bytes: int = 0,
+        transport: str = TRANSPORT_LIST,
     ) -> None:
         self._redis = redis_client
-        self._queue_name = queue_name
+        self._keys = enqueue_keys(queue_name)
         self._maxsize = maxsize
+        self._coalesce = coalesce
+        self._coalesce_ttl_seconds = coalesce_ttl_seconds
+        self._wire_format = wire_format
+        self._compress_min_bytes = compress_min_bytes
+        self._transport = transport
+        self._push_script = redis_client.register_script(_ENQUEUE_SCRIPT)
 
     def put(self, command: str, timeout: float | None = None) -> None:
-        del timeout
-        if self._maxsize > 0:
-            current_size = self._redis.llen(self._queue_name)
-            if current_size >= self._maxsize:
-                raise Full("Redis task queue overflow")
+        if self.put_many([command], timeout=timeout) == 0:
+            raise Full("Redis task queue overflow")
+
+    def put_many(self, commands: Sequence[str], timeout: float | None = None) -> int:
+        """
+        Enqueue commands in one round trip, in order, up to the free capacity.
+
+        With coalescing enabled, a command identical to a task that is still
+        waiting in the queue joins that task as an extra requester instead of
+        being pushed again.
 
-        message = {
-            "task_id": str(uuid.uuid4()),
-            "command": command,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        }
-        self._redis.lpush(self._queue_name, json.dumps(message, ensure_ascii=False))
+        Returns count of enqueued commands; the tail that did not fit is dropped.
+        """
+        del timeout
+        pushed = 0
+        for start in range(0, len(commands), _MAX_PUSH_BATCH):
+            chunk = commands[start : start + _MAX_PUSH_BATCH]
+            args = enqueue_args(
+                chunk,
+                self._maxsize,
+                self._coalesce,
+                self._coalesce_ttl_seconds,
+                self._wire_format,
+                self._transport,
+                self._compress_min_bytes,
+            )
+            count = int(self._push_script(keys=self._keys, args=args))
+            pushed += count
+            if count < len(chunk):
+                break
+        return pushed
 
 
 class AgentGatewayServicer(agent_pb2_grpc.AgentGatewayServicer):
@@ -73,38 +270,80 @@ class AgentGatewayServicer(agent_pb2_grpc.AgentGatewayServicer):
         task_queue_name: str,
         task_queue_maxsize: int,
         put_timeout_seconds: float,
+        dispatch_batch_size: int = 1,
+        coalesce: bool = False,
+        coalesce_ttl_seconds: float = 300.0,
+        wire_format: str = WIRE_FORMAT_JSON,
+        compress_min_bytes: int = 0,
+        transport: str = TRANSPORT_LIST,
+        admission: AdmissionController | None = None,
     ) -> None:
         self._redis = redis_client
-        self._task_queue_name = task_queue_name
-        self._task_queue_maxsize = task_queue_maxsize
-        self._put_timeout_seconds = put_timeout_seconds
+        self._queue_adapter = RedisTaskQueueAdapter(
+            redis_client=redis_client,
+            queue_name=task_queue_name,
+            maxsize=task_queue_maxsize,
+            coalesce=coalesce,
+            coalesce_ttl_seconds=coalesce_ttl_seconds,
+            wire_format=wire_format,
+            compress_min_bytes=compress_min_bytes,
+            transport=transport,
+        )
+        self._admission = admission or AdmissionController(max_wait_seconds=put_timeout_seconds)
+        self._dispatch_batch_size = dispatch_batch_size
 
     def Run(self, request: Any, context: grpc.ServicerContext) -> Any:
         commands_file = Path(request.commands_file)
         if not commands_file.exists():
             return RunResponse(ok=False, accepted=0, error="commands file not found")
 
-        queue_adapter = RedisTaskQueueAdapter(
-            redis_client=self._redis,
-            queue_name=self._task_queue_name,
-            maxsize=self._task_queue_maxsize,
-        )
+        return self._dispatch(read_command_lines(commands_file), str(commands_file), context)
+
+    def RunStream(self, request_iterator: Iterator[Any], context: grpc.ServicerContext) -> Any:
+        lines = (command for chunk in request_iterator for command in chunk.commands)
+        return self._dispatch(lines, "stream", context)
+
+    def _dispatch(self, lines: Iterable[str], source: str, context: grpc.ServicerContext) -> Any:
         try:
-            accepted = dispatch_commands(
-                commands_file=commands_file,
-                task_queue=queue_adapter,  # type: ignore[arg-type]
-                put_timeout_seconds=self._put_timeout_seconds,
-            )
-            logging.info("Run accepted %s commands from %s", accepted, commands_file)
-            return RunResponse(ok=True, accepted=accepted, error="")
+            result, retry_after_seconds = self._dispatch_lines(lines, context)
         except Exception as exc:
-            logging.exception("Failed to dispatch commands from %s", commands_file)
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(str(exc))
-            return RunResponse(ok=False, accepted=0, error=str(exc))
+            return run_failed_response(exc, source, context)
+        return run_response(result, source, context, retry_after_seconds)
+
+    def _dispatch_lines(self, lines: Iterable[str], context: grpc.ServicerContext) -> tuple[DispatchResult, float]:
+        """
+        Enqueue commands batch by batch. After the first throttled batch the
+        rest of the input is still read, but only counted: valid commands as
+        throttled, unsupported ones as rejected, so the counters cover every line.
+        """
+        batcher = CommandBatcher(self._dispatch_batch_size)
+        retry_after_seconds = 0.0
+        for line in lines:
+            batch = batcher.add(line)
+            if batch:
+                retry_after_seconds = self._offer(batch, batcher, context, retry_after_seconds)
+
+        tail = batcher.drain()
+        if tail:
+            retry_after_seconds = self._offer(tail, batcher, context, retry_after_seconds)
+        return batcher.result, retry_after_seconds
+
+    def _offer(
+        self, batch: Sequence[str], batcher: CommandBatcher, context: grpc.ServicerContext, retry_after_seconds: float
+    ) -> float:
+        if retry_after_seconds:
+            batcher.throttle(batch)
+            return retry_after_seconds
+        return self._admit(batch, batcher, context)
+
+    def _admit(self, batch: Sequence[str], batcher: CommandBatcher, context: grpc.ServicerContext) -> float:
+        outcome = self._admission.enqueue(self._queue_adapter.put_many, batch, context.time_remaining())
+        batcher.record(batch, outcome.queued)
+        return outcome.retry_after_seconds if outcome.queued < len(batch) else 0.0
 
     def Health(self, request: Any, context: grpc.ServicerContext) -> Any:
         del request, context
+        log_pool_stats("agent-gateway", self._redis)
         return HealthResponse(ok=True, service="agent-gateway")
 
 
@@ -113,16 +352,50 @@ def serve() -> None:
     log_level = _env_str("LOG_LEVEL", "info")
     setup_logging(log_dir, log_level)
 
-    redis_host = _env_str("REDIS_HOST", "localhost")
-    redis_port = _env_int("REDIS_PORT", 6379)
+    redis_settings = load_redis_settings()
     task_queue_name = _env_str("TASK_QUEUE_NAME", "inventory_tasks")
     task_queue_maxsize = _env_int("TASK_QUEUE_MAXSIZE", 100)
     put_timeout_seconds = _env_float("PUT_TIMEOUT_SECONDS", 2.0)
     grpc_host = _env_str("GRPC_HOST", "0.0.0.0")
     grpc_port = _env_int("GRPC_PORT", 50051)
     max_workers = _env_int("GRPC_WORKERS", 10)
+    dispatch_batch_size = _env_int("DISPATCH_BATCH_SIZE", 500)
+    server_mode = _env_str("GATEWAY_SERVER_MODE", "thread").lower()
+    coalesce = _env_str("TASK_COALESCING", "false").lower() in {"1", "true", "yes", "on"}
+    coalesce_ttl_seconds = _env_float("TASK_COALESCING_TTL_SECONDS", 300.0)
+    wire_format = validate_wire_format(_env_str("QUEUE_WIRE_FORMAT", WIRE_FORMAT_JSON))
+    compress_min_bytes = _env_int("QUEUE_COMPRESS_MIN_BYTES", 0)
+    transport = validate_transport(_env_str("QUEUE_TRANSPORT", TRANSPORT_LIST))
+    admission = AdmissionController(
+        rate_per_second=_env_float("ADMISSION_RATE_PER_SECOND", 0.0),
+        burst=_env_int("ADMISSION_BURST", 0),
+        max_wait_seconds=put_timeout_seconds,
+    )
+
+    if server_mode == "asyncio":
+        # Imported lazily: the asyncio servicer builds on this module.
+        from services.agent_gateway.aio import serve_async
+
+        asyncio.run(
+            serve_async(
+                redis_settings=redis_settings,
+                task_queue_name=task_queue_name,
+                task_queue_maxsize=task_queue_maxsize,
+                dispatch_batch_size=dispatch_batch_size,
+                coalesce=coalesce,
+                coalesce_ttl_seconds=coalesce_ttl_seconds,
+                wire_format=wire_format,
+                compress_min_bytes=compress_min_bytes,
+                transport=transport,
+                admission=admission,
+                listen_addr=f"{grpc_host}:{grpc_port}",
+            )
+        )
+        return
+    if server_mode != "thread":
+        raise ValueError("GATEWAY_SERVER_MODE must be 'thread' or 'asyncio'")
 
-    redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+    redis_client = create_redis_client(redis_settings)
     redis_client.ping()
 
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
@@ -132,6 +405,13 @@ def serve() -> None:
             task_queue_name=task_queue_name,
             task_queue_maxsize=task_queue_maxsize,
             put_timeout_seconds=put_timeout_seconds,
+            dispatch_batch_size=dispatch_batch_size,
+            coalesce=coalesce,
+            coalesce_ttl_seconds=coalesce_ttl_seconds,
+            wire_format=wire_format,
+            compress_min_bytes=compress_min_bytes,
+            transport=transport,
+            admission=admission,
         ),
         server,
     )
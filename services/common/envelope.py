@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, cast
+
+from legacy.src.agent.codec import dumps, loads
+from proto import agent_pb2
+
+_agent_pb2 = cast(Any, agent_pb2)
+TaskEnvelope = _agent_pb2.TaskEnvelope
+ResultEnvelope = _agent_pb2.ResultEnvelope
+
+WIRE_FORMAT_JSON = "json"
+WIRE_FORMAT_PROTOBUF = "protobuf"
+WIRE_FORMATS = (WIRE_FORMAT_JSON, WIRE_FORMAT_PROTOBUF)
+
+# First byte of a protobuf message on the queue. JSON messages always start
+# with "{", so readers accept both formats while producers are switched over.
+PROTOBUF_V1 = b"\x01"
+# First byte of a zlib-compressed message; the inflated bytes are a JSON or
+# protobuf message as above. Producers compress only messages of at least
+# ``compress_min_bytes`` and only when that makes them smaller.
+ZLIB_V1 = b"\x02"
+# Upper bound for an inflated message, so a corrupt or hostile one cannot exhaust memory.
+MAX_INFLATED_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class TaskMessage:
+    task_id: str
+    command: str
+    created_at: datetime
+
+
+@dataclass
+class ResultMessage:
+    task_id: str
+    status: str
+    ts: datetime
+    task_ids: list[str] = field(default_factory=list)
+    payload: dict[str, Any] | None = None
+    error: str = ""
+    # Set on delta results, see services/common/payload_delta.py.
+    unchanged_sections: dict[str, str] = field(default_factory=dict)
+    host: str = ""
+
+
+def validate_wire_format(wire_format: str) -> str:
+    normalized = wire_format.strip().lower()
+    if normalized not in WIRE_FORMATS:
+        raise ValueError(f"Unsupported queue wire format: {wire_format!r}, expected one of {WIRE_FORMATS}")
+    return normalized
+
+
+def compress(data: bytes, min_bytes: int) -> bytes:
+    """Wrap ``data`` in a zlib frame if it has at least ``min_bytes`` (0 = never) and shrinks."""
+    if min_bytes <= 0 or len(data) < min_bytes:
+        return data
+    packed = ZLIB_V1 + zlib.compress(data)
+    return packed if len(packed) < len(data) else data
+
+
+def encode_task(task: TaskMessage, wire_format: str, compress_min_bytes: int = 0) -> bytes:
+    if wire_format == WIRE_FORMAT_PROTOBUF:
+        text_ids = not _is_uuid(task.task_id)
+        envelope = TaskEnvelope(
+            task_id=_id_to_bytes(task.task_id, text_ids),
+            command=task.command,
+            created_at_ms=_to_ms(task.created_at),
+            text_ids=text_ids,
+        )
+        return compress(PROTOBUF_V1 + bytes(envelope.SerializeToString()), compress_min_bytes)
+
+    message = {
+        "task_id": task.task_id,
+        "command": task.command,
+        "created_at": task.created_at.isoformat(),
+    }
+    return compress(dumps(message), compress_min_bytes)
+
+
+def decode_task(raw: bytes | str) -> TaskMessage:
+    """Decode a task in either wire format, compressed or not; raises ValueError on malformed input."""
+    data = _inflate(raw)
+    if data[:1] == PROTOBUF_V1:
+        envelope = _parse(TaskEnvelope, data)
+        return TaskMessage(
+            task_id=_id_from_bytes(envelope.task_id, envelope.text_ids),
+            command=envelope.command,
+            created_at=_from_ms(envelope.created_at_ms),
+        )
+
+    message = _load_json(data)
+    return TaskMessage(
+        task_id=str(message.get("task_id", "")),
+        command=str(message.get("command", "")),
+        created_at=_parse_iso(message.get("created_at")),
+    )
+
+
+def encode_result(result: ResultMessage, wire_format: str, compress_min_bytes: int = 0) -> bytes:
+    if wire_format == WIRE_FORMAT_PROTOBUF:
+        text_ids = not all(map(_is_uuid, [result.task_id, *result.task_ids]))
+        envelope = ResultEnvelope(
+            task_id=_id_to_bytes(result.task_id, text_ids),
+            task_ids=[_id_to_bytes(task_id, text_ids) for task_id in result.task_ids],
+            status=result.status,
+            error=result.error,
+            ts_ms=_to_ms(result.ts),
+            unchanged_sections=result.unchanged_sections,
+            host=result.host,
+            text_ids=text_ids,
+        )
+        if result.payload is not None:
+            envelope.payload = dumps(result.payload)
+        return compress(PROTOBUF_V1 + bytes(envelope.SerializeToString()), compress_min_bytes)
+
+    message: dict[str, Any] = {
+        "task_id": result.task_id,
+        "task_ids": result.task_ids,
+        "status": result.status,
+    }
+    if result.payload is not None:
+        message["payload"] = result.payload
+    if result.unchanged_sections:
+        message["unchanged_sections"] = result.unchanged_sections
+    if result.error:
+        message["error"] = result.error
+    if result.host:
+        message["host"] = result.host
+    message["ts"] = result.ts.isoformat()
+    return compress(dumps(message), compress_min_bytes)
+
+
+def decode_result(raw: bytes | str) -> ResultMessage:
+    """Decode a result in either wire format, compressed or not; raises ValueError on malformed input."""
+    data = _inflate(raw)
+    if data[:1] == PROTOBUF_V1:
+        envelope = _parse(ResultEnvelope, data)
+        return ResultMessage(
+            task_id=_id_from_bytes(envelope.task_id, envelope.text_ids),
+            task_ids=[_id_from_bytes(task_id, envelope.text_ids) for task_id in envelope.task_ids],
+            status=envelope.status,
+            payload=loads(envelope.payload) if envelope.payload else None,
+            error=envelope.error,
+            ts=_from_ms(envelope.ts_ms),
+            unchanged_sections=dict(envelope.unchanged_sections),
+            host=envelope.host,
+        )
+
+    message = _load_json(data)
+    task_id = str(message.get("task_id", ""))
+    payload = message.get("payload")
+    return ResultMessage(
+        task_id=task_id,
+        task_ids=[str(item) for item in message.get("task_ids") or [task_id]],
+        status=str(message.get("status", "")),
+        payload=payload if isinstance(payload, dict) else None,
+        error=str(message.get("error", "")),
+        ts=_parse_iso(message.get("ts")),
+        unchanged_sections={
+            str(name): str(digest) for name, digest in (message.get("unchanged_sections") or {}).items()
+        },
+        host=str(message.get("host", "")),
+    )
+
+
+def _inflate(raw: bytes | str) -> bytes:
+    data = raw.encode("utf-8") if isinstance(raw, str) else raw
+    if data[:1] != ZLIB_V1:
+        return data
+    inflater = zlib.decompressobj()
+    try:
+        inflated = inflater.decompress(data[1:], MAX_INFLATED_BYTES)
+    except zlib.error as exc:
+        raise ValueError(f"malformed zlib frame: {exc}") from exc
+    if inflater.unconsumed_tail:
+        raise ValueError(f"compressed message inflates beyond {MAX_INFLATED_BYTES} bytes")
+    if not inflater.eof:
+        raise ValueError("truncated zlib frame")
+    return inflated
+
+
+def _parse(message_class: Any, data: bytes) -> Any:
+    envelope = message_class()
+    try:
+        envelope.ParseFromString(data[1:])
+    except Exception as exc:
+        raise ValueError(f"malformed protobuf envelope: {exc}") from exc
+    return envelope
+
+
+def _load_json(data: bytes) -> dict[str, Any]:
+    message = loads(data)
+    if not isinstance(message, dict):
+        raise ValueError("queue message must be a JSON object")
+    return message
+
+
+def _is_uuid(task_id: str) -> bool:
+    """True when ``task_id`` is a UUID in the canonical form it is decoded back to."""
+    try:
+        return str(uuid.UUID(task_id)) == task_id
+    except ValueError:
+        return False
+
+
+# Ids are packed as 16 UUID bytes unless the envelope has text_ids set; one
+# id that is not a canonical UUID makes every id of the envelope text, so a
+# 16-character id is never mistaken for a UUID. Envelopes written before the
+# flag existed are read as before.
+def _id_to_bytes(task_id: str, text_ids: bool) -> bytes:
+    return task_id.encode("utf-8") if text_ids else uuid.UUID(task_id).bytes
+
+
+def _id_from_bytes(raw: bytes, text_ids: bool) -> str:
+    if not text_ids and len(raw) == 16:
+        return str(uuid.UUID(bytes=raw))
+    return raw.decode("utf-8")
+
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _from_ms(value: int) -> datetime:
+    # 0 is the protobuf default, i.e. the field was not set; like a missing
+    # ISO timestamp in JSON it means "now".
+    if not value:
+        return datetime.now(timezone.utc)
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+
+
+def _parse_iso(value: Any) -> datetime:
+    if not value:
+        return datetime.now(timezone.utc)
+    return datetime.fromisoformat(str(value))
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections.abc import Callable, Sequence
+from dataclasses import replace
+from datetime import datetime
+from typing import Any
+
+from legacy.src.agent.inventory.collectors import ERRORS_SECTION
+from services.common.envelope import ResultMessage
+
+# A delta result carries only the payload sections whose content changed since
+# the previous result of the same worker; every other section is listed in
+# ``unchanged_sections`` with its hash. A result without unchanged sections is
+# a full payload. Sections named in neither place were removed, except those
+# whose collector failed (listed in ``collector_errors``): the writer keeps
+# their last content rather than dropping it for one bad collection. The writer
+# applies a delta only when its stored hashes match, otherwise it waits for the
+# next full payload, which the worker sends at least every ``full_every`` results.
+
+
+def section_hash(value: Any) -> str:
+    # Always stdlib json, not the codec: worker and writer must hash the same
+    # section to the same digest whichever JSON backend each has installed.
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def section_hashes(payload: dict[str, Any]) -> dict[str, str]:
+    return {name: section_hash(value) for name, value in payload.items()}
+
+
+class DeltaEncoder:
+    """
+    Worker side: remembers the hash of every section last sent and strips
+    unchanged sections from results. ``full_every=1`` disables deltas.
+
+    ``publish()`` moves the remembered base only once the results were
+    published, and runs one publish at a time: a failed publish or two tasks
+    publishing out of order would otherwise leave the writer a delta against
+    a base it never got. ``encode()`` moves the base right away.
+    """
+
+    def __init__(self, full_every: int) -> None:
+        if full_every < 1:
+            raise ValueError("full_every must be >= 1")
+        self._full_every = full_every
+        self._sent: dict[str, str] | None = None
+        self._since_full = 0
+        self._lock = threading.Lock()
+
+    def encode(self, result: ResultMessage) -> ResultMessage:
+        encoded: list[ResultMessage] = []
+        self.publish([result], encoded.extend)
+        return encoded[0]
+
+    def publish(self, results: Sequence[ResultMessage], send: Callable[[list[ResultMessage]], None]) -> None:
+        """Encode ``results`` in order and hand them to ``send``; the base moves only if it returns."""
+        with self._lock:
+            sent, since_full = self._sent, self._since_full
+            encoded: list[ResultMessage] = []
+            for result in results:
+                if result.payload is None:
+                    encoded.append(result)
+                    continue
+                hashes = section_hashes(result.payload)
+                previous, sent = sent, hashes
+                since_full += 1
+                if previous is None or since_full >= self._full_every:
+                    since_full = 0
+                    encoded.append(result)
+                    continue
+                unchanged = {name: digest for name, digest in hashes.items() if previous.get(name) == digest}
+                changed = {name: value for name, value in result.payload.items() if name not in unchanged}
+                encoded.append(replace(result, payload=changed, unchanged_sections=unchanged))
+            send(encoded)
+            self._sent, self._since_full = sent, since_full
+
+
+class DeltaMismatchError(ValueError):
+    """Delta refers to section contents the writer does not have."""
+
+
+class PayloadState:
+    """
+    Writer side: the payload last applied, the hash of each of its sections
+    and the timestamp of the result it came from (None when loaded from disk).
+    """
+
+    def __init__(self, payload: dict[str, Any] | None = None, ts: datetime | None = None) -> None:
+        self.payload: dict[str, Any] = payload or {}
+        self.hashes = section_hashes(self.payload)
+        self.ts = ts
+
+    def merge(self, changed: dict[str, Any], unchanged: dict[str, str]) -> dict[str, Any]:
+        """Payload after applying a result; raises DeltaMismatchError if the base differs."""
+        stale = sorted(name for name, digest in unchanged.items() if self.hashes.get(name) != digest)
+        if stale:
+            raise DeltaMismatchError(f"stored sections differ from delta base: {', '.join(stale)}")
+        merged = {name: self.payload[name] for name in unchanged}
+        merged.update(changed)
+        for name in merged.get(ERRORS_SECTION) or {}:
+            if name not in merged and name in self.payload:
+                merged[name] = self.payload[name]
+        return merged
+
+    def is_current(self, payload: dict[str, Any]) -> bool:
+        return section_hashes(payload) == self.hashes
+
+    def is_newer(self, ts: datetime) -> bool:
+        return self.ts is None or ts >= self.ts
+
+    def replace(self, payload: dict[str, Any], ts: datetime | None = None) -> None:
+        self.payload = payload
+        self.hashes = section_hashes(payload)
+        self.ts = ts or self.ts
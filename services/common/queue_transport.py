@@ -0,0 +1,394 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import redis
+
+TRANSPORT_LIST = "list"
+TRANSPORT_RELIABLE_LIST = "reliable-list"
+TRANSPORT_STREAM = "stream"
+TRANSPORTS = (TRANSPORT_LIST, TRANSPORT_RELIABLE_LIST, TRANSPORT_STREAM)
+
+# Field holding the encoded message in a stream entry.
+STREAM_FIELD = b"m"
+
+
+@dataclass(frozen=True)
+class Delivery:
+    data: bytes
+    entry_id: bytes = b""
+
+
+def validate_transport(transport: str) -> str:
+    normalized = transport.strip().lower()
+    if normalized not in TRANSPORTS:
+        raise ValueError(f"Unsupported queue transport: {transport!r}, expected one of {TRANSPORTS}")
+    return normalized
+
+
+def default_consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ListTransport:
+    """Plain Redis list: LPUSH to publish, RPOP/BRPOP to consume. Popped messages are gone."""
+
+    def __init__(self, redis_client: redis.Redis, queue_name: str) -> None:
+        self._redis = redis_client
+        self._queue_name = queue_name
+
+    def ensure_group(self) -> None:
+        """Lists need no consumer setup."""
+
+    def publish(self, messages: Sequence[bytes]) -> None:
+        if messages:
+            self._redis.lpush(self._queue_name, *messages)
+
+    def fetch(self, count: int, block_seconds: int) -> list[Delivery]:
+        """
+        Take up to ``count`` oldest messages.
+
+        A backed-up queue is drained with one RPOP of ``count`` items; only an
+        empty queue falls back to BRPOP, which waits for a single message.
+        """
+        items: Any = self._redis.rpop(self._queue_name, max(count, 1))
+        if items:
+            return [Delivery(data=data) for data in items]
+        item: Any = self._redis.brpop(self._queue_name, timeout=block_seconds)
+        if item is None:
+            return []
+        return [Delivery(data=item[1])]
+
+    def ack(self, deliveries: Sequence[Delivery]) -> None:
+        del deliveries
+
+    def stats(self) -> dict[str, int]:
+        return {"length": int(self._redis.llen(self._queue_name))}  # type: ignore[arg-type]
+
+
+class StreamTransport:
+    """
+    Redis Stream with a consumer group.
+
+    Consumers read with XREADGROUP in batches and XACK + XDEL entries once
+    processed, so XLEN stays equal to unread plus in-progress entries and the
+    gateway's maxsize check keeps working. Entries left pending by a crashed
+    consumer for longer than ``claim_idle_ms`` are taken over with XAUTOCLAIM.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        stream_name: str,
+        group: str,
+        consumer: str,
+        claim_idle_ms: int = 60_000,
+    ) -> None:
+        self._redis = redis_client
+        self._stream_name = stream_name
+        self._group = group
+        self._consumer = consumer
+        self._claim_idle_ms = claim_idle_ms
+        self._claim_cursor: bytes | str = b"0-0"
+        self._next_claim_at = 0.0
+
+    def ensure_group(self) -> None:
+        try:
+            self._redis.xgroup_create(self._stream_name, self._group, id="0", mkstream=True)
+            logging.info("created consumer group %s on stream %s", self._group, self._stream_name)
+        except redis.ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def publish(self, messages: Sequence[bytes]) -> None:
+        if not messages:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for message in messages:
+            pipe.xadd(self._stream_name, {STREAM_FIELD: message})
+        pipe.execute()
+
+    def fetch(self, count: int, block_seconds: int) -> list[Delivery]:
+        deliveries = self._claim_idle(count)
+        if deliveries:
+            return deliveries
+
+        response: Any = self._redis.xreadgroup(
+            self._group,
+            self._consumer,
+            {self._stream_name: ">"},
+            count=count,
+            block=block_seconds * 1000,
+        )
+        if not response:
+            return []
+        _, entries = response[0]
+        return self._to_deliveries(entries)
+
+    def ack(self, deliveries: Sequence[Delivery]) -> None:
+        entry_ids = [delivery.entry_id for delivery in deliveries if delivery.entry_id]
+        if not entry_ids:
+            return
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.xack(self._stream_name, self._group, *entry_ids)
+        pipe.xdel(self._stream_name, *entry_ids)
+        pipe.execute()
+
+    def stats(self) -> dict[str, int]:
+        """Length of the stream plus pending entries and lag of this consumer group."""
+        stats = {"length": int(self._redis.xlen(self._stream_name)), "pending": 0, "lag": 0}
+        groups: Any = self._redis.xinfo_groups(self._stream_name)
+        for group in groups:
+            name = group.get("name")
+            if name in (self._group, self._group.encode("utf-8")):
+                stats["pending"] = int(group.get("pending") or 0)
+                stats["lag"] = int(group.get("lag") or 0)
+        return stats
+
+    def _claim_idle(self, count: int) -> list[Delivery]:
+        # Idle entries cannot appear faster than claim_idle_ms, so scanning more
+        # often than twice per that period only costs round trips.
+        now = time.monotonic()
+        if now < self._next_claim_at:
+            return []
+        response: Any = self._redis.xautoclaim(
+            self._stream_name,
+            self._group,
+            self._consumer,
+            min_idle_time=self._claim_idle_ms,
+            start_id=self._claim_cursor,
+            count=count,
+        )
+        self._claim_cursor = response[0]
+        if self._claim_cursor in (b"0-0", "0-0"):
+            self._next_claim_at = now + self._claim_idle_ms / 2000
+        deliveries = self._to_deliveries(response[1])
+        if deliveries:
+            logging.warning("reclaimed %s idle entries from stream %s", len(deliveries), self._stream_name)
+        return deliveries
+
+    def _to_deliveries(self, entries: Sequence[Any]) -> list[Delivery]:
+        deliveries: list[Delivery] = []
+        orphaned: list[bytes] = []
+        for entry_id, fields in entries:
+            data = (fields or {}).get(STREAM_FIELD)
+            if data is None:
+                orphaned.append(entry_id)
+                continue
+            deliveries.append(Delivery(data=data, entry_id=entry_id))
+        if orphaned:
+            self.ack([Delivery(data=b"", entry_id=entry_id) for entry_id in orphaned])
+        return deliveries
+
+
+def processing_key(queue_name: str, consumer: str) -> str:
+    return f"{queue_name}:processing:{consumer}"
+
+
+def leases_key(queue_name: str) -> str:
+    return f"{queue_name}:leases"
+
+
+def consumers_key(queue_name: str) -> str:
+    return f"{queue_name}:consumers"
+
+
+# Lease members are "<consumer>\0<message>", scored with the time (ms, Redis
+# clock) after which the message is handed back to the queue. Consumers are
+# scored with the time they last fetched.
+
+# KEYS: queue, processing list, leases, consumers. ARGV: count, visibility ms, consumer.
+_FETCH_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+redis.call('ZADD', KEYS[4], now_ms, ARGV[3])
+local items = {}
+for i = 1, tonumber(ARGV[1]) do
+  local item = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+  if not item then
+    break
+  end
+  redis.call('ZADD', KEYS[3], now_ms + tonumber(ARGV[2]), ARGV[3] .. '\\0' .. item)
+  table.insert(items, item)
+end
+return items
+"""
+
+# KEYS: leases. ARGV: visibility ms, consumer, message moved by BLMOVE.
+_LEASE_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+redis.call('ZADD', KEYS[1], now_ms + tonumber(ARGV[1]), ARGV[2] .. '\\0' .. ARGV[3])
+"""
+
+# KEYS: queue, leases, consumers. ARGV: visibility ms, processing list prefix.
+# Leases entries a consumer moved with BLMOVE but died before leasing, forgets
+# consumers with nothing in progress that stopped fetching, then pushes every
+# expired entry back to the consuming end of the queue. Returns the number requeued.
+_REAP_SCRIPT = """
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+local visibility_ms = tonumber(ARGV[1])
+for _, consumer in ipairs(redis.call('ZRANGE', KEYS[3], 0, -1)) do
+  local entries = redis.call('LRANGE', ARGV[2] .. consumer, 0, -1)
+  if #entries == 0 and tonumber(redis.call('ZSCORE', KEYS[3], consumer)) < now_ms - visibility_ms then
+    redis.call('ZREM', KEYS[3], consumer)
+  end
+  for _, entry in ipairs(entries) do
+    local member = consumer .. '\\0' .. entry
+    if not redis.call('ZSCORE', KEYS[2], member) then
+      redis.call('ZADD', KEYS[2], now_ms + visibility_ms, member)
+    end
+  end
+end
+
+local requeued = 0
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now_ms)) do
+  local sep = string.find(member, '\\0', 1, true)
+  local entry = string.sub(member, sep + 1)
+  if redis.call('LREM', ARGV[2] .. string.sub(member, 1, sep - 1), -1, entry) > 0 then
+    redis.call('RPUSH', KEYS[1], entry)
+    requeued = requeued + 1
+  end
+  redis.call('ZREM', KEYS[2], member)
+end
+return requeued
+"""
+
+
+class ReliableListTransport:
+    """
+    Redis list with at-least-once delivery.
+
+    Fetched messages are moved atomically (LMOVE / BLMOVE) into this
+    consumer's processing list and leased for ``visibility_timeout_ms``;
+    ``ack()`` removes them. Any consumer periodically requeues entries whose
+    lease expired, e.g. because their consumer crashed, so they are processed
+    again. Producers push exactly as to a plain list.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        queue_name: str,
+        consumer: str,
+        visibility_timeout_ms: int = 60_000,
+    ) -> None:
+        if "\0" in consumer:
+            raise ValueError("consumer name must not contain NUL")
+        self._redis = redis_client
+        self._queue_name = queue_name
+        self._consumer = consumer
+        self._visibility_timeout_ms = visibility_timeout_ms
+        self._processing = processing_key(queue_name, consumer)
+        self._leases = leases_key(queue_name)
+        self._consumers = consumers_key(queue_name)
+        self._fetch_script = redis_client.register_script(_FETCH_SCRIPT)
+        self._lease_script = redis_client.register_script(_LEASE_SCRIPT)
+        self._reap_script = redis_client.register_script(_REAP_SCRIPT)
+        self._next_reap_at = 0.0
+
+    def ensure_group(self) -> None:
+        """Nothing to set up; every fetch registers the consumer with the reaper."""
+
+    def publish(self, messages: Sequence[bytes]) -> None:
+        if messages:
+            self._redis.lpush(self._queue_name, *messages)
+
+    def fetch(self, count: int, block_seconds: int) -> list[Delivery]:
+        """Take up to ``count`` oldest messages; waits with BLMOVE only on an empty queue."""
+        self.reap()
+        items: Any = self._fetch_script(
+            keys=[self._queue_name, self._processing, self._leases, self._consumers],
+            args=[max(count, 1), self._visibility_timeout_ms, self._consumer],
+        )
+        if items:
+            return [Delivery(data=data) for data in items]
+
+        item: Any = self._redis.blmove(self._queue_name, self._processing, block_seconds, "RIGHT", "LEFT")
+        if item is None:
+            return []
+        self._lease_script(keys=[self._leases], args=[self._visibility_timeout_ms, self._consumer, item])
+        return [Delivery(data=item)]
+
+    def ack(self, deliveries: Sequence[Delivery]) -> None:
+        if not deliveries:
+            return
+        pipe = self._redis.pipeline(transaction=True)
+        for delivery in deliveries:
+            pipe.lrem(self._processing, -1, delivery.data)
+            pipe.zrem(self._leases, self._consumer.encode("utf-8") + b"\0" + delivery.data)
+        pipe.execute()
+
+    def reap(self) -> int:
+        """Requeue entries with expired leases; runs at most twice per visibility timeout."""
+        now = time.monotonic()
+        if now < self._next_reap_at:
+            return 0
+        self._next_reap_at = now + self._visibility_timeout_ms / 2000
+        requeued = int(
+            self._reap_script(
+                keys=[self._queue_name, self._leases, self._consumers],
+                args=[self._visibility_timeout_ms, processing_key(self._queue_name, "")],
+            )
+        )
+        if requeued:
+            logging.warning("requeued %s entries with expired leases to %s", requeued, self._queue_name)
+        return requeued
+
+    def stats(self) -> dict[str, int]:
+        """Queue length, entries this consumer is processing and leased entries of all consumers."""
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.llen(self._queue_name)
+        pipe.llen(self._processing)
+        pipe.zcard(self._leases)
+        length, processing, leased = pipe.execute()
+        return {"length": int(length), "processing": int(processing), "leased": int(leased)}
+
+
+QueueTransport = ListTransport | ReliableListTransport | StreamTransport
+
+
+def log_queue_stats(name: str, transport: QueueTransport) -> None:
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("%s queue: %s", name, transport.stats())
+
+
+def create_transport(
+    redis_client: redis.Redis,
+    queue_name: str,
+    transport: str,
+    group: str = "",
+    consumer: str = "",
+    claim_idle_ms: int = 60_000,
+) -> QueueTransport:
+    """
+    Build the transport for a queue; ``group`` matters only for streams and
+    ``consumer`` only for streams and reliable lists. ``claim_idle_ms`` is the
+    stream claim idle time and the reliable list visibility timeout.
+
+    Consumers must pass a client created with ``decode_responses=False`` and
+    call ``ensure_group()`` before the first ``fetch()``.
+    """
+    if transport == TRANSPORT_STREAM:
+        return StreamTransport(
+            redis_client,
+            stream_name=queue_name,
+            group=group or f"{queue_name}-consumers",
+            consumer=consumer or default_consumer_name(),
+            claim_idle_ms=claim_idle_ms,
+        )
+    if transport == TRANSPORT_RELIABLE_LIST:
+        return ReliableListTransport(
+            redis_client,
+            queue_name,
+            consumer=consumer or default_consumer_name(),
+            visibility_timeout_ms=claim_idle_ms,
+        )
+    return ListTransport(redis_client, queue_name)
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any
+
+import redis
+import redis.asyncio as aioredis
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.getenv(name, default).strip() or default
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return int(raw)
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return float(raw)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
+
+@dataclass(frozen=True)
+class RedisSettings:
+    host: str
+    port: int
+    db: int
+    unix_socket_path: str
+    max_connections: int
+    pool_timeout_seconds: float
+    socket_timeout_seconds: float
+    socket_connect_timeout_seconds: float
+    socket_keepalive: bool
+    health_check_interval_seconds: int
+    block_timeout_seconds: int
+
+
+def load_redis_settings() -> RedisSettings:
+    """
+    Load Redis connection settings from environment variables.
+
+    Blocking reads (``BRPOP`` and friends) must use ``block_timeout_seconds``,
+    which has to stay below ``socket_timeout_seconds``; otherwise the socket
+    timeout fires while the server is still legitimately blocking.
+    """
+    settings = RedisSettings(
+        host=_env_str("REDIS_HOST", "localhost"),
+        port=_env_int("REDIS_PORT", 6379),
+        db=_env_int("REDIS_DB", 0),
+        unix_socket_path=os.getenv("REDIS_UNIX_SOCKET", "").strip(),
+        max_connections=_env_int("REDIS_MAX_CONNECTIONS", 50),
+        pool_timeout_seconds=_env_float("REDIS_POOL_TIMEOUT_SECONDS", 5.0),
+        socket_timeout_seconds=_env_float("REDIS_SOCKET_TIMEOUT_SECONDS", 10.0),
+        socket_connect_timeout_seconds=_env_float("REDIS_CONNECT_TIMEOUT_SECONDS", 5.0),
+        socket_keepalive=_env_bool("REDIS_SOCKET_KEEPALIVE", True),
+        health_check_interval_seconds=_env_int("REDIS_HEALTH_CHECK_INTERVAL_SECONDS", 30),
+        block_timeout_seconds=_env_int("REDIS_BLOCK_TIMEOUT_SECONDS", 5),
+    )
+    if settings.max_connections < 1:
+        raise ValueError("REDIS_MAX_CONNECTIONS must be >= 1")
+    if settings.block_timeout_seconds < 1 or settings.block_timeout_seconds >= settings.socket_timeout_seconds:
+        raise ValueError("REDIS_BLOCK_TIMEOUT_SECONDS must be >= 1 and below REDIS_SOCKET_TIMEOUT_SECONDS")
+    return settings
+
+
+def _connection_kwargs(settings: RedisSettings, decode_responses: bool) -> dict[str, Any]:
+    kwargs: dict[str, Any] = {
+        "db": settings.db,
+        "socket_timeout": settings.socket_timeout_seconds,
+        "health_check_interval": settings.health_check_interval_seconds,
+        "decode_responses": decode_responses,
+    }
+    if settings.unix_socket_path:
+        kwargs["path"] = settings.unix_socket_path
+    else:
+        kwargs.update(
+            host=settings.host,
+            port=settings.port,
+            socket_connect_timeout=settings.socket_connect_timeout_seconds,
+            socket_keepalive=settings.socket_keepalive,
+        )
+    return kwargs
+
+
+class _CountingBlockingConnectionPool(redis.BlockingConnectionPool):
+    """Blocking pool that counts the connections it creates and hands out, for ``pool_stats``."""
+
+    def reset(self) -> None:
+        self.created_connections = 0
+        self.checked_out: set[Any] = set()
+        super().reset()
+
+    def make_connection(self) -> Any:
+        connection = super().make_connection()
+        self.created_connections += 1
+        return connection
+
+    def get_connection(self, *args: Any, **kwargs: Any) -> Any:
+        connection = super().get_connection(*args, **kwargs)
+        self.checked_out.add(connection)
+        return connection
+
+    def release(self, connection: Any) -> None:
+        # Also reached from inside get_connection when a fresh connection
+        # fails its check, before it was counted; discard ignores it then.
+        self.checked_out.discard(connection)
+        super().release(connection)
+
+
+class _AsyncCountingBlockingConnectionPool(aioredis.BlockingConnectionPool):
+    """asyncio counterpart of ``_CountingBlockingConnectionPool``."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        # Unlike the sync pool, the asyncio one does not call reset() on init.
+        self.created_connections = 0
+        self.checked_out: set[Any] = set()
+        super().__init__(*args, **kwargs)
+
+    def reset(self) -> None:
+        self.created_connections = 0
+        self.checked_out = set()
+        super().reset()
+
+    def make_connection(self) -> Any:
+        connection = super().make_connection()
+        self.created_connections += 1
+        return connection
+
+    async def get_connection(self, *args: Any, **kwargs: Any) -> Any:
+        connection = await super().get_connection(*args, **kwargs)
+        self.checked_out.add(connection)
+        return connection
+
+    async def release(self, connection: Any) -> None:
+        self.checked_out.discard(connection)
+        await super().release(connection)
+
+
+def create_redis_client(settings: RedisSettings, decode_responses: bool = True) -> redis.Redis:
+    """Create a client on an explicit pool; callers wait for a free connection instead of opening more."""
+    kwargs = _connection_kwargs(settings, decode_responses)
+    if settings.unix_socket_path:
+        kwargs["connection_class"] = redis.UnixDomainSocketConnection
+    pool = _CountingBlockingConnectionPool(
+        max_connections=settings.max_connections,
+        timeout=settings.pool_timeout_seconds,  # type: ignore[arg-type]
+        **kwargs,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def create_async_redis_client(settings: RedisSettings, decode_responses: bool = True) -> aioredis.Redis:
+    """asyncio counterpart of ``create_redis_client``."""
+    kwargs = _connection_kwargs(settings, decode_responses)
+    if settings.unix_socket_path:
+        kwargs["connection_class"] = aioredis.UnixDomainSocketConnection
+    pool = _AsyncCountingBlockingConnectionPool(  # type: ignore[call-overload]
+        max_connections=settings.max_connections,
+        timeout=settings.pool_timeout_seconds,
+        **kwargs,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def pool_stats(client: redis.Redis | aioredis.Redis) -> dict[str, int]:
+    """
+    Return connection usage of the client's pool: max, created, idle and in-use connections.
+
+    Only pools made by ``create_redis_client``/``create_async_redis_client``
+    count their connections; for any other pool just the maximum is known.
+    """
+    pool: Any = client.connection_pool
+    stats = {"max": int(pool.max_connections)}
+    if isinstance(pool, _CountingBlockingConnectionPool | _AsyncCountingBlockingConnectionPool):
+        in_use = len(pool.checked_out)
+        stats.update(created=pool.created_connections, idle=pool.created_connections - in_use, in_use=in_use)
+    return stats
+
+
+def log_pool_stats(name: str, client: redis.Redis | aioredis.Redis) -> None:
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("%s redis pool: %s", name, pool_stats(client))
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+
+import redis
+
+# Results are partitioned by host. Workers publish to the shard queue of their
+# host, chosen by a stable hash, and each shard queue is drained by exactly one
+# result writer: the holder of the shard's lease. Every result of a host thus
+# goes through one writer, in queue order, and adding shards adds writers
+# without two of them ever writing the same target. With one shard the queue
+# keeps its plain name, so unsharded deployments are unchanged.
+
+
+def shard_for(host: str, shards: int) -> int:
+    """Shard of ``host``; stable across processes and Python versions, unlike ``hash()``."""
+    if shards <= 1:
+        return 0
+    digest = hashlib.blake2b(host.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def shard_queue_name(queue_name: str, shard: int, shards: int) -> str:
+    return queue_name if shards <= 1 else f"{queue_name}:shard:{shard}"
+
+
+def validate_shard(shards: int, shard_index: int) -> tuple[int, int]:
+    if shards < 1:
+        raise ValueError("RESULT_SHARDS must be >= 1")
+    if not 0 <= shard_index < shards:
+        raise ValueError(f"WRITER_SHARD_INDEX must be between 0 and {shards - 1}, got {shard_index}")
+    return shards, shard_index
+
+
+def writer_lease_key(queue_name: str) -> str:
+    return f"{queue_name}:writer-lease"
+
+
+# KEYS: lease. ARGV: owner, ttl ms. Extends the lease when held by owner,
+# takes it when free. Returns 1 when owner holds the lease afterwards.
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('PEXPIRE', KEYS[1], ARGV[2])
+  return 1
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+  return 1
+end
+return 0
+"""
+
+# KEYS: lease. ARGV: owner.
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class WriterLease:
+    """
+    Exclusive right to write one shard, held for ``ttl_ms`` after each renewal.
+
+    A writer that crashes loses the lease once it expires; a standby replica
+    with the same shard index then takes over.
+    """
+
+    def __init__(self, redis_client: redis.Redis, queue_name: str, owner: str, ttl_ms: int = 30_000) -> None:
+        self._key = writer_lease_key(queue_name)
+        self._owner = owner
+        self._ttl_ms = ttl_ms
+        self._renew_script = redis_client.register_script(_RENEW_SCRIPT)
+        self._release_script = redis_client.register_script(_RELEASE_SCRIPT)
+
+    @property
+    def ttl_seconds(self) -> float:
+        return self._ttl_ms / 1000
+
+    def renew(self) -> bool:
+        """Take or extend the lease; False when another writer holds it."""
+        return bool(self._renew_script(keys=[self._key], args=[self._owner, self._ttl_ms]))
+
+    def acquire(self, stopping: threading.Event) -> bool:
+        """Wait until the lease is ours; False when ``stopping`` is set first."""
+        while not stopping.is_set():
+            if self.renew():
+                return True
+            stopping.wait(self.ttl_seconds / 3)
+        return False
+
+    def release(self) -> None:
+        self._release_script(keys=[self._key], args=[self._owner])
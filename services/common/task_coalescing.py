@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any
+
+import redis
+
+# Identical pending commands share one queued task (the leader). The gateway
+# records the leader per command in the in-flight hash as "<task_id>|<ms>"
+# and collects requester task_ids per leader in the requesters hash as a
+# comma-separated list. The worker claims the task right after popping it:
+# the in-flight entry goes away, so commands arriving after that start a fresh
+# task, but the requesters stay until the result is published and the task
+# released, so a redelivered task still answers all of them. When an in-flight
+# entry outlives its ttl the leader is presumed lost and the next identical
+# command becomes the leader, taking over the old leader's requesters.
+
+
+def inflight_key(queue_name: str) -> str:
+    return f"{queue_name}:inflight"
+
+
+def requesters_key(queue_name: str) -> str:
+    return f"{queue_name}:requesters"
+
+
+# KEYS: inflight hash, requesters hash. ARGV[1] command, ARGV[2] leader task_id.
+_CLAIM_SCRIPT = """
+local leader = redis.call('HGET', KEYS[1], ARGV[1])
+if leader and string.find(leader, ARGV[2] .. '|', 1, true) == 1 then
+  redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return redis.call('HGET', KEYS[2], ARGV[2])
+"""
+
+
+class TaskCoalescer:
+    """Worker side of task coalescing: closes the in-flight entry of a popped task and drops its requesters once served."""
+
+    def __init__(self, redis_client: redis.Redis, queue_name: str) -> None:
+        self._redis = redis_client
+        self._keys = [inflight_key(queue_name), requesters_key(queue_name)]
+        self._claim_script = redis_client.register_script(_CLAIM_SCRIPT)
+
+    def claim(self, command: str, task_id: str, client: Any = None) -> list[str]:
+        """Return task_ids of every requester served by this task (at least ``task_id`` itself)."""
+        raw = self._claim_script(keys=self._keys, args=[command, task_id], client=client)
+        return parse_requesters(raw, task_id)
+
+    def claim_many(self, tasks: Sequence[tuple[str, str]]) -> list[list[str]]:
+        """Claim several (command, task_id) pairs in one pipelined round trip."""
+        if not tasks:
+            return []
+        pipe = self._redis.pipeline(transaction=False)
+        for command, task_id in tasks:
+            self._claim_script(keys=self._keys, args=[command, task_id], client=pipe)
+        return [parse_requesters(raw, task_id) for raw, (_, task_id) in zip(pipe.execute(), tasks, strict=True)]
+
+    def release_many(self, task_ids: Sequence[str]) -> None:
+        """Forget the requesters of tasks whose results are published."""
+        if task_ids:
+            self._redis.hdel(self._keys[1], *task_ids)
+
+
+def parse_requesters(raw: str | bytes | None, task_id: str) -> list[str]:
+    if not raw:
+        return [task_id]
+    text = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+    return [requester for requester in text.split(",") if requester]
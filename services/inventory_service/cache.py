@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import copy
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from legacy.src.agent.inventory.collectors import ERRORS_SECTION
+
+
+@dataclass
+class _Entry:
+    version: Any
+    payload: dict[str, Any]
+    stored_at: float
+
+
+class InventoryCache:
+    """
+    Cache of the collected inventory, invalidated by a cheap version probe.
+
+    ``read_version`` returns a value that changes whenever the source data
+    may have changed (the registry key's last-write time); a cached payload
+    is served while the version is unchanged and the entry is younger than
+    ``max_age_seconds``. If the probe fails, inventory is collected uncached.
+    A partial payload (one with ``collector_errors``) is returned but not
+    cached, so the next call collects again instead of repeating the gap.
+    """
+
+    def __init__(
+        self,
+        collect: Callable[[], dict[str, Any]],
+        read_version: Callable[[], Any],
+        max_age_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._collect = collect
+        self._read_version = read_version
+        self._max_age_seconds = max_age_seconds
+        self._clock = clock
+        self._entry: _Entry | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> dict[str, Any]:
+        try:
+            version = self._read_version()
+        except Exception:
+            logging.warning("inventory cache: version probe failed, collecting uncached", exc_info=True)
+            with self._lock:
+                self.misses += 1
+            return self._collect()
+
+        with self._lock:
+            entry = self._entry
+            if (
+                entry is not None
+                and entry.version == version
+                and self._clock() - entry.stored_at < self._max_age_seconds
+            ):
+                self.hits += 1
+                return copy.deepcopy(entry.payload)
+            self.misses += 1
+            logging.info("inventory cache miss, collecting (hits=%s, misses=%s)", self.hits, self.misses)
+
+        payload = self._collect()
+        with self._lock:
+            if ERRORS_SECTION in payload:
+                logging.info(
+                    "inventory cache: not caching partial payload, failed: %s", ", ".join(payload[ERRORS_SECTION])
+                )
+                self._entry = None
+            else:
+                self._entry = _Entry(version=version, payload=copy.deepcopy(payload), stored_at=self._clock())
+        return payload
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def log_cache_stats(name: str, cache: InventoryCache) -> None:
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("%s inventory cache: %s", name, cache.stats())
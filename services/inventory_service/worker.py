@@ -1,15 +1,52 @@
 from __future__ import annotations
 
-import json
 import logging
 import os
+import signal
+import socket
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
 import redis
 
+from legacy.src.agent.inventory.collectors import DEFAULT_COLLECTORS, parse_collectors
+from legacy.src.agent.inventory.providers import (
+    DEFAULT_COLLECTOR_TIMEOUT_SECONDS,
+    DEFAULT_SNAPSHOT_DIR,
+    PROVIDER_WINREG,
+    InventoryProvider,
+    ProviderSettings,
+    create_provider,
+    validate_provider_settings,
+)
 from legacy.src.agent.inventory.windows_registry import collect_windows_inventory
 from legacy.src.agent.logging_setup import setup_logging
+from services.common.envelope import (
+    WIRE_FORMAT_JSON,
+    ResultMessage,
+    TaskMessage,
+    decode_task,
+    encode_result,
+    validate_wire_format,
+)
+from services.common.payload_delta import DeltaEncoder
+from services.common.queue_transport import (
+    TRANSPORT_LIST,
+    Delivery,
+    QueueTransport,
+    create_transport,
+    log_queue_stats,
+    validate_transport,
+)
+from services.common.redis_client import create_redis_client, load_redis_settings, log_pool_stats
+from services.common.result_sharding import shard_for, shard_queue_name, validate_shard
+from services.common.task_coalescing import TaskCoalescer
+from services.inventory_service.cache import InventoryCache, log_cache_stats
 
 
 def _env_str(name: str, default: str) -> str:
@@ -23,54 +60,294 @@ def _env_int(name: str, default: int) -> int:
     return int(raw)
 
 
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return float(raw)
+
+
+def parse_task(raw: bytes) -> TaskMessage | None:
+    """Decode a queued task; returns None for tasks that produce no result."""
+    try:
+        task = decode_task(raw)
+    except Exception:
+        logging.exception("inventory worker got malformed task: %r", raw)
+        return None
+
+    command = task.command.strip().lower()
+    if command != "inventory":
+        logging.warning("inventory worker ignored unsupported command: %s", command)
+        return None
+    task.command = command
+    return task
+
+
+def run_task(
+    task: TaskMessage,
+    task_ids: list[str],
+    collect: Callable[[], dict[str, Any]] | None = None,
+) -> ResultMessage:
+    """Collect inventory for a task serving ``task_ids`` coalesced requests."""
+    task_id = task.task_id
+    if len(task_ids) > 1:
+        logging.info("task_id=%s serves %s coalesced requests", task_id, len(task_ids))
+
+    try:
+        payload = (collect or collect_windows_inventory)()
+        return ResultMessage(
+            task_id=task_id,
+            task_ids=task_ids,
+            status="ok",
+            payload=payload,
+            ts=datetime.now(timezone.utc),
+            host=socket.gethostname(),
+        )
+    except Exception as exc:
+        logging.exception("inventory collection failed for task_id=%s", task_id)
+        return ResultMessage(
+            task_id=task_id,
+            task_ids=task_ids,
+            status="error",
+            error=str(exc),
+            ts=datetime.now(timezone.utc),
+            host=socket.gethostname(),
+        )
+
+
+def process_tasks(
+    raws: Sequence[bytes],
+    coalescer: TaskCoalescer,
+    collect: Callable[[], dict[str, Any]] | None = None,
+) -> list[ResultMessage]:
+    """Run a batch of tasks; requesters of all of them are claimed in one round trip."""
+    tasks = [task for task in map(parse_task, raws) if task is not None]
+    requesters = coalescer.claim_many([(task.command, task.task_id) for task in tasks])
+    return [run_task(task, task_ids, collect) for task, task_ids in zip(tasks, requesters, strict=True)]
+
+
+def release_requesters(coalescer: TaskCoalescer, task_ids: Sequence[str]) -> None:
+    """Drop requesters of published tasks; a failure only leaves stale entries behind."""
+    try:
+        coalescer.release_many(task_ids)
+    except redis.RedisError:
+        logging.warning("inventory worker failed to release requesters of %s task(s)", len(task_ids), exc_info=True)
+
+
+class ConcurrentTaskRunner:
+    """
+    Run tasks on a bounded thread pool.
+
+    The caller asks ``free_slots()`` before fetching and never takes more
+    deliveries than that, so no task waits in a local backlog. Each finished
+    task publishes its result and acks its own delivery; a task that failed to
+    publish stays unacked (streams hand it to another consumer later).
+    Results go through ``delta`` when one is given.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        tasks: QueueTransport,
+        results: QueueTransport,
+        coalescer: TaskCoalescer,
+        wire_format: str,
+        collect: Callable[[], dict[str, Any]] | None = None,
+        delta: DeltaEncoder | None = None,
+        compress_min_bytes: int = 0,
+    ) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inventory-task")
+        self._tasks = tasks
+        self._results = results
+        self._coalescer = coalescer
+        self._wire_format = wire_format
+        self._compress_min_bytes = compress_min_bytes
+        self._collect = collect
+        self._delta = delta
+        self._free = concurrency
+        self._slots = threading.Condition()
+
+    def free_slots(self, timeout: float) -> int:
+        """Wait up to ``timeout`` seconds for a free slot; returns the number of free slots."""
+        with self._slots:
+            self._slots.wait_for(lambda: self._free > 0, timeout)
+            return self._free
+
+    def submit(self, deliveries: Sequence[Delivery]) -> bool:
+        """
+        Start the tasks of ``deliveries``. Returns False when Redis failed
+        before any task started; the deliveries then stay unacked (streams
+        redeliver them) and the caller should back off.
+        """
+        runnable: list[tuple[Delivery, TaskMessage]] = []
+        skipped: list[Delivery] = []
+        for delivery in deliveries:
+            task = parse_task(delivery.data)
+            if task is None:
+                skipped.append(delivery)
+            else:
+                runnable.append((delivery, task))
+
+        try:
+            self._tasks.ack(skipped)
+            requesters = self._coalescer.claim_many([(task.command, task.task_id) for _, task in runnable])
+        except redis.RedisError:
+            logging.exception("inventory worker: redis failed while claiming %s task(s), retrying", len(runnable))
+            return False
+        with self._slots:
+            self._free -= len(runnable)
+        for (delivery, task), task_ids in zip(runnable, requesters, strict=True):
+            self._executor.submit(self._run, delivery, task, task_ids)
+        return True
+
+    def shutdown(self) -> None:
+        """Wait for in-flight tasks to publish their results."""
+        self._executor.shutdown(wait=True)
+
+    def _publish(self, results: list[ResultMessage]) -> None:
+        self._results.publish(
+            [encode_result(result, self._wire_format, self._compress_min_bytes) for result in results]
+        )
+
+    def _run(self, delivery: Delivery, task: TaskMessage, task_ids: list[str]) -> None:
+        try:
+            result = run_task(task, task_ids, self._collect)
+            if self._delta is not None:
+                self._delta.publish([result], self._publish)
+            else:
+                self._publish([result])
+            self._tasks.ack([delivery])
+        except Exception:
+            logging.exception("inventory worker failed to publish result for task_id=%s", task.task_id)
+        else:
+            release_requesters(self._coalescer, [task.task_id])
+        finally:
+            with self._slots:
+                self._free += 1
+                self._slots.notify()
+
+
+def load_provider_settings() -> ProviderSettings:
+    return validate_provider_settings(
+        ProviderSettings(
+            name=_env_str("INVENTORY_PROVIDER", PROVIDER_WINREG).lower(),
+            collectors=parse_collectors(_env_str("INVENTORY_COLLECTORS", ",".join(DEFAULT_COLLECTORS))),
+            collector_timeout_seconds=_env_float(
+                "INVENTORY_COLLECTOR_TIMEOUT_SECONDS", DEFAULT_COLLECTOR_TIMEOUT_SECONDS
+            ),
+            snapshot_path=Path(_env_str("INVENTORY_SNAPSHOT_PATH", str(DEFAULT_SNAPSHOT_DIR))),
+            latency_ms=_env_float("INVENTORY_SIM_LATENCY_MS", 0.0),
+            jitter_ms=_env_float("INVENTORY_SIM_JITTER_MS", 0.0),
+            error_rate=_env_float("INVENTORY_SIM_ERROR_RATE", 0.0),
+        )
+    )
+
+
+def build_inventory_cache(provider: InventoryProvider) -> InventoryCache | None:
+    """Inventory cache, or None when INVENTORY_CACHE_MAX_AGE_SECONDS is 0."""
+    max_age_seconds = _env_float("INVENTORY_CACHE_MAX_AGE_SECONDS", 300.0)
+    if max_age_seconds <= 0:
+        return None
+    return InventoryCache(provider.collect, provider.last_write_time, max_age_seconds)
+
+
 def run_worker() -> None:
     log_dir = Path(_env_str("LOG_DIR", "."))
     log_level = _env_str("LOG_LEVEL", "info")
     setup_logging(log_dir, log_level)
 
-    redis_host = _env_str("REDIS_HOST", "localhost")
-    redis_port = _env_int("REDIS_PORT", 6379)
+    redis_settings = load_redis_settings()
     task_queue_name = _env_str("TASK_QUEUE_NAME", "inventory_tasks")
     result_queue_name = _env_str("RESULT_QUEUE_NAME", "inventory_results")
+    wire_format = validate_wire_format(_env_str("QUEUE_WIRE_FORMAT", WIRE_FORMAT_JSON))
+    compress_min_bytes = _env_int("QUEUE_COMPRESS_MIN_BYTES", 0)
+    transport = validate_transport(_env_str("QUEUE_TRANSPORT", TRANSPORT_LIST))
+    read_count = _env_int("QUEUE_READ_COUNT", 10)
 
-    client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+    client = create_redis_client(redis_settings, decode_responses=False)
     client.ping()
-    logging.info("inventory worker started, listening queue %s", task_queue_name)
+    coalescer = TaskCoalescer(client, task_queue_name)
+    provider = create_provider(load_provider_settings())
+    cache = build_inventory_cache(provider)
+    collect = cache.get if cache is not None else provider.collect
+    delta = DeltaEncoder(max(_env_int("INVENTORY_FULL_PAYLOAD_EVERY", 20), 1))
+    tasks = create_transport(
+        client,
+        task_queue_name,
+        transport,
+        group=_env_str("QUEUE_CONSUMER_GROUP", "inventory-workers"),
+        consumer=os.getenv("QUEUE_CONSUMER_NAME", "").strip(),
+        claim_idle_ms=_env_int("QUEUE_CLAIM_IDLE_MS", 60_000),
+    )
+    tasks.ensure_group()
+    # Results of this host always go to the same shard, so one writer sees them in order.
+    result_shards, _ = validate_shard(_env_int("RESULT_SHARDS", 1), 0)
+    result_shard_queue = shard_queue_name(
+        result_queue_name, shard_for(socket.gethostname(), result_shards), result_shards
+    )
+    results = create_transport(client, result_shard_queue, transport)
+    concurrency = max(_env_int("INVENTORY_WORKER_CONCURRENCY", 1), 1)
+    runner = (
+        ConcurrentTaskRunner(concurrency, tasks, results, coalescer, wire_format, collect, delta, compress_min_bytes)
+        if concurrency > 1
+        else None
+    )
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    logging.info(
+        "inventory worker started, listening %s %s with %s concurrent task(s), provider %s, results to %s",
+        transport,
+        task_queue_name,
+        concurrency,
+        provider.name,
+        result_shard_queue,
+    )
+
+    while not stopping.is_set():
+        fetch_count = read_count
+        if runner is not None:
+            free = runner.free_slots(timeout=redis_settings.block_timeout_seconds)
+            if free == 0:
+                continue
+            fetch_count = min(read_count, free)
 
-    while True:
-        _, raw = client.brpop(task_queue_name, timeout=0)
-        task_id = ""
-        command = ""
         try:
-            message = json.loads(raw)
-            task_id = str(message.get("task_id", ""))
-            command = str(message.get("command", "")).strip().lower()
-        except Exception:
-            logging.exception("inventory worker got malformed task: %s", raw)
+            deliveries = tasks.fetch(fetch_count, redis_settings.block_timeout_seconds)
+        except redis.RedisError:
+            logging.exception("inventory worker: redis read failed, retrying")
+            time.sleep(1.0)
             continue
-
-        if command != "inventory":
-            logging.warning("inventory worker ignored unsupported command: %s", command)
+        if not deliveries:
+            log_pool_stats("inventory worker", client)
+            log_queue_stats("inventory worker", tasks)
+            if cache is not None:
+                log_cache_stats("inventory worker", cache)
             continue
 
+        if runner is not None:
+            if not runner.submit(deliveries):
+                time.sleep(1.0)
+            continue
         try:
-            payload = collect_windows_inventory()
-            result = {
-                "task_id": task_id,
-                "status": "ok",
-                "payload": payload,
-                "ts": datetime.now(timezone.utc).isoformat(),
-            }
-        except Exception as exc:
-            logging.exception("inventory collection failed for task_id=%s", task_id)
-            result = {
-                "task_id": task_id,
-                "status": "error",
-                "error": str(exc),
-                "ts": datetime.now(timezone.utc).isoformat(),
-            }
-
-        client.lpush(result_queue_name, json.dumps(result, ensure_ascii=False))
+            messages = process_tasks([delivery.data for delivery in deliveries], coalescer, collect)
+            delta.publish(
+                messages,
+                lambda encoded: results.publish(
+                    [encode_result(message, wire_format, compress_min_bytes) for message in encoded]
+                ),
+            )
+            tasks.ack(deliveries)
+        except redis.RedisError:
+            logging.exception("inventory worker: redis failed while processing %s task(s), retrying", len(deliveries))
+            time.sleep(1.0)
+            continue
+        release_requesters(coalescer, [message.task_id for message in messages])
+
+    logging.info("inventory worker stopping, draining in-flight tasks")
+    if runner is not None:
+        runner.shutdown()
+    logging.info("inventory worker stopped")
 
 
 if __name__ == "__main__":
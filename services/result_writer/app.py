@@ -3,16 +3,29 @@ from __future__ import annotations
 import logging
 import os
 from concurrent import futures
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, cast
 
 import grpc
 
+from legacy.src.agent.codec import dumps
 from legacy.src.agent.logging_setup import setup_logging
 from proto import agent_pb2, agent_pb2_grpc
+from services.common.envelope import ResultMessage
+from services.common.result_sharding import validate_shard
+from services.result_writer.sqlite_store import (
+    ResultQuery,
+    ShardedSqliteResultStore,
+    SqliteResultStore,
+    open_result_reader,
+)
 
 _agent_pb2 = cast(Any, agent_pb2)
 HealthResponse = _agent_pb2.HealthResponse
+GetResultResponse = _agent_pb2.GetResultResponse
+QueryResultsResponse = _agent_pb2.QueryResultsResponse
+StoredResult = _agent_pb2.StoredResult
 
 
 def _env_str(name: str, default: str) -> str:
@@ -26,11 +39,75 @@ def _env_int(name: str, default: int) -> int:
     return int(raw)
 
 
-class ResultWriterHealthServicer(agent_pb2_grpc.ResultWriterServicer):
+def stored_result(result: ResultMessage) -> Any:
+    return StoredResult(
+        task_id=result.task_id,
+        task_ids=result.task_ids,
+        status=result.status,
+        payload_json=dumps(result.payload).decode("utf-8") if result.payload is not None else "",
+        error=result.error,
+        ts_ms=int(result.ts.timestamp() * 1000),
+        host=result.host,
+    )
+
+
+def _from_ms(value: int) -> datetime | None:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc) if value > 0 else None
+
+
+class ResultWriterServicer(agent_pb2_grpc.ResultWriterServicer):
+    """
+    Health plus reads from the SQLite result store the writer fills (all
+    shard databases when RESULT_SHARDS > 1).
+
+    Without a store (RESULT_DB_PATH unset) the read RPCs fail with
+    FAILED_PRECONDITION.
+    """
+
+    def __init__(self, store: SqliteResultStore | ShardedSqliteResultStore | None = None) -> None:
+        self._store = store
+
     def Health(self, request: Any, context: grpc.ServicerContext) -> Any:
         del request, context
         return HealthResponse(ok=True, service="result-writer")
 
+    def GetResult(self, request: Any, context: grpc.ServicerContext) -> Any:
+        if self._store is None:
+            return self._no_store(context, GetResultResponse())
+        result = self._store.get(request.task_id)
+        if result is None:
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details(f"no result for task {request.task_id}")
+            return GetResultResponse()
+        return GetResultResponse(result=stored_result(result))
+
+    def QueryResults(self, request: Any, context: grpc.ServicerContext) -> Any:
+        if self._store is None:
+            return self._no_store(context, QueryResultsResponse())
+        query = ResultQuery(
+            host=request.host,
+            status=request.status,
+            since=_from_ms(request.since_ms),
+            until=_from_ms(request.until_ms),
+            page_size=request.page_size,
+            page_token=request.page_token,
+        )
+        try:
+            results, next_page_token = self._store.query(query)
+        except ValueError as exc:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(exc))
+            return QueryResultsResponse()
+        return QueryResultsResponse(
+            results=[stored_result(result) for result in results], next_page_token=next_page_token
+        )
+
+    @staticmethod
+    def _no_store(context: grpc.ServicerContext, response: Any) -> Any:
+        context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+        context.set_details("result store is not configured, set RESULT_DB_PATH")
+        return response
+
 
 def serve() -> None:
     log_dir = Path(_env_str("LOG_DIR", "."))
@@ -40,14 +117,19 @@ def serve() -> None:
     grpc_host = _env_str("GRPC_HOST", "0.0.0.0")
     grpc_port = _env_int("GRPC_PORT", 50053)
     max_workers = _env_int("GRPC_WORKERS", 5)
+    db_path = os.getenv("RESULT_DB_PATH", "").strip()
+    shards, _ = validate_shard(_env_int("RESULT_SHARDS", 1), 0)
+    store = open_result_reader(Path(db_path), shards) if db_path else None
 
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
-    agent_pb2_grpc.add_ResultWriterServicer_to_server(ResultWriterHealthServicer(), server)
+    agent_pb2_grpc.add_ResultWriterServicer_to_server(ResultWriterServicer(store), server)
 
     listen_addr = f"{grpc_host}:{grpc_port}"
     server.add_insecure_port(listen_addr)
     server.start()
-    logging.info("result-writer health endpoint listening on %s", listen_addr)
+    logging.info(
+        "result-writer endpoint listening on %s, result store %s (%s shard(s))", listen_addr, db_path or "off", shards
+    )
     server.wait_for_termination()
 
 
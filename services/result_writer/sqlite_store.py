@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from services.common.envelope import WIRE_FORMAT_JSON, ResultMessage, decode_result, encode_result
+
+# Results are kept in SQLite in WAL mode, so the gRPC endpoint (a separate
+# process) reads while the writer inserts. "results" holds one row per result
+# with the JSON wire-format record; "result_tasks" maps every task id a result
+# answers (coalesced requests) to its row. A flush is one transaction.
+# Queries page newest first by (ts_ms, id) with a keyset token, so a page
+# costs the same however deep it is.
+#
+# SQLite has a single writer per file, so sharded result writers each own a
+# database under shard-<n>/ and the read API merges them, paging by
+# (ts_ms, shard, id).
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+_MAX_ROW_ID = 2**63 - 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ts_ms INTEGER NOT NULL,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_host_ts ON results (host, ts_ms);
+CREATE INDEX IF NOT EXISTS results_ts ON results (ts_ms);
+CREATE TABLE IF NOT EXISTS result_tasks (
+    task_id TEXT NOT NULL,
+    result_id INTEGER NOT NULL REFERENCES results (id)
+);
+CREATE INDEX IF NOT EXISTS result_tasks_task_id ON result_tasks (task_id);
+"""
+
+
+@dataclass(frozen=True)
+class ResultQuery:
+    """Filters of ``SqliteResultStore.query``; empty values match everything, the range is [since, until)."""
+
+    host: str = ""
+    status: str = ""
+    since: datetime | None = None
+    until: datetime | None = None
+    page_size: int = DEFAULT_PAGE_SIZE
+    page_token: str = ""
+
+
+class SqliteResultStore:
+    """
+    Result history in SQLite with lookup by task_id, latest result per host and filtered queries.
+
+    The connection is shared by the threads of one process under a lock;
+    other processes open the same file with their own store.
+    """
+
+    def __init__(self, path: Path, busy_timeout_seconds: float = 5.0) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=busy_timeout_seconds, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # With WAL a commit survives a crash of the process; NORMAL only risks
+        # the last transactions on power loss and saves an fsync per commit.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def append_many(self, results: Sequence[ResultMessage]) -> None:
+        """Insert results in one transaction."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for result in results:
+                    cursor = self._db.execute(
+                        "INSERT INTO results (host, status, ts_ms, record) VALUES (?, ?, ?, ?)",
+                        (result.host, result.status, _to_ms(result.ts), encode_result(result, WIRE_FORMAT_JSON)),
+                    )
+                    self._db.executemany(
+                        "INSERT INTO result_tasks (task_id, result_id) VALUES (?, ?)",
+                        [(task_id, cursor.lastrowid) for task_id in result.task_ids or [result.task_id]],
+                    )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def get(self, task_id: str) -> ResultMessage | None:
+        """Newest stored result answering ``task_id``."""
+        row = self._fetchone(
+            "SELECT r.record FROM result_tasks t JOIN results r ON r.id = t.result_id "
+            "WHERE t.task_id = ? ORDER BY r.id DESC LIMIT 1",
+            (task_id,),
+        )
+        return decode_result(row[0]) if row is not None else None
+
+    def latest(self, host: str) -> ResultMessage | None:
+        """Stored result of ``host`` with the newest ``ts``."""
+        row = self._fetchone(
+            "SELECT record FROM results WHERE host = ? ORDER BY ts_ms DESC, id DESC LIMIT 1",
+            (host,),
+        )
+        return decode_result(row[0]) if row is not None else None
+
+    def query(self, query: ResultQuery) -> tuple[list[ResultMessage], str]:
+        """
+        One page of matching results, newest first, and the token of the next
+        page (empty after the last one). Raises ValueError on a malformed token.
+        """
+        page_size = _page_size(query)
+        cursor = _parse_page_token(query.page_token, 2) if query.page_token else None
+        rows = self.query_rows(query, page_size + 1, cursor)
+        page = rows[:page_size]
+        next_token = f"{page[-1][1]}.{page[-1][0]}" if len(rows) > page_size else ""
+        return [decode_result(record) for _, _, record in page], next_token
+
+    def stats(self) -> dict[str, int]:
+        row = self._fetchone("SELECT (SELECT COUNT(*) FROM results), (SELECT COUNT(DISTINCT host) FROM results)", ())
+        return {"results": int(row[0]), "hosts": int(row[1])}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def query_rows(
+        self, query: ResultQuery, limit: int, cursor: tuple[int, ...] | None
+    ) -> list[tuple[int, int, bytes]]:
+        """(id, ts_ms, record) rows matching ``query`` that sort before ``cursor`` (ts_ms, id)."""
+        conditions: list[str] = []
+        params: list[object] = []
+        if query.host:
+            conditions.append("host = ?")
+            params.append(query.host)
+        if query.status:
+            conditions.append("status = ?")
+            params.append(query.status)
+        if query.since is not None:
+            conditions.append("ts_ms >= ?")
+            params.append(_to_ms(query.since))
+        if query.until is not None:
+            conditions.append("ts_ms < ?")
+            params.append(_to_ms(query.until))
+        if cursor is not None:
+            ts_ms, row_id = cursor
+            conditions.append("(ts_ms < ? OR (ts_ms = ? AND id < ?))")
+            params.extend((ts_ms, ts_ms, row_id))
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+        with self._lock:
+            return self._db.execute(
+                f"SELECT id, ts_ms, record FROM results {where}ORDER BY ts_ms DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+
+    def _fetchone(self, sql: str, params: tuple[object, ...]) -> Any:
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()
+
+
+class ShardedSqliteResultStore:
+    """
+    Read side of the per-shard databases of sharded result writers, queried as one store.
+
+    A host normally lives in one shard, but after a change of RESULT_SHARDS
+    its older results stay in the previous shard, so lookups ask every shard
+    and keep the newest answer.
+    """
+
+    def __init__(self, stores: Sequence[SqliteResultStore]) -> None:
+        self._stores = list(stores)
+
+    def get(self, task_id: str) -> ResultMessage | None:
+        return _newest(store.get(task_id) for store in self._stores)
+
+    def latest(self, host: str) -> ResultMessage | None:
+        return _newest(store.latest(host) for store in self._stores)
+
+    def query(self, query: ResultQuery) -> tuple[list[ResultMessage], str]:
+        """Same contract as ``SqliteResultStore.query``; pages run newest first by (ts_ms, shard, id)."""
+        page_size = _page_size(query)
+        cursor = _parse_page_token(query.page_token, 3) if query.page_token else None
+        rows: list[tuple[int, int, int, bytes]] = []
+        for shard, store in enumerate(self._stores):
+            shard_cursor = _shard_cursor(cursor, shard)
+            rows.extend(
+                (ts_ms, shard, row_id, record)
+                for row_id, ts_ms, record in store.query_rows(query, page_size + 1, shard_cursor)
+            )
+        rows.sort(key=lambda row: row[:3], reverse=True)
+        page = rows[:page_size]
+        next_token = ".".join(map(str, page[-1][:3])) if len(rows) > page_size else ""
+        return [decode_result(record) for *_, record in page], next_token
+
+    def stats(self) -> dict[str, int]:
+        """Totals over shards; a host present in two shards is counted twice."""
+        totals = [store.stats() for store in self._stores]
+        return {name: sum(stats[name] for stats in totals) for name in ("results", "hosts")}
+
+    def close(self) -> None:
+        for store in self._stores:
+            store.close()
+
+
+def shard_db_path(path: Path, shards: int, shard_index: int) -> Path:
+    """Database of writer shard ``shard_index``: ``<dir>/shard-<n>/<name>``, or ``path`` itself unsharded."""
+    return path.parent / f"shard-{shard_index}" / path.name if shards > 1 else path
+
+
+def open_result_reader(path: Path, shards: int = 1) -> SqliteResultStore | ShardedSqliteResultStore:
+    """Store for the read API over the database(s) written by ``shards`` writers."""
+    if shards <= 1:
+        return SqliteResultStore(path)
+    return ShardedSqliteResultStore([SqliteResultStore(shard_db_path(path, shards, index)) for index in range(shards)])
+
+
+def _newest(results: Iterable[ResultMessage | None]) -> ResultMessage | None:
+    found = [result for result in results if result is not None]
+    return max(found, key=lambda result: result.ts) if found else None
+
+
+def _shard_cursor(cursor: tuple[int, ...] | None, shard: int) -> tuple[int, int] | None:
+    """Per-shard (ts_ms, id) bound of a merged (ts_ms, shard, id) cursor."""
+    if cursor is None:
+        return None
+    ts_ms, cursor_shard, row_id = cursor
+    if shard < cursor_shard:
+        return ts_ms, _MAX_ROW_ID
+    if shard > cursor_shard:
+        return ts_ms, 0
+    return ts_ms, row_id
+
+
+def _page_size(query: ResultQuery) -> int:
+    return min(query.page_size, MAX_PAGE_SIZE) if query.page_size > 0 else DEFAULT_PAGE_SIZE
+
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _parse_page_token(token: str, parts: int) -> tuple[int, ...]:
+    try:
+        values = tuple(int(part) for part in token.split("."))
+    except ValueError as exc:
+        raise ValueError(f"malformed page token: {token!r}") from exc
+    if len(values) != parts:
+        raise ValueError(f"malformed page token: {token!r}")
+    return values
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Protocol
+
+from legacy.src.agent.codec import dumps, loads
+from services.common.envelope import WIRE_FORMAT_JSON, ResultMessage, decode_result, encode_result
+
+# Segment files hold one result per line in the JSON wire format, appended in
+# arrival order and rotated by size. Each segment "<n>.log" has an index
+# "<n>.idx" with one JSON line per record: [offset, length, host, task_ids].
+# Indexes are replayed into memory on open, so a lookup is one dict access and
+# one read; a segment tail that is missing from its index (a crash between the
+# two appends) is reindexed from the segment itself.
+
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+_SEGMENT_SUFFIX = ".log"
+_INDEX_SUFFIX = ".idx"
+
+
+class ResultStore(Protocol):
+    """Result history kept by the result writer; see ``SegmentStore`` and ``SqliteResultStore``."""
+
+    def append_many(self, results: Sequence[ResultMessage]) -> None: ...
+
+    def get(self, task_id: str) -> ResultMessage | None: ...
+
+    def latest(self, host: str) -> ResultMessage | None: ...
+
+    def stats(self) -> dict[str, int]: ...
+
+    def close(self) -> None: ...
+
+
+@dataclass(frozen=True)
+class RecordLocation:
+    segment: int
+    offset: int
+    length: int
+
+
+class SegmentStore:
+    """
+    Append-only result history with lookup by task_id and latest result per host.
+
+    A segment is closed once it would grow beyond ``max_segment_bytes``; with
+    ``max_segments`` > 0 the oldest segments beyond that count are deleted
+    together with their index entries.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES,
+        max_segments: int = 0,
+    ) -> None:
+        self._directory = directory
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segments = max_segments
+        self._by_task: dict[str, RecordLocation] = {}
+        self._by_host: dict[str, RecordLocation] = {}
+        self._lock = threading.Lock()
+
+        directory.mkdir(parents=True, exist_ok=True)
+        self._segments = sorted(int(path.stem) for path in directory.glob(f"*{_SEGMENT_SUFFIX}") if path.stem.isdigit())
+        for segment in self._segments:
+            self._load_segment(segment)
+        if not self._segments:
+            self._segments.append(1)
+        self._active = self._segments[-1]
+        self._log, self._index = self._open_active()
+        self._active_size = self._log.tell()
+
+    def append_many(self, results: Sequence[ResultMessage]) -> None:
+        """Append results with one write per segment and index file."""
+        with self._lock:
+            records: list[bytes] = []
+            entries: list[tuple[int, int, str, list[str]]] = []
+            end = self._active_size
+            for result in results:
+                record = encode_result(result, WIRE_FORMAT_JSON) + b"\n"
+                if end and end + len(record) > self._max_segment_bytes:
+                    self._write(records, entries)
+                    self._rotate()
+                    records, entries, end = [], [], 0
+                entries.append((end, len(record), result.host, result.task_ids or [result.task_id]))
+                records.append(record)
+                end += len(record)
+            self._write(records, entries)
+
+    def get(self, task_id: str) -> ResultMessage | None:
+        with self._lock:
+            location = self._by_task.get(task_id)
+            return self._read(location) if location is not None else None
+
+    def latest(self, host: str) -> ResultMessage | None:
+        """Newest stored result of ``host``."""
+        with self._lock:
+            location = self._by_host.get(host)
+            return self._read(location) if location is not None else None
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"segments": len(self._segments), "tasks": len(self._by_task), "hosts": len(self._by_host)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._log.close()
+            self._index.close()
+
+    def _write(self, records: list[bytes], entries: list[tuple[int, int, str, list[str]]]) -> None:
+        if not records:
+            return
+        self._log.write(b"".join(records))
+        self._log.flush()
+        self._index.write(b"".join(_index_line(*entry) for entry in entries))
+        self._index.flush()
+        for offset, length, host, task_ids in entries:
+            self._remember(RecordLocation(self._active, offset, length), host, task_ids)
+        self._active_size += sum(len(record) for record in records)
+
+    def _rotate(self) -> None:
+        self._log.close()
+        self._index.close()
+        self._active += 1
+        self._segments.append(self._active)
+        self._log, self._index = self._open_active()
+        self._active_size = 0
+        logging.info("result store rotated to segment %s", self._active)
+
+        while self._max_segments > 0 and len(self._segments) > self._max_segments:
+            oldest = self._segments.pop(0)
+            for locations in (self._by_task, self._by_host):
+                for key in [key for key, location in locations.items() if location.segment == oldest]:
+                    del locations[key]
+            self._path(oldest, _SEGMENT_SUFFIX).unlink(missing_ok=True)
+            self._path(oldest, _INDEX_SUFFIX).unlink(missing_ok=True)
+            logging.info("result store deleted segment %s", oldest)
+
+    def _open_active(self) -> tuple[BinaryIO, BinaryIO]:
+        return self._path(self._active, _SEGMENT_SUFFIX).open("ab"), self._path(self._active, _INDEX_SUFFIX).open("ab")
+
+    def _read(self, location: RecordLocation) -> ResultMessage:
+        with self._path(location.segment, _SEGMENT_SUFFIX).open("rb") as segment:
+            segment.seek(location.offset)
+            return decode_result(segment.read(location.length))
+
+    def _remember(self, location: RecordLocation, host: str, task_ids: Sequence[str]) -> None:
+        for task_id in task_ids:
+            self._by_task[task_id] = location
+        if host:
+            self._by_host[host] = location
+
+    def _load_segment(self, segment: int) -> None:
+        """Replay the segment's index, then index (or cut off) whatever the index is missing."""
+        index_path = self._path(segment, _INDEX_SUFFIX)
+        indexed_end = 0
+        valid_bytes = 0
+        if index_path.exists():
+            for line in index_path.read_bytes().splitlines(keepends=True):
+                entry = _parse_index_line(line)
+                if entry is None:
+                    break
+                offset, length, host, task_ids = entry
+                self._remember(RecordLocation(segment, offset, length), host, task_ids)
+                indexed_end = max(indexed_end, offset + length)
+                valid_bytes += len(line)
+            with index_path.open("r+b") as index:
+                index.truncate(valid_bytes)
+
+        segment_path = self._path(segment, _SEGMENT_SUFFIX)
+        with segment_path.open("rb") as log:
+            log.seek(indexed_end)
+            tail = log.read()
+        offset = indexed_end
+        missing: list[bytes] = []
+        for line in tail.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete record")
+                result = decode_result(line)
+            except ValueError:
+                logging.warning("result store dropped a torn record at %s:%s", segment_path, offset)
+                break
+            task_ids = result.task_ids or [result.task_id]
+            self._remember(RecordLocation(segment, offset, len(line)), result.host, task_ids)
+            missing.append(_index_line(offset, len(line), result.host, task_ids))
+            offset += len(line)
+        if offset < indexed_end + len(tail):
+            with segment_path.open("r+b") as log:
+                log.truncate(offset)
+        if missing:
+            with index_path.open("ab") as index:
+                index.write(b"".join(missing))
+
+    def _path(self, segment: int, suffix: str) -> Path:
+        return self._directory / f"{segment:08d}{suffix}"
+
+
+def _index_line(offset: int, length: int, host: str, task_ids: Sequence[str]) -> bytes:
+    return dumps([offset, length, host, list(task_ids)]) + b"\n"
+
+
+def _parse_index_line(line: bytes) -> tuple[int, int, str, list[str]] | None:
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        entry: Any = loads(line)
+        offset, length, host, task_ids = entry
+        return int(offset), int(length), str(host), [str(task_id) for task_id in task_ids]
+    except (ValueError, TypeError):
+        return None
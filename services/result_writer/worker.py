@@ -1,14 +1,52 @@
 from __future__ import annotations
 
-import json
 import logging
+import math
 import os
+import re
+import signal
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 
 import redis
 
+from legacy.src.agent.codec import loads
 from legacy.src.agent.logging_setup import setup_logging
-from legacy.src.agent.result_writer import write_payload_atomic
+from legacy.src.agent.result_writer import (
+    DURABILITY_NONE,
+    FsyncStats,
+    validate_durability,
+    write_payloads_atomic,
+)
+from services.common.envelope import ResultMessage, decode_result
+from services.common.payload_delta import DeltaMismatchError, PayloadState
+from services.common.queue_transport import (
+    TRANSPORT_LIST,
+    Delivery,
+    QueueTransport,
+    create_transport,
+    default_consumer_name,
+    log_queue_stats,
+    validate_transport,
+)
+from services.common.redis_client import create_redis_client, load_redis_settings, log_pool_stats
+from services.common.result_sharding import WriterLease, shard_for, shard_queue_name, validate_shard
+from services.result_writer.sqlite_store import SqliteResultStore, shard_db_path
+from services.result_writer.store import DEFAULT_MAX_SEGMENT_BYTES, ResultStore, SegmentStore
+
+# Placeholder in PAYLOAD_PATH replaced with the host a result came from.
+HOST_PLACEHOLDER = "{host}"
+# Stored status of ok results that were not applied to their payload file.
+STATUS_STALE = "stale"
+STATUS_DELTA_SKIPPED = "delta-skipped"
+STATUS_INVALID = "invalid"
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9._-]")
+# Leading dots would make "." or ".." path components (or hidden files).
+_LEADING_DOTS = re.compile(r"^\.+")
 
 
 def _env_str(name: str, default: str) -> str:
@@ -22,43 +60,441 @@ def _env_int(name: str, default: int) -> int:
     return int(raw)
 
 
+def payload_path_for(template: str, host: str) -> Path:
+    """Payload file of ``host``; templates without ``{host}`` send every host to one file."""
+    safe_host = _LEADING_DOTS.sub(lambda dots: "_" * len(dots.group()), _UNSAFE_PATH_CHARS.sub("_", host))
+    return Path(template.replace(HOST_PLACEHOLDER, safe_host or "unknown"))
+
+
+def load_payload_state(payload_path: Path) -> PayloadState:
+    """State of the payload already on disk, so deltas apply across writer restarts."""
+    try:
+        payload = loads(payload_path.read_bytes())
+    except FileNotFoundError:
+        return PayloadState()
+    except (OSError, ValueError):
+        logging.warning("result writer cannot read %s, waiting for a full payload", payload_path)
+        return PayloadState()
+    return PayloadState(payload if isinstance(payload, dict) else None)
+
+
+@dataclass
+class _PendingWrite:
+    deliveries: list[Delivery] = field(default_factory=list)
+    task_ids: list[str] = field(default_factory=list)
+    records: list[ResultMessage] = field(default_factory=list)
+
+
+class ResultWriter:
+    """
+    Applies results to per-target payload states and writes the files in batches.
+
+    ``add()`` applies a result in memory: results older (by ``ts``) than the
+    state of their target, error and malformed results, and deltas whose base
+    differs from the state (the next full payload repairs the file) are
+    consumed without a write, and so are results that change nothing (counted
+    in ``fsync_stats.skipped``).
+    ``flush()`` writes each changed target once, however many results it
+    absorbed, and returns the deliveries to ack. Deliveries of a target whose
+    write failed are not returned, and its state is reloaded from disk, so a
+    redelivery applies them again; when the group write fails, targets are
+    retried one by one, so the others are still written and acked.
+
+    A flush is due ``flush_interval_seconds`` after the first unwritten result
+    or once ``flush_max_results`` are pending; an interval of 0 writes every
+    result right away.
+
+    All changed targets of a flush are written as one group commit under the
+    ``durability`` mode; ``fsync_stats`` keeps the time spent in fsync.
+
+    With a ``store``, every decoded result is also appended to it on flush,
+    after the payload files are written: results of a target whose write
+    failed are left for redelivery and stored then, so they are stored once.
+    If the append fails, nothing is acked; redelivered results are applied
+    again on top of the written files. Only a result that was merged is
+    stored as "ok", with its delta applied; ok results that were not are
+    stored without payload as "stale" (older than the state), "delta-skipped"
+    (base mismatch) or "invalid", so the store never holds a partial payload.
+
+    A writer of shard ``shard_index`` out of ``shards`` applies only results
+    of hosts in that shard; others are held for ``take_misrouted()`` to be
+    forwarded to their shard, so no target is ever written by two writers.
+    """
+
+    def __init__(
+        self,
+        payload_path: str,
+        flush_interval_seconds: float = 0.0,
+        flush_max_results: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+        store: ResultStore | None = None,
+        durability: str = DURABILITY_NONE,
+        shards: int = 1,
+        shard_index: int = 0,
+    ) -> None:
+        self._payload_path = payload_path
+        self._durability = durability
+        self.fsync_stats = FsyncStats()
+        self._flush_interval_seconds = flush_interval_seconds
+        self._flush_max_results = max(flush_max_results, 1)
+        self._clock = clock
+        self._states: dict[Path, PayloadState] = {}
+        self._pending: dict[Path, _PendingWrite] = {}
+        self._pending_results = 0
+        self._pending_since: float | None = None
+        self._consumed: list[Delivery] = []
+        self._store = store
+        self._records: list[ResultMessage] = []
+        self._shards = shards
+        self._shard_index = shard_index
+        self._misrouted: list[tuple[int, Delivery]] = []
+
+    def add(self, delivery: Delivery) -> None:
+        if not self._apply(delivery):
+            self._consumed.append(delivery)
+
+    def due(self) -> bool:
+        if not self._pending:
+            return bool(self._consumed)
+        return self._pending_results >= self._flush_max_results or self.seconds_until_due() == 0.0
+
+    def seconds_until_due(self) -> float | None:
+        """Seconds until pending results must be written; None when nothing is pending."""
+        if self._pending_since is None:
+            return None
+        return max(self._pending_since + self._flush_interval_seconds - self._clock(), 0.0)
+
+    def flush(self) -> list[Delivery]:
+        done, self._consumed = self._consumed, []
+        records, self._records = self._records, []
+        if self._pending:
+            targets = list(self._pending)
+            try:
+                fsync_seconds = write_payloads_atomic(
+                    [(target, self._states[target].payload) for target in targets], self._durability
+                )
+            except Exception:
+                logging.exception("result writer group write of %s payload(s) failed, writing one by one", len(targets))
+                written = self._write_one_by_one(targets)
+            else:
+                self.fsync_stats.record(len(targets), fsync_seconds)
+                written = targets
+                logging.debug("result writer flushed %s file(s), fsync %.1f ms", len(targets), fsync_seconds * 1000)
+            for target in written:
+                pending = self._pending[target]
+                done.extend(pending.deliveries)
+                records.extend(pending.records)
+                logging.info(
+                    "payload.json updated at %s from %s result(s) for %s task(s)",
+                    target,
+                    len(pending.deliveries),
+                    len(pending.task_ids),
+                )
+                logging.debug("payload %s task ids: %s", target, ", ".join(pending.task_ids))
+
+        self._pending = {}
+        self._pending_results = 0
+        self._pending_since = None
+
+        if self._store is not None and records:
+            try:
+                self._store.append_many(records)
+            except Exception:
+                logging.exception("result writer failed to append %s result(s) to the store", len(records))
+                self.discard()
+                return []
+        return done
+
+    def _write_one_by_one(self, targets: list[Path]) -> list[Path]:
+        """
+        Write ``targets`` separately after a failed group write, so one bad
+        target does not hold back the others. Failed targets get their state
+        reloaded from disk and their deliveries stay unacked.
+        """
+        written: list[Path] = []
+        for target in targets:
+            try:
+                fsync_seconds = write_payloads_atomic([(target, self._states[target].payload)], self._durability)
+            except Exception:
+                logging.exception("result writer failed to write payload %s", target)
+                self._states[target] = load_payload_state(target)
+            else:
+                self.fsync_stats.record(1, fsync_seconds)
+                written.append(target)
+        return written
+
+    def take_misrouted(self) -> list[tuple[int, Delivery]]:
+        """(shard, delivery) pairs of results that belong to another shard."""
+        misrouted, self._misrouted = self._misrouted, []
+        return misrouted
+
+    def discard(self) -> None:
+        """Forget everything not yet flushed; states are reloaded from disk on next use."""
+        self._states = {}
+        self._pending = {}
+        self._pending_results = 0
+        self._pending_since = None
+        self._consumed = []
+        self._records = []
+        self._misrouted = []
+
+    def _apply(self, delivery: Delivery) -> bool:
+        """Apply one result in memory; returns False when it can be acked without a write."""
+        try:
+            message = decode_result(delivery.data)
+        except Exception:
+            logging.exception("result writer got malformed payload: %r", delivery.data)
+            return False
+
+        shard = shard_for(message.host, self._shards)
+        if shard != self._shard_index:
+            logging.warning("result writer got task %s of host %r from shard %s", message.task_id, message.host, shard)
+            self._misrouted.append((shard, delivery))
+            return True
+
+        if message.status.strip().lower() != "ok":
+            logging.error("result writer got error message: %s", message)
+            self._records.append(message)
+            return False
+
+        if message.payload is None:
+            logging.error("result writer got invalid payload shape: %s", message)
+            self._record_unapplied(message, STATUS_INVALID, "result has no payload")
+            return False
+
+        target = payload_path_for(self._payload_path, message.host)
+        state = self._state(target)
+        if not state.is_newer(message.ts):
+            logging.info("result writer skipped task %s older than %s", message.task_id, target)
+            self._record_unapplied(message, STATUS_STALE, f"older than the payload of {target}")
+            return False
+
+        try:
+            payload = state.merge(message.payload, message.unchanged_sections)
+        except DeltaMismatchError as exc:
+            logging.warning("result writer skipped delta of task %s: %s", message.task_id, exc)
+            self._record_unapplied(message, STATUS_DELTA_SKIPPED, str(exc))
+            return False
+
+        if "os" not in payload:
+            logging.error("result writer got invalid payload shape: %s", message)
+            self._record_unapplied(message, STATUS_INVALID, "payload has no os section")
+            return False
+        record = replace(message, payload=payload, unchanged_sections={})
+
+        if target not in self._pending and state.is_current(payload):
+            self._records.append(record)
+            state.replace(payload, message.ts)
+            self.fsync_stats.record_skip()
+            logging.info("payload %s unchanged for %s task(s)", target, len(message.task_ids))
+            return False
+
+        state.replace(payload, message.ts)
+        pending = self._pending.setdefault(target, _PendingWrite())
+        pending.deliveries.append(delivery)
+        pending.task_ids.extend(message.task_ids)
+        pending.records.append(record)
+        self._pending_results += 1
+        if self._pending_since is None:
+            self._pending_since = self._clock()
+        return True
+
+    def _record_unapplied(self, message: ResultMessage, status: str, reason: str) -> None:
+        """Store a result that did not reach its payload file without its (partial) payload."""
+        self._records.append(replace(message, status=status, error=reason, payload=None, unchanged_sections={}))
+
+    def _state(self, target: Path) -> PayloadState:
+        state = self._states.get(target)
+        if state is None:
+            state = self._states[target] = load_payload_state(target)
+        return state
+
+
+class ResultPump:
+    """
+    Feeds fetched results to a ``ResultWriter``, forwards misrouted ones to
+    their shard and acks what is done.
+
+    Results not yet added, forwarded or acked are kept when Redis fails
+    midway (lease renewal, forward or ack); ``run()`` after a back-off
+    resumes where the failed one stopped, so a short outage neither drops
+    fetched results nor acks any before they are written.
+    """
+
+    def __init__(
+        self,
+        writer: ResultWriter,
+        results: QueueTransport,
+        lease: WriterLease,
+        forward_to: Callable[[int], QueueTransport],
+    ) -> None:
+        self._writer = writer
+        self._results = results
+        self._lease = lease
+        self._forward_to = forward_to
+        self._received: list[Delivery] = []
+        self._unforwarded: list[tuple[int, Delivery]] = []
+        self._unacked: list[Delivery] = []
+
+    def add(self, deliveries: list[Delivery]) -> None:
+        self._received.extend(deliveries)
+
+    def idle(self) -> bool:
+        return not (self._received or self._unforwarded or self._unacked)
+
+    def discard(self) -> None:
+        """Drop everything not yet written after the lease was lost; written results are still acked."""
+        self._received = []
+        self._unforwarded = []
+        self._writer.discard()
+
+    def run(self, final: bool = False) -> None:
+        """Write due results, forward misrouted ones and ack; ``final`` flushes everything pending."""
+        while self._received:
+            self._writer.add(self._received.pop(0))
+            if self._writer.due():
+                self._unacked.extend(self._flush_owned())
+        if final or self._writer.due():
+            self._unacked.extend(self._flush_owned())
+        self._unforwarded.extend(self._writer.take_misrouted())
+        while self._unforwarded:
+            shard, delivery = self._unforwarded[0]
+            self._forward_to(shard).publish([delivery.data])
+            self._unacked.append(self._unforwarded.pop(0)[1])
+        self._results.ack(self._unacked)
+        self._unacked = []
+
+    def _flush_owned(self) -> list[Delivery]:
+        # Write only while holding the lease: once it expired another writer may
+        # own the shard, and a late write could overwrite its newer results.
+        if self._lease.renew():
+            return self._writer.flush()
+        logging.error("result writer lost the lease, dropping unwritten results")
+        self.discard()
+        return []
+
+
+def open_result_store(shards: int = 1, shard_index: int = 0) -> ResultStore | None:
+    """
+    SQLite store at RESULT_DB_PATH, segment store in RESULT_STORE_DIR, or None
+    when neither is set. Each shard gets its own database or segment
+    directory (``shard-<n>``): both have a single writer.
+    """
+    db_path = os.getenv("RESULT_DB_PATH", "").strip()
+    store_dir = os.getenv("RESULT_STORE_DIR", "").strip()
+    if db_path and store_dir:
+        raise ValueError("set either RESULT_DB_PATH or RESULT_STORE_DIR, not both")
+    if db_path:
+        return SqliteResultStore(shard_db_path(Path(db_path), shards, shard_index))
+    if store_dir:
+        directory = Path(store_dir) / f"shard-{shard_index}" if shards > 1 else Path(store_dir)
+        return SegmentStore(
+            directory,
+            max_segment_bytes=_env_int("RESULT_STORE_SEGMENT_BYTES", DEFAULT_MAX_SEGMENT_BYTES),
+            max_segments=_env_int("RESULT_STORE_MAX_SEGMENTS", 0),
+        )
+    return None
+
+
 def run_writer() -> None:
     log_dir = Path(_env_str("LOG_DIR", "."))
     log_level = _env_str("LOG_LEVEL", "info")
     setup_logging(log_dir, log_level)
 
-    redis_host = _env_str("REDIS_HOST", "localhost")
-    redis_port = _env_int("REDIS_PORT", 6379)
+    redis_settings = load_redis_settings()
     result_queue_name = _env_str("RESULT_QUEUE_NAME", "inventory_results")
-    payload_path = Path(_env_str("PAYLOAD_PATH", "/data/payload.json"))
+    transport = validate_transport(_env_str("QUEUE_TRANSPORT", TRANSPORT_LIST))
+    read_count = _env_int("QUEUE_READ_COUNT", 10)
+    shards, shard_index = validate_shard(_env_int("RESULT_SHARDS", 1), _env_int("WRITER_SHARD_INDEX", 0))
+    payload_path = _env_str("PAYLOAD_PATH", "/data/payload.json")
+    if shards > 1 and HOST_PLACEHOLDER not in payload_path:
+        raise ValueError(f"PAYLOAD_PATH must contain {HOST_PLACEHOLDER} when RESULT_SHARDS > 1")
+    lease_ttl_ms = _env_int("WRITER_LEASE_TTL_MS", 30_000)
+    if lease_ttl_ms < 3000:
+        raise ValueError("WRITER_LEASE_TTL_MS must be >= 3000")
+    store = open_result_store(shards, shard_index)
+    writer = ResultWriter(
+        payload_path,
+        flush_interval_seconds=_env_int("RESULT_FLUSH_INTERVAL_MS", 0) / 1000,
+        flush_max_results=_env_int("RESULT_FLUSH_MAX_RESULTS", 1000),
+        store=store,
+        durability=validate_durability(_env_str("RESULT_DURABILITY", DURABILITY_NONE)),
+        shards=shards,
+        shard_index=shard_index,
+    )
 
-    client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+    client = create_redis_client(redis_settings, decode_responses=False)
     client.ping()
-    logging.info("result writer started, listening queue %s", result_queue_name)
+    consumer = os.getenv("QUEUE_CONSUMER_NAME", "").strip() or default_consumer_name()
+    shard_queue = shard_queue_name(result_queue_name, shard_index, shards)
+    results = create_transport(
+        client,
+        shard_queue,
+        transport,
+        group=_env_str("QUEUE_CONSUMER_GROUP", "result-writers"),
+        consumer=consumer,
+        claim_idle_ms=_env_int("QUEUE_CLAIM_IDLE_MS", 60_000),
+    )
+    results.ensure_group()
+    lease = WriterLease(client, shard_queue, consumer, lease_ttl_ms)
+    forwards: dict[int, QueueTransport] = {}
 
-    while True:
-        _, raw = client.brpop(result_queue_name, timeout=0)
-        try:
-            message = json.loads(raw)
-        except Exception:
-            logging.exception("result writer got malformed payload: %s", raw)
-            continue
+    def forward_to(shard: int) -> QueueTransport:
+        if shard not in forwards:
+            forwards[shard] = create_transport(client, shard_queue_name(result_queue_name, shard, shards), transport)
+        return forwards[shard]
 
-        status = str(message.get("status", "")).strip().lower()
-        if status != "ok":
-            logging.error("result writer got error message: %s", message)
-            continue
+    pump = ResultPump(writer, results, lease, forward_to)
 
-        payload = message.get("payload")
-        if not isinstance(payload, dict) or "os" not in payload:
-            logging.error("result writer got invalid payload shape: %s", message)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    logging.info("result writer waiting for the lease of %s", shard_queue)
+    if lease.acquire(stopping):
+        logging.info(
+            "result writer started, listening %s %s (shard %s of %s)", transport, shard_queue, shard_index, shards
+        )
+
+    while not stopping.is_set():
+        # Blocking reads take whole seconds; wake up in time to renew the lease.
+        block_seconds = min(redis_settings.block_timeout_seconds, max(int(lease.ttl_seconds / 3), 1))
+        until_due = writer.seconds_until_due()
+        if until_due is not None:
+            block_seconds = min(block_seconds, max(math.ceil(until_due), 1))
+        try:
+            if not lease.renew():
+                logging.error("result writer lost the lease of %s, waiting to take it back", shard_queue)
+                pump.discard()
+                lease.acquire(stopping)
+                continue
+            deliveries = results.fetch(read_count, block_seconds)
+        except redis.RedisError:
+            logging.exception("result writer: redis read failed, retrying")
+            time.sleep(1.0)
+            continue
+        pump.add(deliveries)
+        if pump.idle() and until_due is None:
+            log_pool_stats("result writer", client)
+            log_queue_stats("result writer", results)
+            if store is not None:
+                logging.debug("result writer store: %s", store.stats())
+            logging.debug("result writer fsync: %s", writer.fsync_stats.as_dict())
             continue
 
         try:
-            write_payload_atomic(payload_path, payload)
-            logging.info("payload.json updated at %s", payload_path)
-        except Exception:
-            logging.exception("result writer failed to write payload")
+            pump.run()
+        except redis.RedisError:
+            logging.exception("result writer: redis write failed, retrying")
+            time.sleep(1.0)
+
+    logging.info("result writer stopping, flushing pending results")
+    try:
+        pump.run(final=True)
+    except redis.RedisError:
+        logging.exception("result writer: redis write failed on stop, unacked results will be redelivered")
+    lease.release()
+    if store is not None:
+        store.close()
+    logging.info("result writer stopped")
 
 
 if __name__ == "__main__":
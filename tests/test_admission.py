@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Sequence
+
+from services.agent_gateway.admission import AdmissionController, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CappedQueue:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.items: list[str] = []
+
+    def put_many(self, commands: Sequence[str]) -> int:
+        count = min(len(commands), self.capacity - len(self.items))
+        self.items.extend(commands[:count])
+        return count
+
+
+class TestTokenBucket:
+    def test_grants_up_to_burst_then_refills(self) -> None:
+        clock = FakeClock()
+        bucket = TokenBucket(rate_per_second=10, burst=5, clock=clock)
+        assert bucket.take(8) == 5
+        assert bucket.take(1) == 0
+        assert bucket.delay_for(2) == 0.2
+
+        clock.now = 0.3
+        assert bucket.take(8) == 3
+
+    def test_give_back_is_capped_by_burst(self) -> None:
+        bucket = TokenBucket(rate_per_second=1, burst=2, clock=FakeClock())
+        bucket.take(1)
+        bucket.give_back(5)
+        assert bucket.take(5) == 2
+
+
+class TestAdmissionController:
+    def test_wait_budget_respects_deadline(self) -> None:
+        admission = AdmissionController(max_wait_seconds=2.0)
+        assert admission.wait_budget(None) == 2.0
+        assert admission.wait_budget(0.5) == 0.4
+        assert admission.wait_budget(0.05) == 0.0
+
+    def test_enqueues_whole_batch_when_queue_has_room(self) -> None:
+        queue = CappedQueue(capacity=10)
+        outcome = AdmissionController().enqueue(queue.put_many, ["inventory"] * 3, None)
+        assert outcome.queued == 3
+        assert outcome.retry_after_seconds == 0.0
+
+    def test_full_queue_returns_retry_hint_without_waiting(self) -> None:
+        queue = CappedQueue(capacity=2)
+        outcome = AdmissionController(max_wait_seconds=0.0).enqueue(queue.put_many, ["inventory"] * 3, None)
+        assert outcome.queued == 2
+        assert outcome.retry_after_seconds > 0
+
+    def test_waits_for_queue_space_within_budget(self) -> None:
+        queue = CappedQueue(capacity=1)
+        calls = 0
+
+        def put_many(commands: Sequence[str]) -> int:
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                queue.items.clear()
+            return queue.put_many(commands)
+
+        outcome = AdmissionController(max_wait_seconds=1.0).enqueue(put_many, ["inventory"] * 2, None)
+        assert outcome.queued == 2
+
+    def test_rate_limit_throttles_beyond_burst(self) -> None:
+        queue = CappedQueue(capacity=100)
+        admission = AdmissionController(rate_per_second=1, burst=3)
+        outcome = admission.enqueue(queue.put_many, ["inventory"] * 5, 0.0)
+        assert outcome.queued == 3
+        assert outcome.retry_after_seconds > 0
+
+    def test_async_enqueue_matches_sync(self) -> None:
+        queue = CappedQueue(capacity=2)
+
+        async def put_many(commands: Sequence[str]) -> int:
+            return queue.put_many(commands)
+
+        outcome = asyncio.run(AdmissionController().enqueue_async(put_many, ["inventory"] * 3, None))
+        assert outcome.queued == 2
+        assert outcome.retry_after_seconds > 0
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import pytest
+
+from legacy.src.agent import codec
+from legacy.src.agent.codec import CODEC_JSON, CODEC_ORJSON, CODECS, JsonCodec
+
+PAYLOAD: dict[str, Any] = {
+    "os": {"ProductName": "Windows 11 Pro", "CurrentBuild": "22631", "UBR": 3447},
+    "software": [{"DisplayName": "Блокнот++", "DisplayVersion": "8.6"}],
+    "hotfixes": ["KB5031455"],
+    "collector_errors": {},
+}
+
+
+@pytest.fixture(params=sorted(CODECS))
+def backend(request: pytest.FixtureRequest) -> JsonCodec:
+    return CODECS[request.param]
+
+
+class TestJsonCodec:
+    def test_round_trip(self, backend: JsonCodec) -> None:
+        assert backend.loads(backend.dumps(PAYLOAD, False)) == PAYLOAD
+        assert backend.loads(backend.dumps(PAYLOAD, True)) == PAYLOAD
+
+    def test_compact_is_utf8_without_whitespace(self, backend: JsonCodec) -> None:
+        data = backend.dumps({"name": "Блокнот", "items": [1, 2]}, False)
+        assert data == '{"name":"Блокнот","items":[1,2]}'.encode()
+
+    def test_pretty_matches_stdlib_indent(self, backend: JsonCodec) -> None:
+        assert backend.dumps(PAYLOAD, True) == json.dumps(PAYLOAD, indent=2, ensure_ascii=False).encode("utf-8")
+
+    def test_loads_accepts_str_and_bytes(self, backend: JsonCodec) -> None:
+        assert backend.loads('{"a": 1}') == backend.loads(b'{"a": 1}') == {"a": 1}
+
+    def test_malformed_input_raises_value_error(self, backend: JsonCodec) -> None:
+        with pytest.raises(ValueError):
+            backend.loads(b"{not json")
+
+    def test_unserializable_value_raises_type_error(self, backend: JsonCodec) -> None:
+        with pytest.raises(TypeError):
+            backend.dumps({"value": object()}, False)
+
+
+def test_orjson_is_preferred_when_installed() -> None:
+    expected = CODEC_ORJSON if CODEC_ORJSON in CODECS else CODEC_JSON
+    assert codec.CODEC.name == expected
@@ -82,3 +82,38 @@ class TestLoadConfig:
         assert result.queue.tasks_maxsize == 100
         assert result.queue.results_maxsize == 100
         assert result.queue.put_timeout_seconds == 2.0
+
+    def test_inventory_provider_section(self, tmp_path: Path) -> None:
+        cfg = tmp_path / "config.ini"
+        cfg.write_text(
+            "[logging]\n[workers]\n[queue]\n"
+            "[inventory]\nprovider = Simulated\nsnapshot_path = snapshots\nlatency_ms = 25\nerror_rate = 0.1\n",
+            encoding="utf-8",
+        )
+        result = load_config(cfg)
+        assert result.inventory.name == "simulated"
+        assert result.inventory.snapshot_path == (tmp_path / "snapshots").resolve()
+        assert result.inventory.latency_ms == 25.0
+        assert result.inventory.error_rate == 0.1
+
+    def test_unknown_inventory_provider_raises(self, tmp_path: Path) -> None:
+        cfg = tmp_path / "config.ini"
+        cfg.write_text("[logging]\n[workers]\n[queue]\n[inventory]\nprovider = wmi\n", encoding="utf-8")
+        with pytest.raises(ValueError, match="inventory provider"):
+            load_config(cfg)
+
+    def test_result_writer_section(self, tmp_path: Path) -> None:
+        cfg = tmp_path / "config.ini"
+        cfg.write_text(
+            "[logging]\n[workers]\n[queue]\n[result_writer]\ndurability = FSYNC-File\ngroup_commit_ms = 250\n",
+            encoding="utf-8",
+        )
+        result = load_config(cfg)
+        assert result.result_writer.durability == "fsync-file"
+        assert result.result_writer.group_commit_seconds == 0.25
+
+    def test_unknown_durability_raises(self, tmp_path: Path) -> None:
+        cfg = tmp_path / "config.ini"
+        cfg.write_text("[logging]\n[workers]\n[queue]\n[result_writer]\ndurability = always\n", encoding="utf-8")
+        with pytest.raises(ValueError, match="durability"):
+            load_config(cfg)
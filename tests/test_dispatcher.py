@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
 from pathlib import Path
 from queue import Queue
 
 import pytest
 
-from legacy.src.agent.dispatcher import dispatch_commands
+from legacy.src.agent.dispatcher import dispatch_commands, dispatch_lines, read_command_lines
 
 
 @pytest.fixture()
@@ -64,3 +65,82 @@ class TestDispatchCommands:
         q: Queue[str] = Queue(maxsize=10)
         accepted = dispatch_commands(tmp_commands, q, put_timeout_seconds=1.0)
         assert accepted == 2
+
+
+class BatchQueue:
+    """Queue stub exposing put_many with a fixed capacity."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.items: list[str] = []
+        self.batches: list[int] = []
+
+    def put(self, item: str, timeout: float | None = None) -> None:
+        raise AssertionError("put() must not be used in batched mode")
+
+    def put_many(self, items: list[str], timeout: float | None = None) -> int:
+        self.batches.append(len(items))
+        free = max(self.capacity - len(self.items), 0)
+        self.items.extend(items[:free])
+        return min(free, len(items))
+
+
+class TestDispatchCommandsBatched:
+    def test_commands_handed_over_in_chunks(self, tmp_commands: Path) -> None:
+        tmp_commands.write_text("inventory\naudit\n" * 5, encoding="utf-8")
+        q = BatchQueue(capacity=10)
+        accepted = dispatch_commands(tmp_commands, q, put_timeout_seconds=1.0, batch_size=2)  # type: ignore[arg-type]
+        assert accepted == 5
+        assert q.batches == [2, 2, 1]
+
+    def test_partial_batch_counts_only_enqueued(self, tmp_commands: Path) -> None:
+        tmp_commands.write_text("inventory\n" * 5, encoding="utf-8")
+        q = BatchQueue(capacity=3)
+        accepted = dispatch_commands(tmp_commands, q, put_timeout_seconds=1.0, batch_size=4)  # type: ignore[arg-type]
+        assert accepted == 3
+        assert len(q.items) == 3
+
+    def test_batch_size_ignored_for_plain_queue(self, tmp_commands: Path) -> None:
+        tmp_commands.write_text("inventory\ninventory\n", encoding="utf-8")
+        q: Queue[str] = Queue(maxsize=10)
+        accepted = dispatch_commands(tmp_commands, q, put_timeout_seconds=1.0, batch_size=10)
+        assert accepted == 2
+
+
+class TestDispatchLines:
+    def test_counts_accepted_and_rejected(self) -> None:
+        q: Queue[str] = Queue(maxsize=10)
+        result = dispatch_lines(iter(["inventory", "audit", "", "Inventory", "reboot"]), q, put_timeout_seconds=1.0)
+        assert result.accepted == 2
+        assert result.rejected == 2
+
+    def test_overflow_counted_as_throttled(self) -> None:
+        q = BatchQueue(capacity=1)
+        result = dispatch_lines(["inventory"] * 3, q, put_timeout_seconds=1.0, batch_size=3)  # type: ignore[arg-type]
+        assert result.accepted == 1
+        assert result.rejected == 0
+        assert result.throttled == 2
+
+    def test_consumes_generator_incrementally(self) -> None:
+        q: Queue[str] = Queue(maxsize=10)
+        seen: list[int] = []
+
+        def lines() -> Iterator[str]:
+            for _ in range(3):
+                seen.append(q.qsize())
+                yield "inventory"
+
+        dispatch_lines(lines(), q, put_timeout_seconds=1.0)
+        assert seen == [0, 1, 2]
+
+
+class TestReadCommandLines:
+    def test_strips_line_terminators(self, tmp_commands: Path) -> None:
+        tmp_commands.write_bytes(b"inventory\r\naudit\n\ninventory")
+        assert list(read_command_lines(tmp_commands)) == ["inventory", "audit", "", "inventory"]
+
+    def test_lines_are_read_lazily(self, tmp_commands: Path) -> None:
+        tmp_commands.write_text("inventory\n", encoding="utf-8")
+        lines = read_command_lines(tmp_commands)
+        tmp_commands.write_text("audit\n", encoding="utf-8")
+        assert next(lines) == "audit"
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+
+from services.common.envelope import (
+    MAX_INFLATED_BYTES,
+    PROTOBUF_V1,
+    WIRE_FORMAT_JSON,
+    WIRE_FORMAT_PROTOBUF,
+    ZLIB_V1,
+    ResultEnvelope,
+    ResultMessage,
+    TaskEnvelope,
+    TaskMessage,
+    decode_result,
+    decode_task,
+    encode_result,
+    encode_task,
+    validate_wire_format,
+)
+
+TS = datetime(2024, 5, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def result() -> ResultMessage:
+    return ResultMessage(
+        task_id=str(uuid.uuid4()),
+        task_ids=[str(uuid.uuid4()), str(uuid.uuid4())],
+        status="ok",
+        payload={"os": {"ProductName": "Windows 11", "CurrentBuild": "22631"}},
+        ts=TS,
+        host="WS-0142",
+    )
+
+
+class TestTaskEnvelope:
+    @pytest.mark.parametrize("wire_format", [WIRE_FORMAT_JSON, WIRE_FORMAT_PROTOBUF])
+    def test_roundtrip(self, wire_format: str) -> None:
+        task = TaskMessage(task_id=str(uuid.uuid4()), command="inventory", created_at=TS)
+        assert decode_task(encode_task(task, wire_format)) == task
+
+    def test_protobuf_is_versioned_and_smaller(self) -> None:
+        task = TaskMessage(task_id=str(uuid.uuid4()), command="inventory", created_at=TS)
+        raw = encode_task(task, WIRE_FORMAT_PROTOBUF)
+        assert raw[:1] == PROTOBUF_V1
+        assert len(raw) < len(encode_task(task, WIRE_FORMAT_JSON)) / 2
+
+    def test_legacy_json_string_is_accepted(self) -> None:
+        raw = json.dumps({"task_id": "abc", "command": "inventory", "created_at": TS.isoformat()})
+        task = decode_task(raw)
+        assert task.task_id == "abc"
+        assert task.created_at == TS
+
+    @pytest.mark.parametrize(
+        "task_id",
+        ["abcdefghijklmnop", "ABCDEF00-1234-5678-9ABC-DEF012345678", "{12345678-1234-5678-1234-567812345678}"],
+    )
+    def test_protobuf_keeps_non_canonical_ids(self, task_id: str) -> None:
+        task = TaskMessage(task_id=task_id, command="inventory", created_at=TS)
+        assert decode_task(encode_task(task, WIRE_FORMAT_PROTOBUF)).task_id == task_id
+
+    @pytest.mark.parametrize("wire_format", [WIRE_FORMAT_JSON, WIRE_FORMAT_PROTOBUF])
+    def test_missing_timestamp_means_now(self, wire_format: str) -> None:
+        if wire_format == WIRE_FORMAT_PROTOBUF:
+            raw = PROTOBUF_V1 + TaskEnvelope(task_id=b"t1", command="inventory", text_ids=True).SerializeToString()
+        else:
+            raw = json.dumps({"task_id": "t1", "command": "inventory"}).encode()
+        before = datetime.now(timezone.utc)
+        assert before <= decode_task(raw).created_at <= datetime.now(timezone.utc)
+
+    def test_malformed_message_raises_value_error(self) -> None:
+        with pytest.raises(ValueError):
+            decode_task(b"not json")
+        with pytest.raises(ValueError):
+            decode_task(PROTOBUF_V1 + b"\xff\xff")
+
+
+class TestResultEnvelope:
+    @pytest.mark.parametrize("wire_format", [WIRE_FORMAT_JSON, WIRE_FORMAT_PROTOBUF])
+    def test_roundtrip(self, result: ResultMessage, wire_format: str) -> None:
+        assert decode_result(encode_result(result, wire_format)) == result
+
+    @pytest.mark.parametrize("wire_format", [WIRE_FORMAT_JSON, WIRE_FORMAT_PROTOBUF])
+    def test_delta_roundtrip_keeps_empty_payload(self, wire_format: str) -> None:
+        delta = ResultMessage(
+            task_id="t1", task_ids=["t1"], status="ok", payload={}, unchanged_sections={"os": "abc"}, ts=TS
+        )
+        assert decode_result(encode_result(delta, wire_format)) == delta
+
+    def test_error_result_without_payload(self) -> None:
+        error = ResultMessage(task_id="t1", task_ids=["t1"], status="error", error="boom", ts=TS)
+        decoded = decode_result(encode_result(error, WIRE_FORMAT_PROTOBUF))
+        assert decoded.payload is None
+        assert decoded.error == "boom"
+
+    def test_protobuf_mixed_ids_are_kept_verbatim(self, result: ResultMessage) -> None:
+        result.task_ids.append("abcdefghijklmnop")
+        assert decode_result(encode_result(result, WIRE_FORMAT_PROTOBUF)) == result
+
+    def test_protobuf_uuid_ids_stay_packed(self, result: ResultMessage) -> None:
+        raw = encode_result(result, WIRE_FORMAT_PROTOBUF)
+        envelope = ResultEnvelope.FromString(raw[1:])
+        assert not envelope.text_ids
+        assert len(envelope.task_id) == 16
+
+    def test_json_without_task_ids_falls_back_to_task_id(self) -> None:
+        raw = json.dumps({"task_id": "t1", "status": "ok", "payload": {"os": {}}, "ts": TS.isoformat()})
+        assert decode_result(raw).task_ids == ["t1"]
+
+
+class TestCompression:
+    @pytest.fixture()
+    def large_result(self, result: ResultMessage) -> ResultMessage:
+        software = [{"DisplayName": f"Package {i}", "Publisher": "Contoso Ltd."} for i in range(200)]
+        return ResultMessage(
+            task_id=result.task_id,
+            task_ids=result.task_ids,
+            status="ok",
+            payload={**(result.payload or {}), "software": software},
+            ts=TS,
+        )
+
+    @pytest.mark.parametrize("wire_format", [WIRE_FORMAT_JSON, WIRE_FORMAT_PROTOBUF])
+    def test_large_message_is_compressed_and_roundtrips(self, large_result: ResultMessage, wire_format: str) -> None:
+        plain = encode_result(large_result, wire_format)
+        packed = encode_result(large_result, wire_format, compress_min_bytes=1024)
+        assert packed[:1] == ZLIB_V1
+        assert len(packed) < len(plain) / 4
+        assert decode_result(packed) == large_result
+
+    def test_small_message_stays_plain(self, result: ResultMessage) -> None:
+        raw = encode_result(result, WIRE_FORMAT_JSON, compress_min_bytes=1024)
+        assert raw == encode_result(result, WIRE_FORMAT_JSON)
+
+    def test_compressed_task_roundtrips(self) -> None:
+        task = TaskMessage(task_id=str(uuid.uuid4()), command="inventory", created_at=TS)
+        raw = encode_task(task, WIRE_FORMAT_JSON, compress_min_bytes=1)
+        assert decode_task(raw) == task
+
+    def test_malformed_or_oversized_frame_raises_value_error(self) -> None:
+        with pytest.raises(ValueError, match="zlib"):
+            decode_result(ZLIB_V1 + b"garbage")
+        with pytest.raises(ValueError, match="truncated"):
+            decode_result(ZLIB_V1 + zlib.compress(b"{}" * 100)[:-4])
+        with pytest.raises(ValueError, match="inflates beyond"):
+            decode_result(ZLIB_V1 + zlib.compress(b" " * (MAX_INFLATED_BYTES + 1)))
+
+
+def test_validate_wire_format() -> None:
+    assert validate_wire_format(" Protobuf ") == WIRE_FORMAT_PROTOBUF
+    with pytest.raises(ValueError):
+        validate_wire_format("xml")
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+from collections.abc import AsyncIterator, Coroutine
+from pathlib import Path
+from typing import Any, TypeVar
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from proto import agent_pb2, agent_pb2_grpc  # noqa: E402
+from services.agent_gateway import aio  # noqa: E402
+from services.agent_gateway.admission import AdmissionController  # noqa: E402
+from services.agent_gateway.aio import (  # noqa: E402
+    AsyncAgentGatewayServicer,
+    AsyncRedisTaskQueueAdapter,
+    _read_file_chunks,
+    serve_async,
+)
+from services.common.redis_client import load_redis_settings  # noqa: E402
+
+T = TypeVar("T")
+
+
+def run(coroutine: Coroutine[Any, Any, T]) -> T:
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture()
+def server() -> Any:
+    return fakeredis.FakeServer()
+
+
+def async_client(server: Any) -> Any:
+    return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+
+def sync_client(server: Any) -> Any:
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+def make_context() -> MagicMock:
+    context = MagicMock()
+    context.time_remaining.return_value = None
+    return context
+
+
+async def chunks(*batches: list[str]) -> AsyncIterator[Any]:
+    for commands in batches:
+        yield MagicMock(commands=commands)
+
+
+def servicer(server: Any, maxsize: int, batch_size: int = 2, **kwargs: Any) -> AsyncAgentGatewayServicer:
+    return AsyncAgentGatewayServicer(
+        async_client(server),
+        "tasks",
+        task_queue_maxsize=maxsize,
+        dispatch_batch_size=batch_size,
+        admission=AdmissionController(max_wait_seconds=0.0),
+        **kwargs,
+    )
+
+
+class TestAsyncRedisTaskQueueAdapter:
+    def test_put_many_respects_maxsize(self, server: Any) -> None:
+        adapter = AsyncRedisTaskQueueAdapter(async_client(server), "tasks", maxsize=3)
+        assert run(adapter.put_many(["inventory"] * 5)) == 3
+        assert sync_client(server).llen("tasks") == 3
+
+    def test_messages_keep_fifo_order(self, server: Any) -> None:
+        adapter = AsyncRedisTaskQueueAdapter(async_client(server), "tasks", maxsize=0)
+        run(adapter.put_many(["inventory", "other"]))
+        assert json.loads(sync_client(server).rpop("tasks"))["command"] == "inventory"
+
+    def test_over_full_queue_accepts_nothing(self, server: Any) -> None:
+        sync_client(server).lpush("tasks", *["queued"] * 7)
+        adapter = AsyncRedisTaskQueueAdapter(async_client(server), "tasks", maxsize=5)
+        assert run(adapter.put_many(["inventory"] * 10)) == 0
+        assert sync_client(server).llen("tasks") == 7
+
+    def test_coalescing_shares_one_task(self, server: Any) -> None:
+        adapter = AsyncRedisTaskQueueAdapter(async_client(server), "tasks", maxsize=10, coalesce=True)
+        assert run(adapter.put_many(["inventory"] * 3)) == 3
+        assert sync_client(server).llen("tasks") == 1
+
+    def test_concurrent_put_many_never_overshoots(self, server: Any) -> None:
+        async def put_all() -> list[int]:
+            adapters = [AsyncRedisTaskQueueAdapter(async_client(server), "tasks", maxsize=50) for _ in range(6)]
+            return list(await asyncio.gather(*(adapter.put_many(["inventory"] * 20) for adapter in adapters)))
+
+        assert sum(run(put_all())) == 50
+        assert sync_client(server).llen("tasks") == 50
+
+
+class TestAsyncAgentGatewayServicer:
+    def test_run_stream_enqueues_valid_commands(self, server: Any) -> None:
+        context = make_context()
+        response = run(servicer(server, maxsize=10).RunStream(chunks(["inventory", "reboot"], ["inventory"]), context))
+
+        assert response.ok
+        assert (response.accepted, response.rejected) == (2, 1)
+        assert sync_client(server).llen("tasks") == 2
+        context.set_code.assert_not_called()
+
+    def test_full_queue_fails_with_resource_exhausted(self, server: Any) -> None:
+        sync_client(server).lpush("tasks", "queued")
+        context = make_context()
+        response = run(servicer(server, maxsize=1).RunStream(chunks(["inventory"] * 3), context))
+
+        context.set_code.assert_called_once_with(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        assert response.throttled == 3
+        assert response.retry_after_ms > 0
+
+    def test_input_after_throttle_is_still_counted(self, server: Any) -> None:
+        stream = chunks(["inventory"] * 3, ["reboot", "inventory"], ["inventory", "shutdown"])
+        response = run(servicer(server, maxsize=1).RunStream(stream, make_context()))
+        assert (response.accepted, response.rejected, response.throttled) == (1, 2, 4)
+        assert sync_client(server).llen("tasks") == 1
+
+    def test_run_reads_commands_file(self, server: Any, tmp_path: Path) -> None:
+        commands = tmp_path / "commands.txt"
+        commands.write_text("inventory\nreboot\ninventory\ninventory\n", encoding="utf-8")
+
+        response = run(servicer(server, maxsize=10).Run(MagicMock(commands_file=str(commands)), make_context()))
+
+        assert (response.accepted, response.rejected) == (3, 1)
+        assert sync_client(server).llen("tasks") == 3
+
+    def test_run_missing_file(self, server: Any, tmp_path: Path) -> None:
+        request = MagicMock(commands_file=str(tmp_path / "missing.txt"))
+        response = run(servicer(server, maxsize=10).Run(request, make_context()))
+        assert not response.ok
+        assert response.error == "commands file not found"
+
+    def test_redis_failure_is_internal_error(self, server: Any) -> None:
+        server.connected = False
+        context = make_context()
+        response = run(servicer(server, maxsize=10).RunStream(chunks(["inventory"]), context))
+        assert not response.ok
+        context.set_code.assert_called_once_with(grpc.StatusCode.INTERNAL)
+
+    def test_health(self, server: Any) -> None:
+        response = run(servicer(server, maxsize=10).Health(MagicMock(), make_context()))
+        assert response.ok
+        assert response.service == "agent-gateway"
+
+
+def test_read_file_chunks(tmp_path: Path) -> None:
+    commands = tmp_path / "commands.txt"
+    commands.write_text("".join(f"inventory {index}\n" for index in range(5)), encoding="utf-8")
+
+    async def collect() -> list[list[str]]:
+        return [list(chunk) async for chunk in _read_file_chunks(commands, 2)]
+
+    chunked = run(collect())
+    assert [len(chunk) for chunk in chunked] == [2, 2, 1]
+    assert [line.strip() for chunk in chunked for line in chunk] == [f"inventory {index}" for index in range(5)]
+
+
+def test_serve_async_answers_grpc_calls(server: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(aio, "create_async_redis_client", lambda settings: async_client(server))
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    async def scenario() -> tuple[Any, Any]:
+        serving = asyncio.create_task(
+            serve_async(
+                redis_settings=load_redis_settings(),
+                task_queue_name="tasks",
+                task_queue_maxsize=10,
+                dispatch_batch_size=10,
+                coalesce=False,
+                coalesce_ttl_seconds=300.0,
+                wire_format="json",
+                compress_min_bytes=0,
+                transport="list",
+                admission=AdmissionController(max_wait_seconds=0.0),
+                listen_addr=f"127.0.0.1:{port}",
+            )
+        )
+        try:
+            async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+                await asyncio.wait_for(channel.channel_ready(), timeout=10)
+                stub = agent_pb2_grpc.AgentGatewayStub(channel)
+                health = await stub.Health(agent_pb2.HealthRequest())
+                run_response = await stub.RunStream(
+                    iter([agent_pb2.CommandChunk(commands=["inventory", "inventory", "reboot"])])
+                )
+                return health, run_response
+        finally:
+            serving.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await serving
+
+    health, response = run(scenario())
+    assert health.ok
+    assert (response.accepted, response.rejected) == (2, 1)
+    assert sync_client(server).llen("tasks") == 2
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from queue import Full
+from typing import Any
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.agent_gateway.app import AgentGatewayServicer, RedisTaskQueueAdapter  # noqa: E402
+from services.common.task_coalescing import TaskCoalescer  # noqa: E402
+
+
+@pytest.fixture()
+def client() -> Any:
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+class TestRedisTaskQueueAdapter:
+    def test_put_many_respects_maxsize(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=3)
+        assert adapter.put_many(["inventory"] * 5) == 3
+        assert client.llen("tasks") == 3
+
+    def test_put_raises_full_when_queue_is_full(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=1)
+        adapter.put("inventory")
+        with pytest.raises(Full):
+            adapter.put("inventory")
+
+    def test_messages_keep_fifo_order(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=0)
+        adapter.put_many(["inventory", "other"])
+        first = json.loads(client.rpop("tasks"))
+        assert first["command"] == "inventory"
+
+
+class TestBoundedEnqueueScript:
+    def test_capacity_counts_messages_already_queued(self, client: Any) -> None:
+        client.lpush("tasks", "queued", "queued")
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=5)
+        assert adapter.put_many(["inventory"] * 5) == 3
+        assert client.llen("tasks") == 5
+        assert adapter.put_many(["inventory"]) == 0
+
+    @pytest.mark.parametrize("transport", ["list", "stream"])
+    def test_over_full_queue_accepts_nothing(self, client: Any, transport: str) -> None:
+        # Requeued tasks or a lowered TASK_QUEUE_MAXSIZE can leave the queue above the bound.
+        RedisTaskQueueAdapter(client, "tasks", maxsize=0, transport=transport).put_many(["inventory"] * 7)
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=5, transport=transport)
+        assert adapter.put_many(["inventory"] * 10) == 0
+        assert (client.xlen("tasks") if transport == "stream" else client.llen("tasks")) == 7
+
+    def test_over_full_queue_still_lets_commands_join_in_flight_tasks(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=1, coalesce=True)
+        assert adapter.put("inventory") is None
+        client.lpush("tasks", "requeued", "requeued")
+        assert adapter.put_many(["inventory", "inventory"]) == 2
+        assert client.llen("tasks") == 3
+
+    def test_partial_acceptance_keeps_the_head_of_the_batch(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=2)
+        assert adapter.put_many(["first", "second", "third"]) == 2
+        commands = [json.loads(client.rpop("tasks"))["command"] for _ in range(2)]
+        assert commands == ["first", "second"]
+
+    def test_stream_transport_is_bounded_by_length(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=2, transport="stream")
+        assert adapter.put_many(["inventory"] * 3) == 2
+        assert client.xlen("tasks") == 2
+
+    def test_concurrent_put_many_never_overshoots(self) -> None:
+        server = fakeredis.FakeServer()
+        maxsize, callers, per_call = 100, 8, 30
+        accepted: list[int] = []
+        lock = threading.Lock()
+
+        def put() -> None:
+            adapter = RedisTaskQueueAdapter(fakeredis.FakeRedis(server=server), "tasks", maxsize=maxsize)
+            count = adapter.put_many(["inventory"] * per_call)
+            with lock:
+                accepted.append(count)
+
+        threads = [threading.Thread(target=put) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sum(accepted) == maxsize
+        assert fakeredis.FakeRedis(server=server).llen("tasks") == maxsize
+
+
+class TestTaskCoalescing:
+    def test_identical_commands_share_one_task(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=1, coalesce=True)
+        assert adapter.put_many(["inventory"] * 4) == 4
+        assert adapter.put_many(["inventory"] * 2) == 2
+        assert client.llen("tasks") == 1
+
+        message = json.loads(client.rpop("tasks"))
+        task_ids = TaskCoalescer(client, "tasks").claim("inventory", message["task_id"])
+        assert len(task_ids) == 6
+        assert task_ids[0] == message["task_id"]
+
+    def test_claimed_task_is_no_longer_joined(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=10, coalesce=True)
+        adapter.put("inventory")
+        message = json.loads(client.rpop("tasks"))
+        TaskCoalescer(client, "tasks").claim("inventory", message["task_id"])
+
+        adapter.put("inventory")
+        assert client.llen("tasks") == 1
+
+    def test_claim_without_coalescing_returns_own_id(self, client: Any) -> None:
+        coalescer = TaskCoalescer(client, "tasks")
+        assert coalescer.claim("inventory", "abc") == ["abc"]
+
+    def test_redelivered_task_keeps_its_requesters(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=10, coalesce=True)
+        adapter.put_many(["inventory"] * 3)
+        leader = json.loads(client.rpop("tasks"))["task_id"]
+        coalescer = TaskCoalescer(client, "tasks")
+
+        first = coalescer.claim("inventory", leader)
+        # The worker crashed before publishing; the task is delivered again.
+        assert coalescer.claim("inventory", leader) == first
+        assert len(first) == 3
+
+        coalescer.release_many([leader])
+        assert coalescer.claim("inventory", leader) == [leader]
+
+    def test_stale_leader_hands_requesters_to_next_task(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=10, coalesce=True, coalesce_ttl_seconds=0.01)
+        adapter.put_many(["inventory"] * 2)
+        time.sleep(0.05)
+        adapter.put("inventory")
+
+        assert client.llen("tasks") == 2
+        lost, fresh = (json.loads(raw)["task_id"] for raw in client.lrange("tasks", 0, -1)[::-1])
+        coalescer = TaskCoalescer(client, "tasks")
+        task_ids = coalescer.claim("inventory", fresh)
+        assert task_ids[0] == fresh
+        assert len(task_ids) == 3
+        assert lost in task_ids
+        # The presumed-lost leader, should it still run, answers only itself.
+        assert coalescer.claim("inventory", lost) == [lost]
+
+    def test_release_without_coalescing_is_harmless(self, client: Any) -> None:
+        TaskCoalescer(client, "tasks").release_many(["abc"])
+        TaskCoalescer(client, "tasks").release_many([])
+
+
+class TestAdmissionControl:
+    @staticmethod
+    def _run(client: Any, maxsize: int, commands: list[str]) -> tuple[Any, Any]:
+        servicer = AgentGatewayServicer(
+            client, "tasks", task_queue_maxsize=maxsize, put_timeout_seconds=0.0, dispatch_batch_size=2
+        )
+        context = MagicMock()
+        context.time_remaining.return_value = None
+        chunks = [MagicMock(commands=commands)]
+        return servicer.RunStream(iter(chunks), context), context
+
+    def test_full_queue_fails_with_resource_exhausted(self, client: Any) -> None:
+        client.lpush("tasks", "queued")
+        response, context = self._run(client, maxsize=1, commands=["inventory"] * 3)
+        context.set_code.assert_called_once_with(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        assert response.throttled == 3
+        assert response.retry_after_ms > 0
+        metadata = dict(context.set_trailing_metadata.call_args.args[0])
+        assert int(metadata["retry-after-ms"]) == response.retry_after_ms
+
+    def test_partial_dispatch_reports_counts(self, client: Any) -> None:
+        response, context = self._run(client, maxsize=3, commands=["inventory", "reboot"] + ["inventory"] * 5)
+        context.set_code.assert_not_called()
+        assert not response.ok
+        assert (response.accepted, response.rejected, response.throttled) == (3, 1, 3)
+        assert client.llen("tasks") == 3
+
+    def test_input_after_throttle_is_still_counted(self, client: Any) -> None:
+        commands = ["inventory"] * 3 + ["reboot", "inventory", "", "shutdown", "inventory"]
+        response, _ = self._run(client, maxsize=1, commands=commands)
+        assert (response.accepted, response.rejected, response.throttled) == (1, 2, 4)
+        assert response.accepted + response.rejected + response.throttled == len([c for c in commands if c])
+        assert client.llen("tasks") == 1
+
+    def test_no_throttling_returns_ok(self, client: Any) -> None:
+        response, context = self._run(client, maxsize=10, commands=["inventory"] * 3)
+        assert response.ok
+        assert response.accepted == 3
+        context.set_trailing_metadata.assert_not_called()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import Any
+
+from legacy.src.agent.inventory.collectors import ERRORS_SECTION
+from services.inventory_service.cache import InventoryCache
+
+
+class FakeSource:
+    def __init__(self) -> None:
+        self.version = 1
+        self.collected = 0
+        self.now = 0.0
+
+    def collect(self) -> dict[str, Any]:
+        self.collected += 1
+        return {"os": {"CurrentBuild": str(self.version)}}
+
+    def read_version(self) -> int:
+        return self.version
+
+    def clock(self) -> float:
+        return self.now
+
+
+def make_cache(source: FakeSource, max_age_seconds: float = 60.0) -> InventoryCache:
+    return InventoryCache(source.collect, source.read_version, max_age_seconds, clock=source.clock)
+
+
+class TestInventoryCache:
+    def test_unchanged_key_is_served_from_cache(self) -> None:
+        source = FakeSource()
+        cache = make_cache(source)
+        assert cache.get() == cache.get()
+        assert source.collected == 1
+        assert cache.stats() == {"hits": 1, "misses": 1}
+
+    def test_key_write_invalidates_entry(self) -> None:
+        source = FakeSource()
+        cache = make_cache(source)
+        cache.get()
+        source.version = 2
+        assert cache.get()["os"]["CurrentBuild"] == "2"
+        assert source.collected == 2
+
+    def test_entry_expires_after_max_age(self) -> None:
+        source = FakeSource()
+        cache = make_cache(source, max_age_seconds=10.0)
+        cache.get()
+        source.now = 10.0
+        cache.get()
+        assert source.collected == 2
+
+    def test_failed_probe_collects_uncached(self) -> None:
+        source = FakeSource()
+
+        def broken_probe() -> int:
+            raise OSError("access denied")
+
+        cache = InventoryCache(source.collect, broken_probe, 60.0)
+        cache.get()
+        cache.get()
+        assert source.collected == 2
+        assert cache.stats() == {"hits": 0, "misses": 2}
+
+    def test_cached_payload_is_not_shared(self) -> None:
+        source = FakeSource()
+        cache = make_cache(source)
+        cache.get()["os"]["CurrentBuild"] = "mutated"
+        assert cache.get()["os"]["CurrentBuild"] == "1"
+
+    def test_partial_payload_is_not_cached(self) -> None:
+        source = FakeSource()
+        partial = {"os": {"CurrentBuild": "1"}, ERRORS_SECTION: {"software": "timed out after 30s"}}
+        payloads = [partial, {"os": {"CurrentBuild": "1"}, "software": []}]
+        cache = InventoryCache(lambda: payloads.pop(0), source.read_version, 60.0, clock=source.clock)
+
+        assert cache.get() == partial
+        assert ERRORS_SECTION not in cache.get()
+        assert cache.stats() == {"hits": 0, "misses": 2}
+        assert cache.get()["software"] == []
+        assert cache.stats() == {"hits": 1, "misses": 2}
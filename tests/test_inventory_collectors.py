@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+import pytest
+
+from legacy.src.agent.inventory.collectors import (
+    ERRORS_SECTION,
+    Collector,
+    collect_hotfixes,
+    collect_services,
+    collect_software,
+    collector_executor,
+    parse_collectors,
+    run_collectors,
+    select_collectors,
+    watched_last_write_time,
+)
+from legacy.src.agent.inventory.simulated import SimulatedRegistry
+
+HKLM = "HKEY_LOCAL_MACHINE\\"
+UNINSTALL = HKLM + "Software\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\"
+WOW_UNINSTALL = HKLM + "Software\\WOW6432Node\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\"
+PACKAGES = HKLM + "Software\\Microsoft\\Windows\\CurrentVersion\\Component Based Servicing\\Packages\\"
+SERVICES = HKLM + "System\\CurrentControlSet\\Services\\"
+
+
+@pytest.fixture()
+def registry() -> SimulatedRegistry:
+    return SimulatedRegistry(
+        {
+            UNINSTALL + "git": {"DisplayName": "Git", "DisplayVersion": "2.43.0", "Publisher": "Git"},
+            UNINSTALL + "hidden": {"DisplayName": "Runtime", "SystemComponent": 1},
+            UNINSTALL + "no-name": {"UninstallString": "msiexec"},
+            WOW_UNINSTALL + "vcredist": {"DisplayName": "VC++ Redist (x86)", "DisplayVersion": "14.38"},
+            PACKAGES + "Package_for_KB5034122~amd64~~1": {"CurrentState": 112},
+            PACKAGES + "Package_for_KB5034122~wow64~~1": {"CurrentState": 112},
+            PACKAGES + "Package_for_KB5032189~amd64~~1": {"CurrentState": 5},
+            PACKAGES + "Package_for_KB987~amd64~~1": {"CurrentState": 112},
+            PACKAGES + "LanguagePack~amd64~en-US": {"CurrentState": 112},
+            SERVICES + "Spooler": {"DisplayName": "Print Spooler", "Type": 16, "Start": 2},
+            SERVICES + "disk": {"DisplayName": "Disk Driver", "Type": 1, "Start": 0},
+        },
+        last_write_time=7,
+    )
+
+
+class TestCollectors:
+    def test_software_from_both_registry_views(self, registry: SimulatedRegistry) -> None:
+        software = collect_software(registry)
+        assert [(entry["DisplayName"], entry["Architecture"]) for entry in software] == [
+            ("Git", "x64"),
+            ("VC++ Redist (x86)", "x86"),
+        ]
+
+    def test_hotfixes_are_installed_kb_packages(self, registry: SimulatedRegistry) -> None:
+        assert collect_hotfixes(registry) == ["KB987", "KB5034122"]
+
+    def test_services_skip_drivers(self, registry: SimulatedRegistry) -> None:
+        assert collect_services(registry) == [
+            {"Name": "Spooler", "DisplayName": "Print Spooler", "Start": "automatic", "ImagePath": "", "ObjectName": ""}
+        ]
+
+    def test_missing_keys_give_empty_sections(self) -> None:
+        empty = SimulatedRegistry({})
+        assert collect_software(empty) == []
+        assert collect_hotfixes(empty) == []
+        assert collect_services(empty) == []
+
+    def test_watched_last_write_time_skips_missing_keys(self, registry: SimulatedRegistry) -> None:
+        assert watched_last_write_time(registry, select_collectors(["os", "software"])) == 7
+
+    def test_watched_last_write_time_sees_changes_inside_subkeys(self, registry: SimulatedRegistry) -> None:
+        git = registry.OpenKey(registry.HKEY_LOCAL_MACHINE, UNINSTALL[len(HKLM) :] + "git")
+        git.last_write_time = 9
+        assert watched_last_write_time(registry, select_collectors(["software"])) == 9
+        assert watched_last_write_time(registry, select_collectors(["services"])) == 7
+
+
+class TestRunCollectors:
+    def test_failing_and_slow_collectors_give_partial_payload(self, registry: SimulatedRegistry) -> None:
+        release = threading.Event()
+
+        def broken(winreg: Any) -> Any:
+            raise PermissionError("access denied")
+
+        def slow(winreg: Any) -> Any:
+            release.wait(5)
+            return ["late"]
+
+        collectors = [
+            Collector("services", collect_services, ()),
+            Collector("broken", broken, ()),
+            Collector("slow", slow, ()),
+        ]
+        try:
+            payload = run_collectors(registry, collectors, timeout_seconds=0.2)
+        finally:
+            release.set()
+
+        assert payload["services"][0]["Name"] == "Spooler"
+        assert "slow" not in payload
+        assert payload[ERRORS_SECTION] == {"broken": "access denied", "slow": "timed out after 0.2s"}
+
+    def test_collectors_run_concurrently(self, registry: SimulatedRegistry) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet(winreg: Any) -> str:
+            barrier.wait()
+            return "ok"
+
+        payload = run_collectors(registry, [Collector("a", meet, ()), Collector("b", meet, ())], timeout_seconds=5)
+        assert payload == {"a": "ok", "b": "ok"}
+
+    def test_shared_executor_is_reused_and_survives_a_timeout(self, registry: SimulatedRegistry) -> None:
+        release = threading.Event()
+        threads: set[str] = set()
+
+        def hang(winreg: Any) -> str:
+            release.wait(5)
+            return "late"
+
+        def record(winreg: Any) -> str:
+            threads.add(threading.current_thread().name)
+            return "ok"
+
+        collectors = [Collector("hang", hang, ()), Collector("record", record, ())]
+        executor = collector_executor(collectors)
+        try:
+            first = run_collectors(registry, collectors, timeout_seconds=0.1, executor=executor)
+            second = run_collectors(registry, [collectors[1]], timeout_seconds=5, executor=executor)
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+        assert first["record"] == second["record"] == "ok"
+        assert first[ERRORS_SECTION] == {"hang": "timed out after 0.1s"}
+        assert all(name.startswith("inventory-collector") for name in threads)
+
+
+class TestSelectCollectors:
+    def test_parse_and_select(self) -> None:
+        names = parse_collectors(" OS, software ,,")
+        assert names == ("os", "software")
+        assert [collector.name for collector in select_collectors(names)] == ["os", "software"]
+
+    def test_unknown_or_empty_selection_raises(self) -> None:
+        with pytest.raises(ValueError, match="Unknown"):
+            select_collectors(["os", "drivers"])
+        with pytest.raises(ValueError, match="At least one"):
+            select_collectors([])
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from legacy.src.agent.inventory.providers import (
+    DEFAULT_SNAPSHOT_DIR,
+    ProviderSettings,
+    SimulatedInventoryError,
+    SimulatedProvider,
+    WinregProvider,
+    create_provider,
+)
+from legacy.src.agent.inventory.simulated import REG_DWORD, REG_SZ, SimulatedRegistry
+
+CURRENT_VERSION = "HKEY_LOCAL_MACHINE\\Software\\Microsoft\\Windows NT\\CurrentVersion"
+
+
+@pytest.fixture()
+def registry() -> SimulatedRegistry:
+    return SimulatedRegistry(
+        {CURRENT_VERSION: {"ProductName": "Windows 10 Pro", "ReleaseId": "2009", "UBR": 3448}},
+        last_write_time=42,
+    )
+
+
+class TestSimulatedRegistry:
+    def test_open_key_is_case_insensitive(self, registry: SimulatedRegistry) -> None:
+        with registry.OpenKey(registry.HKEY_LOCAL_MACHINE, r"SOFTWARE\microsoft\Windows NT\CurrentVersion") as key:
+            assert registry.QueryValueEx(key, "productname") == ("Windows 10 Pro", REG_SZ)
+            assert registry.QueryValueEx(key, "UBR") == (3448, REG_DWORD)
+            assert registry.QueryInfoKey(key) == (0, 3, 42)
+
+    def test_missing_key_and_value_raise_file_not_found(self, registry: SimulatedRegistry) -> None:
+        with pytest.raises(FileNotFoundError):
+            registry.OpenKey(registry.HKEY_LOCAL_MACHINE, r"Software\Missing")
+        key = registry.OpenKey(registry.HKEY_LOCAL_MACHINE, r"Software\Microsoft\Windows NT\CurrentVersion")
+        with pytest.raises(FileNotFoundError):
+            registry.QueryValueEx(key, "DisplayVersion")
+
+    def test_enumeration_ends_with_os_error(self, registry: SimulatedRegistry) -> None:
+        key = registry.OpenKey(registry.HKEY_LOCAL_MACHINE, r"Software\Microsoft")
+        assert registry.EnumKey(key, 0) == "Windows NT"
+        with pytest.raises(OSError):
+            registry.EnumKey(key, 1)
+
+    def test_from_file_rejects_bad_snapshot(self, tmp_path: Path) -> None:
+        snapshot = tmp_path / "bad.json"
+        snapshot.write_text(json.dumps([1, 2]), encoding="utf-8")
+        with pytest.raises(ValueError):
+            SimulatedRegistry.from_file(snapshot)
+
+
+class TestProviders:
+    def test_simulated_provider_runs_real_collector(self, registry: SimulatedRegistry) -> None:
+        provider = SimulatedProvider(registry)
+        os_fields = provider.collect()["os"]
+        assert os_fields["ProductName"] == "Windows 10 Pro"
+        assert os_fields["DisplayVersion"] == "2009"
+        assert provider.last_write_time() == 42
+
+    def test_error_injection(self, registry: SimulatedRegistry) -> None:
+        provider = SimulatedProvider(registry, error_rate=1.0)
+        with pytest.raises(SimulatedInventoryError):
+            provider.collect()
+
+    def test_bundled_snapshots_load(self) -> None:
+        for seed in range(5):
+            provider = create_provider(ProviderSettings(name="simulated"), rng=random.Random(seed))
+            assert provider.collect()["os"]["CurrentBuild"]
+
+    def test_create_provider_validates_settings(self) -> None:
+        assert isinstance(create_provider(ProviderSettings()), WinregProvider)
+        with pytest.raises(ValueError):
+            create_provider(ProviderSettings(name="wmi"))
+        with pytest.raises(ValueError):
+            create_provider(ProviderSettings(name="simulated", error_rate=2.0))
+        with pytest.raises(FileNotFoundError):
+            create_provider(ProviderSettings(name="simulated", snapshot_path=DEFAULT_SNAPSHOT_DIR / "missing"))
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import threading
+from typing import Any
+
+import pytest
+import redis
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.agent_gateway.app import RedisTaskQueueAdapter  # noqa: E402
+from services.common.queue_transport import create_transport  # noqa: E402
+from services.common.task_coalescing import TaskCoalescer  # noqa: E402
+from services.inventory_service import worker  # noqa: E402
+
+
+@pytest.fixture()
+def client() -> Any:
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture(autouse=True)
+def fake_inventory(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(worker, "collect_windows_inventory", lambda: {"os": {"name": "Windows"}})
+
+
+class TestProcessTasks:
+    def test_batch_claims_requesters_and_skips_bad_tasks(self, client: Any) -> None:
+        adapter = RedisTaskQueueAdapter(client, "tasks", maxsize=0, coalesce=True)
+        adapter.put_many(["inventory"] * 3)
+        raws = [*client.rpop("tasks", 10), b"not json", json.dumps({"task_id": "x", "command": "reboot"}).encode()]
+
+        results = worker.process_tasks(raws, TaskCoalescer(client, "tasks"))
+        assert len(results) == 1
+        assert results[0].status == "ok"
+        assert len(results[0].task_ids) == 3
+        # Requesters stay until the result is published, in case the task is redelivered.
+        assert client.hlen("tasks:requesters") == 1
+        assert client.hlen("tasks:inflight") == 0
+
+    def test_collection_error_becomes_error_result(self, client: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+        def fail() -> dict[str, Any]:
+            raise OSError("registry unavailable")
+
+        monkeypatch.setattr(worker, "collect_windows_inventory", fail)
+        raw = json.dumps({"task_id": "t1", "command": "Inventory"}).encode()
+        results = worker.process_tasks([raw], TaskCoalescer(client, "tasks"))
+        assert [(result.task_ids, result.status, result.error) for result in results] == [
+            (["t1"], "error", "registry unavailable")
+        ]
+
+
+class TestConcurrentTaskRunner:
+    def test_runs_tasks_in_parallel_and_publishes_each_result(self, client: Any) -> None:
+        started = threading.Barrier(2, timeout=5)
+
+        def collect() -> dict[str, Any]:
+            started.wait()
+            return {"os": {}}
+
+        tasks = create_transport(client, "tasks", "list")
+        results = create_transport(client, "results", "list")
+        runner = worker.ConcurrentTaskRunner(2, tasks, results, TaskCoalescer(client, "tasks"), "json", collect)
+        tasks.publish([json.dumps({"task_id": f"t{i}", "command": "inventory"}).encode() for i in range(2)])
+
+        runner.submit(tasks.fetch(runner.free_slots(timeout=0), block_seconds=1))
+        runner.shutdown()
+
+        assert client.llen("results") == 2
+        assert runner.free_slots(timeout=0) == 2
+
+    def test_published_task_releases_its_requesters(self, client: Any) -> None:
+        RedisTaskQueueAdapter(client, "tasks", maxsize=0, coalesce=True).put_many(["inventory"] * 2)
+        tasks = create_transport(client, "tasks", "list")
+        results = create_transport(client, "results", "list")
+        runner = worker.ConcurrentTaskRunner(2, tasks, results, TaskCoalescer(client, "tasks"), "json")
+
+        runner.submit(tasks.fetch(2, block_seconds=1))
+        runner.shutdown()
+
+        assert client.llen("results") == 1
+        assert client.hlen("tasks:requesters") == 0
+
+    def test_invalid_tasks_do_not_take_slots(self, client: Any) -> None:
+        tasks = create_transport(client, "tasks", "list")
+        results = create_transport(client, "results", "list")
+        runner = worker.ConcurrentTaskRunner(2, tasks, results, TaskCoalescer(client, "tasks"), "json")
+        tasks.publish([b"not json"])
+
+        runner.submit(tasks.fetch(2, block_seconds=1))
+        assert runner.free_slots(timeout=0) == 2
+        runner.shutdown()
+        assert client.llen("results") == 0
+
+    def test_redis_failure_on_claim_leaves_deliveries_unacked(self, client: Any) -> None:
+        class FailingCoalescer(TaskCoalescer):
+            def claim_many(self, tasks: Any) -> list[list[str]]:
+                raise redis.ConnectionError("redis went away")
+
+        tasks = create_transport(client, "tasks", "stream", group="workers", consumer="c1")
+        tasks.ensure_group()
+        results = create_transport(client, "results", "list")
+        runner = worker.ConcurrentTaskRunner(2, tasks, results, FailingCoalescer(client, "tasks"), "json")
+        tasks.publish([json.dumps({"task_id": "t1", "command": "inventory"}).encode()])
+
+        assert runner.submit(tasks.fetch(2, block_seconds=1)) is False
+        runner.shutdown()
+        assert runner.free_slots(timeout=0) == 2
+        assert client.xpending("tasks", "workers")["pending"] == 1
+        assert client.llen("results") == 0
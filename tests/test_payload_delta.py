@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+
+from legacy.src.agent.inventory.collectors import ERRORS_SECTION
+from services.common.envelope import ResultMessage
+from services.common.payload_delta import DeltaEncoder, DeltaMismatchError, PayloadState, section_hash
+
+PAYLOAD: dict[str, Any] = {
+    "os": {"ProductName": "Windows 11", "CurrentBuild": "22631"},
+    "software": [{"DisplayName": "7-Zip", "DisplayVersion": "23.01"}],
+    "hotfixes": ["KB5031455"],
+}
+
+
+def make_result(payload: dict[str, Any] | None, task_id: str = "t1") -> ResultMessage:
+    return ResultMessage(
+        task_id=task_id,
+        task_ids=[task_id],
+        status="ok" if payload is not None else "error",
+        payload=payload,
+        ts=datetime.now(timezone.utc),
+    )
+
+
+class TestDeltaEncoder:
+    def test_first_result_is_full_then_only_changes_are_sent(self) -> None:
+        encoder = DeltaEncoder(full_every=10)
+        assert encoder.encode(make_result(PAYLOAD)).payload == PAYLOAD
+
+        unchanged = encoder.encode(make_result(PAYLOAD))
+        assert unchanged.payload == {}
+        assert unchanged.unchanged_sections == {name: section_hash(value) for name, value in PAYLOAD.items()}
+
+        changed = encoder.encode(make_result({**PAYLOAD, "hotfixes": ["KB5031455", "KB5032190"]}))
+        assert changed.payload == {"hotfixes": ["KB5031455", "KB5032190"]}
+        assert set(changed.unchanged_sections) == {"os", "software"}
+
+    def test_full_payload_every_n_results(self) -> None:
+        encoder = DeltaEncoder(full_every=3)
+        sent = [encoder.encode(make_result(PAYLOAD)) for _ in range(6)]
+        assert [not result.unchanged_sections for result in sent] == [True, False, False, True, False, False]
+
+    def test_full_every_one_disables_deltas(self) -> None:
+        encoder = DeltaEncoder(full_every=1)
+        encoder.encode(make_result(PAYLOAD))
+        assert encoder.encode(make_result(PAYLOAD)).payload == PAYLOAD
+
+    def test_error_results_pass_through(self) -> None:
+        encoder = DeltaEncoder(full_every=10)
+        error = make_result(None)
+        assert encoder.encode(error) is error
+        assert encoder.encode(make_result(PAYLOAD)).payload == PAYLOAD
+
+    def test_failed_publish_keeps_the_base(self) -> None:
+        encoder = DeltaEncoder(full_every=10)
+        encoder.encode(make_result(PAYLOAD))
+        updated = {**PAYLOAD, "hotfixes": ["KB5031455", "KB5032190"]}
+
+        def fail(results: list[ResultMessage]) -> None:
+            raise ConnectionError("redis down")
+
+        with pytest.raises(ConnectionError):
+            encoder.publish([make_result(updated)], fail)
+
+        state = PayloadState(PAYLOAD)
+        retried = encoder.encode(make_result(updated))
+        assert retried.payload == {"hotfixes": ["KB5031455", "KB5032190"]}
+        assert state.merge(retried.payload, retried.unchanged_sections) == updated
+
+    def test_batch_is_encoded_as_a_chain(self) -> None:
+        encoder = DeltaEncoder(full_every=10)
+        updated = {**PAYLOAD, "hotfixes": []}
+        sent: list[ResultMessage] = []
+        encoder.publish([make_result(PAYLOAD), make_result(updated)], sent.extend)
+
+        state = PayloadState()
+        for result in sent:
+            assert result.payload is not None
+            state.replace(state.merge(result.payload, result.unchanged_sections))
+        assert state.payload == updated
+        assert encoder.encode(make_result(updated)).payload == {}
+
+    def test_hash_ignores_key_order(self) -> None:
+        assert section_hash({"a": 1, "b": 2}) == section_hash({"b": 2, "a": 1})
+
+
+class TestPayloadState:
+    def test_merge_applies_changes_and_drops_missing_sections(self) -> None:
+        state = PayloadState(PAYLOAD)
+        merged = state.merge({"hotfixes": []}, {"os": section_hash(PAYLOAD["os"])})
+        assert merged == {"os": PAYLOAD["os"], "hotfixes": []}
+
+    def test_merge_rejects_stale_base(self) -> None:
+        state = PayloadState({"os": {"ProductName": "Windows 10"}})
+        with pytest.raises(DeltaMismatchError, match="os"):
+            state.merge({}, {"os": section_hash(PAYLOAD["os"])})
+
+    def test_section_of_failed_collector_is_kept(self) -> None:
+        state = PayloadState(PAYLOAD)
+        encoder = DeltaEncoder(full_every=10)
+        encoder.encode(make_result(PAYLOAD))
+        partial = {name: value for name, value in PAYLOAD.items() if name != "hotfixes"}
+        partial[ERRORS_SECTION] = {"hotfixes": "timed out after 30s"}
+
+        delta = encoder.encode(make_result(partial))
+        assert delta.payload is not None
+        merged = state.merge(delta.payload, delta.unchanged_sections)
+        assert merged["hotfixes"] == PAYLOAD["hotfixes"]
+        assert merged[ERRORS_SECTION] == {"hotfixes": "timed out after 30s"}
+
+        # A full payload with the same failure keeps the section too.
+        assert state.merge(partial, {})["hotfixes"] == PAYLOAD["hotfixes"]
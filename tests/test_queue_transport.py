@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.common.queue_transport import (  # noqa: E402
+    ListTransport,
+    ReliableListTransport,
+    StreamTransport,
+    create_transport,
+    processing_key,
+)
+
+
+@pytest.fixture()
+def client() -> Any:
+    return fakeredis.FakeRedis()
+
+
+class TestListTransport:
+    def test_fifo_roundtrip(self, client: Any) -> None:
+        transport = create_transport(client, "q", "list")
+        assert isinstance(transport, ListTransport)
+        transport.publish([b"a", b"b"])
+        assert transport.fetch(1, block_seconds=1)[0].data == b"a"
+        assert transport.stats() == {"length": 1}
+
+    def test_backed_up_queue_is_drained_in_one_fetch(self, client: Any) -> None:
+        transport = create_transport(client, "q", "list")
+        transport.publish([b"a", b"b", b"c"])
+        assert [delivery.data for delivery in transport.fetch(2, block_seconds=1)] == [b"a", b"b"]
+        assert [delivery.data for delivery in transport.fetch(5, block_seconds=1)] == [b"c"]
+
+
+class TestReliableListTransport:
+    def _consumer(self, client: Any, name: str, visibility_timeout_ms: int = 60_000) -> ReliableListTransport:
+        transport = create_transport(client, "q", "reliable-list", consumer=name, claim_idle_ms=visibility_timeout_ms)
+        assert isinstance(transport, ReliableListTransport)
+        transport.ensure_group()
+        return transport
+
+    def test_fetch_moves_to_processing_until_ack(self, client: Any) -> None:
+        consumer = self._consumer(client, "c1")
+        consumer.publish([b"a", b"b", b"c"])
+
+        deliveries = consumer.fetch(2, block_seconds=1)
+        assert [delivery.data for delivery in deliveries] == [b"a", b"b"]
+        assert consumer.stats() == {"length": 1, "processing": 2, "leased": 2}
+
+        consumer.ack(deliveries)
+        assert consumer.stats() == {"length": 1, "processing": 0, "leased": 0}
+
+    def test_empty_queue_waits_with_blmove(self, client: Any) -> None:
+        consumer = self._consumer(client, "c1")
+        assert consumer.fetch(5, block_seconds=1) == []
+        consumer.publish([b"a"])
+        client.lpush("q", b"x")  # the non-blocking path takes both
+        assert [delivery.data for delivery in consumer.fetch(5, block_seconds=1)] == [b"a", b"x"]
+
+    def test_expired_entries_of_crashed_consumer_are_requeued_first(self, client: Any) -> None:
+        crashed = self._consumer(client, "crashed", visibility_timeout_ms=0)
+        crashed.publish([b"task", b"next"])
+        assert [delivery.data for delivery in crashed.fetch(1, block_seconds=1)] == [b"task"]
+
+        survivor = self._consumer(client, "survivor")
+        assert survivor.reap() == 1
+        reclaimed = survivor.fetch(1, block_seconds=1)
+        assert [delivery.data for delivery in reclaimed] == [b"task"]
+        survivor.ack(reclaimed)
+        assert client.llen(processing_key("q", "crashed")) == 0
+        assert survivor.stats() == {"length": 1, "processing": 0, "leased": 0}
+
+    def test_unleased_entry_left_by_blmove_is_leased_then_requeued(self, client: Any) -> None:
+        client.lpush(processing_key("q", "crashed"), b"task")
+        client.zadd("q:consumers", {"crashed": 0})
+        reaper = self._consumer(client, "reaper", visibility_timeout_ms=0)
+
+        assert reaper.reap() == 1
+        assert client.lrange("q", 0, -1) == [b"task"]
+        assert reaper.reap() == 0
+        assert client.zcard("q:consumers") == 0  # idle with nothing in progress
+
+    def test_unexpired_entries_stay_with_their_consumer(self, client: Any) -> None:
+        worker = self._consumer(client, "worker")
+        worker.publish([b"task"])
+        worker.fetch(1, block_seconds=1)
+
+        assert self._consumer(client, "other").reap() == 0
+        assert worker.stats()["processing"] == 1
+
+
+class TestStreamTransport:
+    def _consumer(self, client: Any, name: str, claim_idle_ms: int = 60_000) -> StreamTransport:
+        transport = create_transport(client, "q", "stream", group="g", consumer=name, claim_idle_ms=claim_idle_ms)
+        assert isinstance(transport, StreamTransport)
+        transport.ensure_group()
+        return transport
+
+    def test_batched_read_and_ack_trims_stream(self, client: Any) -> None:
+        consumer = self._consumer(client, "c1")
+        consumer.publish([b"1", b"2", b"3"])
+
+        deliveries = consumer.fetch(2, block_seconds=1)
+        assert [delivery.data for delivery in deliveries] == [b"1", b"2"]
+        assert consumer.stats() == {"length": 3, "pending": 2, "lag": 1}
+
+        consumer.ack(deliveries)
+        assert consumer.stats() == {"length": 1, "pending": 0, "lag": 1}
+
+    def test_ensure_group_is_idempotent(self, client: Any) -> None:
+        self._consumer(client, "c1")
+        self._consumer(client, "c1")
+
+    def test_idle_entries_are_reclaimed_by_another_consumer(self, client: Any) -> None:
+        crashed = self._consumer(client, "crashed")
+        crashed.publish([b"task"])
+        assert len(crashed.fetch(1, block_seconds=1)) == 1
+
+        survivor = self._consumer(client, "survivor", claim_idle_ms=0)
+        reclaimed = survivor.fetch(1, block_seconds=1)
+        assert [delivery.data for delivery in reclaimed] == [b"task"]
+        survivor.ack(reclaimed)
+        assert survivor.stats()["pending"] == 0
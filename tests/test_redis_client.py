@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from services.common.redis_client import (
+    create_async_redis_client,
+    create_redis_client,
+    load_redis_settings,
+    pool_stats,
+)
+
+
+class TestLoadRedisSettings:
+    def test_defaults(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv("REDIS_HOST", raising=False)
+        settings = load_redis_settings()
+        assert settings.host == "localhost"
+        assert settings.port == 6379
+        assert settings.block_timeout_seconds < settings.socket_timeout_seconds
+        assert settings.socket_keepalive is True
+
+    def test_block_timeout_must_stay_below_socket_timeout(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("REDIS_SOCKET_TIMEOUT_SECONDS", "5")
+        monkeypatch.setenv("REDIS_BLOCK_TIMEOUT_SECONDS", "5")
+        with pytest.raises(ValueError, match="REDIS_BLOCK_TIMEOUT_SECONDS"):
+            load_redis_settings()
+
+    def test_invalid_max_connections_raises(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "0")
+        with pytest.raises(ValueError, match="REDIS_MAX_CONNECTIONS"):
+            load_redis_settings()
+
+
+class TestCreateRedisClient:
+    def test_pool_is_bounded_and_tuned(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("REDIS_MAX_CONNECTIONS", "7")
+        monkeypatch.setenv("REDIS_HEALTH_CHECK_INTERVAL_SECONDS", "15")
+        client = create_redis_client(load_redis_settings())
+        kwargs = client.connection_pool.connection_kwargs
+        assert kwargs["health_check_interval"] == 15
+        assert kwargs["socket_keepalive"] is True
+        assert pool_stats(client) == {"max": 7, "created": 0, "idle": 0, "in_use": 0}
+
+    def test_unix_socket(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("REDIS_UNIX_SOCKET", "/var/run/redis.sock")
+        client = create_redis_client(load_redis_settings())
+        kwargs = client.connection_pool.connection_kwargs
+        assert kwargs["path"] == "/var/run/redis.sock"
+        assert "host" not in kwargs
+
+
+def _use_fakeredis(pool: Any, connection_class: Any, server: Any) -> None:
+    pool.connection_class = connection_class
+    pool.connection_kwargs.update(server=server, health_check_interval=0)
+
+
+class TestPoolStats:
+    def test_counts_checkouts(self) -> None:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = create_redis_client(load_redis_settings())
+        pool = client.connection_pool
+        _use_fakeredis(pool, fakeredis.FakeRedisConnection, fakeredis.FakeServer())
+
+        client.set("key", "value")
+        assert pool_stats(client) == {"max": 50, "created": 1, "idle": 1, "in_use": 0}
+        held = [pool.get_connection(), pool.get_connection()]
+        assert pool_stats(client) == {"max": 50, "created": 2, "idle": 0, "in_use": 2}
+        pool.release(held[0])
+        assert pool_stats(client) == {"max": 50, "created": 2, "idle": 1, "in_use": 1}
+
+    def test_counts_async_checkouts(self) -> None:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = create_async_redis_client(load_redis_settings())
+        pool = client.connection_pool
+        _use_fakeredis(pool, fakeredis.aioredis.FakeAsyncRedisConnection, fakeredis.FakeServer())
+
+        async def scenario() -> list[dict[str, int]]:
+            await client.set("key", "value")
+            seen = [pool_stats(client)]
+            connection = await pool.get_connection()
+            seen.append(pool_stats(client))
+            await pool.release(connection)
+            seen.append(pool_stats(client))
+            return seen
+
+        assert [stats["in_use"] for stats in asyncio.run(scenario())] == [0, 1, 0]
+
+    def test_foreign_pool_reports_only_max(self) -> None:
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeRedis(max_connections=3)
+        assert pool_stats(client) == {"max": 3}
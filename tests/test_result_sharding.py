@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from typing import Any
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from services.common.result_sharding import (  # noqa: E402
+    WriterLease,
+    shard_for,
+    shard_queue_name,
+    validate_shard,
+    writer_lease_key,
+)
+
+
+@pytest.fixture()
+def client() -> Any:
+    return fakeredis.FakeRedis()
+
+
+class TestShardAssignment:
+    def test_assignment_is_stable(self) -> None:
+        # Pinned: workers and writers of different releases must agree on shards.
+        assert [shard_for(f"ws-{index}", 4) for index in range(6)] == [2, 1, 1, 2, 1, 3]
+
+    def test_hosts_spread_over_shards(self) -> None:
+        counts = Counter(shard_for(f"ws-{index:05d}", 4) for index in range(4000))
+        assert sorted(counts) == [0, 1, 2, 3]
+        assert min(counts.values()) > 800
+
+    def test_single_shard_keeps_queue_name(self) -> None:
+        assert shard_for("ws-1", 1) == 0
+        assert shard_queue_name("results", 0, 1) == "results"
+        assert shard_queue_name("results", 2, 4) == "results:shard:2"
+
+    @pytest.mark.parametrize(("shards", "index"), [(0, 0), (4, 4), (4, -1)])
+    def test_invalid_shard_raises(self, shards: int, index: int) -> None:
+        with pytest.raises(ValueError):
+            validate_shard(shards, index)
+
+
+class TestWriterLease:
+    def test_only_one_writer_holds_the_lease(self, client: Any) -> None:
+        first = WriterLease(client, "results:shard:0", "writer-a")
+        second = WriterLease(client, "results:shard:0", "writer-b")
+
+        assert first.renew()
+        assert not second.renew()
+        assert first.renew()
+        assert client.get(writer_lease_key("results:shard:0")) == b"writer-a"
+
+    def test_released_lease_is_taken_over(self, client: Any) -> None:
+        first = WriterLease(client, "results:shard:0", "writer-a")
+        second = WriterLease(client, "results:shard:0", "writer-b")
+        first.renew()
+
+        second.release()
+        assert not second.renew()
+        first.release()
+        assert second.renew()
+
+    def test_expired_lease_is_taken_over(self, client: Any) -> None:
+        first = WriterLease(client, "results:shard:0", "writer-a", ttl_ms=30_000)
+        first.renew()
+        client.delete(writer_lease_key("results:shard:0"))  # what expiry does
+
+        assert WriterLease(client, "results:shard:0", "writer-b").renew()
+        assert not first.renew()
+
+    def test_acquire_gives_up_when_stopping(self, client: Any) -> None:
+        WriterLease(client, "results:shard:0", "writer-a").renew()
+        stopping = threading.Event()
+        stopping.set()
+        assert not WriterLease(client, "results:shard:0", "writer-b").acquire(stopping)
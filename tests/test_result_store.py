@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator, Sequence
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+from services.common.envelope import WIRE_FORMAT_JSON, ResultMessage, encode_result
+from services.common.payload_delta import DeltaEncoder
+from services.common.queue_transport import Delivery
+from services.result_writer import worker
+from services.result_writer.app import ResultWriterServicer
+from services.result_writer.sqlite_store import (
+    MAX_PAGE_SIZE,
+    ResultQuery,
+    SqliteResultStore,
+    open_result_reader,
+    shard_db_path,
+)
+from services.result_writer.store import SegmentStore
+from services.result_writer.worker import ResultWriter, open_result_store
+
+TS = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_result(index: int, host: str = "ws-1", payload: dict[str, Any] | None = None) -> ResultMessage:
+    return ResultMessage(
+        task_id=f"t{index}",
+        task_ids=[f"t{index}", f"r{index}"],
+        status="ok",
+        payload=payload or {"os": {"CurrentBuild": str(index)}},
+        ts=TS + timedelta(seconds=index),
+        host=host,
+    )
+
+
+@pytest.fixture()
+def store_dir(tmp_path: Path) -> Path:
+    return tmp_path / "results"
+
+
+class TestSegmentStore:
+    def test_lookup_by_task_id_and_host(self, store_dir: Path) -> None:
+        store = SegmentStore(store_dir)
+        store.append_many([make_result(1), make_result(2, host="ws-2"), make_result(3)])
+
+        assert store.get("t2") == make_result(2, host="ws-2")
+        assert store.get("r1") == make_result(1)
+        assert store.get("missing") is None
+        assert store.latest("ws-1") == make_result(3)
+        store.close()
+
+    def test_segments_rotate_by_size(self, store_dir: Path) -> None:
+        store = SegmentStore(store_dir, max_segment_bytes=400)
+        store.append_many([make_result(index) for index in range(10)])
+
+        assert store.stats()["segments"] > 2
+        assert all(path.stat().st_size <= 400 for path in store_dir.glob("*.log"))
+        assert [store.get(f"t{index}") for index in range(10)] == [make_result(index) for index in range(10)]
+        store.close()
+
+    def test_oldest_segments_are_deleted_beyond_limit(self, store_dir: Path) -> None:
+        store = SegmentStore(store_dir, max_segment_bytes=400, max_segments=2)
+        store.append_many([make_result(index) for index in range(10)])
+
+        assert len(list(store_dir.glob("*.log"))) == 2
+        assert store.get("t0") is None
+        assert store.get("t9") == make_result(9)
+        store.close()
+
+    def test_index_is_replayed_on_reopen(self, store_dir: Path) -> None:
+        store = SegmentStore(store_dir, max_segment_bytes=400)
+        store.append_many([make_result(index) for index in range(5)])
+        store.close()
+
+        reopened = SegmentStore(store_dir, max_segment_bytes=400)
+        reopened.append_many([make_result(5)])
+        assert reopened.get("t0") == make_result(0)
+        assert reopened.latest("ws-1") == make_result(5)
+        reopened.close()
+
+    def test_unindexed_tail_is_reindexed_and_torn_record_dropped(self, store_dir: Path) -> None:
+        store = SegmentStore(store_dir)
+        store.append_many([make_result(1)])
+        store.close()
+        segment = store_dir / "00000001.log"
+        with segment.open("ab") as log:
+            log.write(encode_result(make_result(2), WIRE_FORMAT_JSON) + b"\n")
+            log.write(b'{"task_id": "t3", "sta')
+
+        reopened = SegmentStore(store_dir)
+        assert reopened.get("t2") == make_result(2)
+        assert reopened.get("t3") is None
+        assert segment.read_bytes().endswith(b"\n")
+        assert len((store_dir / "00000001.idx").read_bytes().splitlines()) == 2
+        reopened.close()
+
+
+@pytest.fixture()
+def sqlite_store(tmp_path: Path) -> Iterator[SqliteResultStore]:
+    store = SqliteResultStore(tmp_path / "results.db")
+    yield store
+    store.close()
+
+
+class TestSqliteResultStore:
+    def test_lookup_by_task_id_and_host(self, sqlite_store: SqliteResultStore) -> None:
+        sqlite_store.append_many([make_result(1), make_result(3, host="ws-2"), make_result(2)])
+
+        assert sqlite_store.get("t3") == make_result(3, host="ws-2")
+        assert sqlite_store.get("r1") == make_result(1)
+        assert sqlite_store.get("missing") is None
+        assert sqlite_store.latest("ws-1") == make_result(2)
+        assert sqlite_store.stats() == {"results": 3, "hosts": 2}
+
+    def test_database_uses_wal_and_survives_reopen(self, tmp_path: Path) -> None:
+        store = SqliteResultStore(tmp_path / "results.db")
+        store.append_many([make_result(1)])
+        store.close()
+
+        reopened = SqliteResultStore(tmp_path / "results.db")
+        assert reopened.get("t1") == make_result(1)
+        assert reopened._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        reopened.close()
+
+    def test_failed_batch_is_rolled_back(self, sqlite_store: SqliteResultStore) -> None:
+        broken = MagicMock(task_ids=["t9"], host="ws-1", status="ok", ts=None)
+        with pytest.raises(AttributeError):
+            sqlite_store.append_many([make_result(1), broken])
+        assert sqlite_store.get("t1") is None
+        sqlite_store.append_many([make_result(1)])
+        assert sqlite_store.get("t1") == make_result(1)
+
+    def test_query_pages_newest_first(self, sqlite_store: SqliteResultStore) -> None:
+        sqlite_store.append_many([make_result(index, host=f"ws-{index % 2}") for index in range(7)])
+
+        seen: list[str] = []
+        token = ""
+        while True:
+            page, token = sqlite_store.query(ResultQuery(host="ws-0", page_size=2, page_token=token))
+            seen.extend(result.task_id for result in page)
+            if not token:
+                break
+        assert seen == ["t6", "t4", "t2", "t0"]
+
+    def test_query_filters_time_range_and_status(self, sqlite_store: SqliteResultStore) -> None:
+        error = ResultMessage(task_id="e1", task_ids=["e1"], status="error", error="boom", ts=TS, host="ws-1")
+        sqlite_store.append_many([make_result(index) for index in range(5)] + [error])
+
+        page, token = sqlite_store.query(ResultQuery(since=TS + timedelta(seconds=1), until=TS + timedelta(seconds=3)))
+        assert [result.task_id for result in page] == ["t2", "t1"]
+        assert token == ""
+        errors, _ = sqlite_store.query(ResultQuery(status="error"))
+        assert errors == [error]
+
+    def test_page_size_is_capped(self, sqlite_store: SqliteResultStore) -> None:
+        sqlite_store.append_many([make_result(index) for index in range(3)])
+        page, _ = sqlite_store.query(ResultQuery(page_size=MAX_PAGE_SIZE * 10))
+        assert len(page) == 3
+
+    def test_malformed_page_token_raises(self, sqlite_store: SqliteResultStore) -> None:
+        with pytest.raises(ValueError, match="page token"):
+            sqlite_store.query(ResultQuery(page_token="next"))
+
+
+class TestShardedSqliteResultStore:
+    @pytest.fixture()
+    def shards(self, tmp_path: Path) -> Iterator[list[SqliteResultStore]]:
+        stores = [SqliteResultStore(shard_db_path(tmp_path / "results.db", 3, index)) for index in range(3)]
+        yield stores
+        for store in stores:
+            store.close()
+
+    def test_each_shard_has_its_own_database(self, tmp_path: Path) -> None:
+        assert shard_db_path(tmp_path / "results.db", 1, 0) == tmp_path / "results.db"
+        assert shard_db_path(tmp_path / "results.db", 3, 2) == tmp_path / "shard-2" / "results.db"
+
+    def test_lookups_ask_every_shard(self, tmp_path: Path, shards: list[SqliteResultStore]) -> None:
+        shards[0].append_many([make_result(1, host="ws-1")])
+        # ws-1 moved to another shard after a change of RESULT_SHARDS.
+        shards[2].append_many([make_result(2, host="ws-1"), make_result(3, host="ws-2")])
+        reader = open_result_reader(tmp_path / "results.db", shards=3)
+
+        assert reader.get("t1") == make_result(1, host="ws-1")
+        assert reader.get("missing") is None
+        assert reader.latest("ws-1") == make_result(2, host="ws-1")
+        # A host split over two shards is counted in both.
+        assert reader.stats() == {"results": 3, "hosts": 3}
+        reader.close()
+
+    def test_query_pages_across_shards_without_gaps(self, tmp_path: Path, shards: list[SqliteResultStore]) -> None:
+        # Equal timestamps in several shards must neither repeat nor vanish between pages.
+        for index in range(12):
+            result = make_result(index % 4, host=f"ws-{index}")
+            shards[index % 3].append_many([replace(result, task_id=f"t{index}", task_ids=[f"t{index}"])])
+        reader = open_result_reader(tmp_path / "results.db", shards=3)
+
+        seen: list[str] = []
+        token = ""
+        while True:
+            page, token = reader.query(ResultQuery(page_size=5, page_token=token))
+            seen.extend(result.task_id for result in page)
+            if not token:
+                break
+        assert sorted(seen) == sorted(f"t{index}" for index in range(12))
+        assert len(seen) == 12
+        everything, _ = reader.query(ResultQuery(page_size=100))
+        assert [result.task_id for result in everything] == seen
+        assert [result.ts for result in everything] == sorted((result.ts for result in everything), reverse=True)
+
+        with pytest.raises(ValueError, match="page token"):
+            reader.query(ResultQuery(page_token="1.2"))
+        reader.close()
+
+    def test_page_boundary_between_shards_with_equal_timestamps(
+        self, tmp_path: Path, shards: list[SqliteResultStore]
+    ) -> None:
+        for shard, store in enumerate(shards):
+            store.append_many([replace(make_result(1), task_id=f"s{shard}-{row}", task_ids=[]) for row in range(2)])
+        shards[0].append_many([make_result(0)])
+        reader = open_result_reader(tmp_path / "results.db", shards=3)
+        # Newest first by (ts, shard, id): shard 2 before shard 1 before shard 0 at the same ts.
+        expected = ["s2-1", "s2-0", "s1-1", "s1-0", "s0-1", "s0-0", "t0"]
+
+        for page_size in (1, 2, 3, 4):
+            seen: list[str] = []
+            token = ""
+            while True:
+                page, token = reader.query(ResultQuery(page_size=page_size, page_token=token))
+                seen.extend(result.task_id for result in page)
+                if not token:
+                    break
+            assert seen == expected, page_size
+        reader.close()
+
+    def test_sharded_writers_fill_their_own_databases(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("RESULT_DB_PATH", str(tmp_path / "results.db"))
+        store = open_result_store(shards=2, shard_index=1)
+        assert isinstance(store, SqliteResultStore)
+        store.append_many([make_result(1)])
+        store.close()
+        assert (tmp_path / "shard-1" / "results.db").exists()
+        assert not (tmp_path / "results.db").exists()
+
+
+class TestResultWriterServicer:
+    def test_get_result(self, sqlite_store: SqliteResultStore) -> None:
+        sqlite_store.append_many([make_result(1)])
+        context = MagicMock()
+
+        response = ResultWriterServicer(sqlite_store).GetResult(MagicMock(task_id="r1"), context)
+
+        context.set_code.assert_not_called()
+        assert response.result.task_id == "t1"
+        assert list(response.result.task_ids) == ["t1", "r1"]
+        assert json.loads(response.result.payload_json) == {"os": {"CurrentBuild": "1"}}
+        assert response.result.ts_ms == int((TS + timedelta(seconds=1)).timestamp() * 1000)
+
+    def test_missing_result_is_not_found(self, sqlite_store: SqliteResultStore) -> None:
+        context = MagicMock()
+        ResultWriterServicer(sqlite_store).GetResult(MagicMock(task_id="missing"), context)
+        context.set_code.assert_called_once_with(grpc.StatusCode.NOT_FOUND)
+
+    def test_query_results(self, sqlite_store: SqliteResultStore) -> None:
+        sqlite_store.append_many([make_result(index) for index in range(3)])
+        request = MagicMock(host="ws-1", status="", since_ms=0, until_ms=0, page_size=2, page_token="")
+
+        response = ResultWriterServicer(sqlite_store).QueryResults(request, MagicMock())
+
+        assert [result.task_id for result in response.results] == ["t2", "t1"]
+        assert response.next_page_token
+
+    def test_bad_page_token_is_invalid_argument(self, sqlite_store: SqliteResultStore) -> None:
+        request = MagicMock(host="", status="", since_ms=0, until_ms=0, page_size=0, page_token="x")
+        context = MagicMock()
+        ResultWriterServicer(sqlite_store).QueryResults(request, context)
+        context.set_code.assert_called_once_with(grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_reads_without_store_fail_precondition(self) -> None:
+        context = MagicMock()
+        ResultWriterServicer().GetResult(MagicMock(task_id="t1"), context)
+        context.set_code.assert_called_once_with(grpc.StatusCode.FAILED_PRECONDITION)
+
+
+class TestResultWriterStore:
+    def test_every_result_is_stored_with_deltas_applied(self, tmp_path: Path, store_dir: Path) -> None:
+        store = SegmentStore(store_dir)
+        writer = ResultWriter(str(tmp_path / "payload.json"), flush_interval_seconds=1.0, store=store)
+        encoder = DeltaEncoder(full_every=100)
+        full = {"os": {"CurrentBuild": "1"}, "hotfixes": ["KB1"]}
+        updated = {**full, "hotfixes": ["KB1", "KB2"]}
+        for index, payload in enumerate((full, full, updated)):
+            result = encoder.encode(make_result(index, payload=payload))
+            writer.add(Delivery(data=encode_result(result, WIRE_FORMAT_JSON)))
+        writer.add(Delivery(data=b"not json"))
+        writer.flush()
+
+        assert store.get("t1") == make_result(1, payload=full)
+        assert store.get("t2") == make_result(2, payload=updated)
+        assert json.loads((tmp_path / "payload.json").read_text(encoding="utf-8")) == updated
+        assert store.stats()["tasks"] == 6
+        store.close()
+
+    def test_unmerged_results_are_stored_without_payload(self, tmp_path: Path, store_dir: Path) -> None:
+        store = SegmentStore(store_dir)
+        writer = ResultWriter(str(tmp_path / "payload.json"), flush_interval_seconds=1.0, store=store)
+        encoder = DeltaEncoder(full_every=100)
+        full = {"os": {"CurrentBuild": "1"}, "hotfixes": ["KB1"]}
+        encoder.encode(make_result(0, payload=full))
+        delta = encoder.encode(make_result(1, payload={**full, "hotfixes": ["KB2"]}))
+        newest = make_result(3, payload=full)
+        for result in (delta, newest, make_result(2, payload=full)):
+            writer.add(Delivery(data=encode_result(result, WIRE_FORMAT_JSON)))
+        writer.flush()
+
+        skipped, stale = store.get("t1"), store.get("t2")
+        assert skipped is not None and stale is not None
+        assert (skipped.status, skipped.payload, skipped.unchanged_sections) == ("delta-skipped", None, {})
+        assert (stale.status, stale.payload) == ("stale", None)
+        assert store.get("t3") == newest
+        store.close()
+
+    def test_store_failure_acks_nothing(self, tmp_path: Path, store_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        store = SegmentStore(store_dir)
+        writer = ResultWriter(str(tmp_path / "payload.json"), store=store)
+
+        def fail(results: Any) -> None:
+            raise OSError("disk full")
+
+        monkeypatch.setattr(store, "append_many", fail)
+        result = Delivery(data=encode_result(make_result(1), WIRE_FORMAT_JSON))
+        writer.add(result)
+        assert writer.flush() == []
+        monkeypatch.undo()
+
+        writer.add(result)
+        assert writer.flush() == [result]
+        assert store.get("t1") == make_result(1)
+        store.close()
+
+    def test_results_of_a_failed_write_are_stored_once(
+        self, tmp_path: Path, sqlite_store: SqliteResultStore, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        writer = ResultWriter(str(tmp_path / "{host}.json"), flush_interval_seconds=1.0, store=sqlite_store)
+        real_write = worker.write_payloads_atomic
+
+        def failing_write(items: Sequence[tuple[Path, dict[str, Any]]], durability: str) -> float:
+            if any(path.name == "ws-2.json" for path, _ in items):
+                raise OSError("disk full")
+            return real_write(items, durability)
+
+        monkeypatch.setattr(worker, "write_payloads_atomic", failing_write)
+        good, bad = (
+            Delivery(data=encode_result(make_result(1, host=host), WIRE_FORMAT_JSON)) for host in ("ws-1", "ws-2")
+        )
+        writer.add(good)
+        writer.add(bad)
+        assert writer.flush() == [good]
+        assert sqlite_store.get("t1") is not None
+        assert sqlite_store.stats()["results"] == 1
+        monkeypatch.undo()
+
+        writer.add(bad)
+        assert writer.flush() == [bad]
+        assert sqlite_store.stats()["results"] == 2
+        assert sqlite_store.latest("ws-2") == make_result(1, host="ws-2")
+
+    def test_writer_fills_sqlite_store(self, tmp_path: Path, sqlite_store: SqliteResultStore) -> None:
+        writer = ResultWriter(str(tmp_path / "payload.json"), flush_interval_seconds=1.0, store=sqlite_store)
+        for index in range(3):
+            writer.add(Delivery(data=encode_result(make_result(index), WIRE_FORMAT_JSON)))
+        assert len(writer.flush()) == 3
+        assert sqlite_store.stats()["results"] == 3
+        assert sqlite_store.latest("ws-1") == make_result(2)
+
+    def test_store_is_chosen_from_environment(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("RESULT_DB_PATH", str(tmp_path / "results.db"))
+        store = open_result_store()
+        assert isinstance(store, SqliteResultStore)
+        store.close()
+
+        monkeypatch.setenv("RESULT_STORE_DIR", str(tmp_path / "segments"))
+        with pytest.raises(ValueError, match="not both"):
+            open_result_store()
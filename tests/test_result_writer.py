@@ -1,9 +1,34 @@
 from __future__ import annotations
 
 import json
+import os
 from pathlib import Path
 
-from legacy.src.agent.result_writer import write_payload_atomic
+import pytest
+
+from legacy.src.agent.result_writer import (
+    DURABILITY_FSYNC_FILE,
+    DURABILITY_FSYNC_FILE_AND_DIR,
+    DURABILITY_NONE,
+    FsyncStats,
+    PayloadFingerprints,
+    payload_fingerprint,
+    write_payload_atomic,
+    write_payloads_atomic,
+)
+
+
+@pytest.fixture()
+def fsyncs(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    calls: list[int] = []
+    real_fsync = os.fsync
+
+    def counting_fsync(fd: int) -> None:
+        calls.append(fd)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", counting_fsync)
+    return calls
 
 
 class TestWritePayloadAtomic:
@@ -52,3 +77,79 @@ class TestWritePayloadAtomic:
 
         content = payload_path.read_text(encoding="utf-8")
         assert "  " in content  # indented with 2 spaces
+
+
+class TestDurability:
+    def test_none_does_not_fsync(self, tmp_path: Path, fsyncs: list[int]) -> None:
+        write_payload_atomic(tmp_path / "payload.json", {"os": {}}, DURABILITY_NONE)
+        assert fsyncs == []
+
+    def test_fsync_file(self, tmp_path: Path, fsyncs: list[int]) -> None:
+        write_payload_atomic(tmp_path / "payload.json", {"os": {}}, DURABILITY_FSYNC_FILE)
+        assert len(fsyncs) == 1
+
+    @pytest.mark.skipif(os.name == "nt", reason="directories are not fsynced on Windows")
+    def test_group_commit_fsyncs_each_directory_once(self, tmp_path: Path, fsyncs: list[int]) -> None:
+        items = [(tmp_path / f"{host}.json", {"os": {"host": host}}) for host in ("a", "b", "c")]
+        items.append((tmp_path / "nested" / "d.json", {"os": {}}))
+
+        write_payloads_atomic(items, DURABILITY_FSYNC_FILE_AND_DIR)
+
+        assert len(fsyncs) == len(items) + 2
+        assert json.loads((tmp_path / "b.json").read_text(encoding="utf-8")) == {"os": {"host": "b"}}
+
+    def test_failed_group_leaves_no_temp_files(self, tmp_path: Path) -> None:
+        (tmp_path / "payload.json").write_text("{}", encoding="utf-8")
+        items = [(tmp_path / "payload.json", {"os": {}}), (tmp_path / "bad.json", {"os": object()})]
+
+        with pytest.raises(TypeError):
+            write_payloads_atomic(items, DURABILITY_FSYNC_FILE)
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["payload.json"]
+        assert (tmp_path / "payload.json").read_text(encoding="utf-8") == "{}"
+
+    def test_fsync_stats(self) -> None:
+        stats = FsyncStats()
+        stats.record(2, 0.004)
+        stats.record(1, 0.001)
+        stats.record_skip()
+        assert stats.as_dict() == {
+            "flushes": 2,
+            "files": 3,
+            "skipped": 1,
+            "fsync_ms_total": 5.0,
+            "fsync_ms_max": 4.0,
+        }
+
+
+class TestPayloadFingerprints:
+    def test_committed_payload_is_unchanged(self, tmp_path: Path) -> None:
+        payload_path = tmp_path / "payload.json"
+        fingerprints = PayloadFingerprints()
+        fingerprint = payload_fingerprint({"os": {"ProductName": "Test"}})
+
+        assert not fingerprints.is_unchanged(payload_path, fingerprint)
+        fingerprints.commit(payload_path, fingerprint)
+        assert fingerprints.is_unchanged(payload_path, fingerprint)
+        assert not fingerprints.is_unchanged(payload_path, payload_fingerprint({"os": {}}))
+
+    def test_fingerprint_is_recovered_from_disk(self, tmp_path: Path) -> None:
+        payload_path = tmp_path / "payload.json"
+        payload = {"os": {"ProductName": "Test"}, "hotfixes": ["KB1"]}
+        write_payload_atomic(payload_path, payload)
+
+        assert PayloadFingerprints().is_unchanged(payload_path, payload_fingerprint(payload))
+
+    def test_forget_rereads_disk(self, tmp_path: Path) -> None:
+        payload_path = tmp_path / "payload.json"
+        fingerprints = PayloadFingerprints()
+        fingerprints.commit(payload_path, payload_fingerprint({"os": {}}))
+
+        fingerprints.forget(payload_path)
+        assert not fingerprints.is_unchanged(payload_path, payload_fingerprint({"os": {}}))
+
+    def test_unreadable_file_is_never_unchanged(self, tmp_path: Path) -> None:
+        payload_path = tmp_path / "payload.json"
+        payload_path.write_text("{truncated", encoding="utf-8")
+
+        assert not PayloadFingerprints().is_unchanged(payload_path, payload_fingerprint({}))
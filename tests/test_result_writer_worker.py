@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+import redis
+
+from services.common.envelope import WIRE_FORMAT_JSON, ResultMessage, encode_result
+from services.common.payload_delta import DeltaEncoder
+from services.common.queue_transport import Delivery
+from services.common.result_sharding import shard_for
+from services.result_writer import worker
+from services.result_writer.worker import ResultPump, ResultWriter, load_payload_state, payload_path_for
+
+TS = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+PAYLOAD: dict[str, Any] = {
+    "os": {"ProductName": "Windows 11", "CurrentBuild": "22631"},
+    "software": [{"DisplayName": "7-Zip", "DisplayVersion": "23.01"}],
+    "hotfixes": ["KB5031455"],
+}
+
+
+def delivery(payload: dict[str, Any] | None, seconds: int = 0, host: str = "", task_id: str = "t1") -> Delivery:
+    result = ResultMessage(
+        task_id=task_id,
+        task_ids=[task_id],
+        status="ok" if payload is not None else "error",
+        payload=payload,
+        ts=TS + timedelta(seconds=seconds),
+        host=host,
+    )
+    return Delivery(data=encode_result(result, WIRE_FORMAT_JSON))
+
+
+def read_json(path: Path) -> Any:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def payload_path(tmp_path: Path) -> Path:
+    return tmp_path / "payload.json"
+
+
+@pytest.fixture()
+def writes(monkeypatch: pytest.MonkeyPatch) -> list[Path]:
+    written: list[Path] = []
+    real_write = worker.write_payloads_atomic
+
+    def counting_write(items: Sequence[tuple[Path, dict[str, Any]]], durability: str) -> float:
+        written.extend(path for path, _ in items)
+        return real_write(items, durability)
+
+    monkeypatch.setattr(worker, "write_payloads_atomic", counting_write)
+    return written
+
+
+class TestImmediateWrites:
+    def test_every_result_is_written_and_acked(self, payload_path: Path, writes: list[Path]) -> None:
+        writer = ResultWriter(str(payload_path))
+        first, second = delivery(PAYLOAD), delivery({**PAYLOAD, "hotfixes": []}, seconds=1)
+
+        writer.add(first)
+        assert writer.due()
+        assert writer.flush() == [first]
+        writer.add(second)
+        assert writer.flush() == [second]
+        assert len(writes) == 2
+        assert read_json(payload_path)["hotfixes"] == []
+
+    def test_error_and_malformed_results_are_consumed_without_write(
+        self, payload_path: Path, writes: list[Path]
+    ) -> None:
+        writer = ResultWriter(str(payload_path))
+        error, malformed = delivery(None), Delivery(data=b"not json")
+        writer.add(error)
+        writer.add(malformed)
+        assert writer.due()
+        assert writer.flush() == [error, malformed]
+        assert writes == []
+
+    def test_unchanged_payload_is_not_rewritten(self, payload_path: Path, writes: list[Path]) -> None:
+        writer = ResultWriter(str(payload_path))
+        writer.add(delivery(PAYLOAD))
+        writer.flush()
+        writer.add(delivery(PAYLOAD, seconds=1))
+        writer.flush()
+        assert len(writes) == 1
+        assert writer.fsync_stats.skipped == 1
+
+    def test_failed_write_is_not_acked_and_state_reloads(
+        self, payload_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        writer = ResultWriter(str(payload_path))
+        writer.add(delivery(PAYLOAD))
+        writer.flush()
+
+        def fail(items: Sequence[tuple[Path, dict[str, Any]]], durability: str) -> float:
+            raise OSError("disk full")
+
+        monkeypatch.setattr(worker, "write_payloads_atomic", fail)
+        writer.add(delivery({**PAYLOAD, "hotfixes": []}, seconds=1))
+        assert writer.flush() == []
+        monkeypatch.undo()
+
+        retried = delivery({**PAYLOAD, "hotfixes": []}, seconds=1)
+        writer.add(retried)
+        assert writer.flush() == [retried]
+        assert read_json(payload_path)["hotfixes"] == []
+
+
+class TestCoalescing:
+    def test_burst_is_written_once_with_newest_result(self, payload_path: Path, writes: list[Path]) -> None:
+        clock = FakeClock()
+        writer = ResultWriter(str(payload_path), flush_interval_seconds=1.0, clock=clock)
+        burst = [delivery({**PAYLOAD, "hotfixes": [f"KB{i}"]}, seconds=i, task_id=f"t{i}") for i in range(50)]
+        for item in burst:
+            writer.add(item)
+        assert not writer.due()
+        assert writer.seconds_until_due() == 1.0
+
+        clock.now = 1.0
+        assert writer.due()
+        assert writer.flush() == burst
+        assert len(writes) == 1
+        assert read_json(payload_path)["hotfixes"] == ["KB49"]
+
+    def test_older_result_does_not_overwrite_newer(self, payload_path: Path) -> None:
+        writer = ResultWriter(str(payload_path), flush_interval_seconds=1.0)
+        writer.add(delivery({**PAYLOAD, "hotfixes": ["new"]}, seconds=10))
+        stale = delivery({**PAYLOAD, "hotfixes": ["old"]}, seconds=5)
+        writer.add(stale)
+        assert stale in writer.flush()
+        assert read_json(payload_path)["hotfixes"] == ["new"]
+
+    def test_flush_when_batch_is_full(self, payload_path: Path) -> None:
+        writer = ResultWriter(str(payload_path), flush_interval_seconds=60.0, flush_max_results=3)
+        for i in range(3):
+            assert not writer.due()
+            writer.add(delivery({**PAYLOAD, "hotfixes": [str(i)]}, seconds=i))
+        assert writer.due()
+
+    def test_hosts_are_written_to_their_own_files(self, tmp_path: Path, writes: list[Path]) -> None:
+        writer = ResultWriter(str(tmp_path / "{host}" / "payload.json"), flush_interval_seconds=1.0)
+        for i in range(4):
+            writer.add(delivery({**PAYLOAD, "hotfixes": [str(i)]}, seconds=i, host=f"ws-{i % 2}"))
+        writer.flush()
+        assert sorted(path.parent.name for path in writes) == ["ws-0", "ws-1"]
+        assert read_json(tmp_path / "ws-1" / "payload.json")["hotfixes"] == ["3"]
+
+    def test_targets_of_a_flush_share_one_group_commit(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        groups: list[list[Path]] = []
+        real_write = worker.write_payloads_atomic
+
+        def recording_write(items: Sequence[tuple[Path, dict[str, Any]]], durability: str) -> float:
+            groups.append([path for path, _ in items])
+            return real_write(items, durability)
+
+        monkeypatch.setattr(worker, "write_payloads_atomic", recording_write)
+        writer = ResultWriter(
+            str(tmp_path / "{host}" / "payload.json"), flush_interval_seconds=1.0, durability="fsync-file"
+        )
+        for host in ("ws-0", "ws-1", "ws-2"):
+            writer.add(delivery(PAYLOAD, host=host))
+        assert len(writer.flush()) == 3
+        assert len(groups) == 1 and len(groups[0]) == 3
+        assert writer.fsync_stats.flushes == 1
+        assert writer.fsync_stats.files == 3
+
+    def test_one_bad_target_does_not_block_the_group(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        real_write = worker.write_payloads_atomic
+
+        def failing_write(items: Sequence[tuple[Path, dict[str, Any]]], durability: str) -> float:
+            if any(path.parent.name == "ws-1" for path, _ in items):
+                raise OSError("read-only file system")
+            return real_write(items, durability)
+
+        monkeypatch.setattr(worker, "write_payloads_atomic", failing_write)
+        writer = ResultWriter(str(tmp_path / "{host}" / "payload.json"), flush_interval_seconds=1.0)
+        deliveries = {host: delivery(PAYLOAD, host=host, task_id=host) for host in ("ws-0", "ws-1", "ws-2")}
+        for item in deliveries.values():
+            writer.add(item)
+
+        assert writer.flush() == [deliveries["ws-0"], deliveries["ws-2"]]
+        assert read_json(tmp_path / "ws-2" / "payload.json") == PAYLOAD
+        assert not (tmp_path / "ws-1" / "payload.json").exists()
+
+        monkeypatch.undo()
+        writer.add(deliveries["ws-1"])
+        assert writer.flush() == [deliveries["ws-1"]]
+
+
+class TestSharding:
+    def test_results_of_other_shards_are_held_for_forwarding(self, tmp_path: Path) -> None:
+        hosts = {shard_for(f"ws-{index}", 2): f"ws-{index}" for index in range(10)}
+        writer = ResultWriter(str(tmp_path / "{host}" / "payload.json"), shards=2, shard_index=0)
+        own, foreign = delivery(PAYLOAD, host=hosts[0]), delivery(PAYLOAD, host=hosts[1])
+
+        writer.add(own)
+        writer.add(foreign)
+
+        assert writer.flush() == [own]
+        assert writer.take_misrouted() == [(1, foreign)]
+        assert writer.take_misrouted() == []
+        assert not (tmp_path / hosts[1]).exists()
+
+    def test_discard_drops_unwritten_results(self, payload_path: Path) -> None:
+        writer = ResultWriter(str(payload_path), flush_interval_seconds=1.0)
+        writer.add(delivery(PAYLOAD))
+        writer.discard()
+        assert writer.flush() == []
+        assert not payload_path.exists()
+
+
+class TestDeltas:
+    def send(self, writer: ResultWriter, encoder: DeltaEncoder, payload: dict[str, Any], seconds: int) -> None:
+        result = ResultMessage(
+            task_id="t1", task_ids=["t1"], status="ok", payload=payload, ts=TS + timedelta(seconds=seconds)
+        )
+        writer.add(Delivery(data=encode_result(encoder.encode(result), WIRE_FORMAT_JSON)))
+        writer.flush()
+
+    def test_deltas_rebuild_full_payload(self, payload_path: Path) -> None:
+        writer, encoder = ResultWriter(str(payload_path)), DeltaEncoder(full_every=100)
+        updated = {**PAYLOAD, "software": []}
+        self.send(writer, encoder, PAYLOAD, 0)
+        self.send(writer, encoder, updated, 1)
+        assert read_json(payload_path) == updated
+
+    def test_delta_with_unknown_base_waits_for_full_payload(self, payload_path: Path) -> None:
+        encoder = DeltaEncoder(full_every=3)
+        encoder.encode(ResultMessage(task_id="lost", status="ok", payload=PAYLOAD, ts=TS))
+        writer = ResultWriter(str(payload_path))
+        self.send(writer, encoder, PAYLOAD, 1)
+        assert not payload_path.exists()
+
+        self.send(writer, encoder, PAYLOAD, 2)
+        self.send(writer, encoder, PAYLOAD, 3)
+        assert read_json(payload_path) == PAYLOAD
+
+    def test_state_is_recovered_from_disk(self, payload_path: Path) -> None:
+        encoder = DeltaEncoder(full_every=100)
+        self.send(ResultWriter(str(payload_path)), encoder, PAYLOAD, 0)
+
+        self.send(ResultWriter(str(payload_path)), encoder, {**PAYLOAD, "hotfixes": []}, 1)
+        assert read_json(payload_path)["software"] == PAYLOAD["software"]
+
+    def test_unreadable_file_gives_empty_state(self, payload_path: Path) -> None:
+        payload_path.write_text("{broken", encoding="utf-8")
+        assert load_payload_state(payload_path).payload == {}
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.published: list[bytes] = []
+        self.acked: list[Delivery] = []
+        self.failures = 0
+
+    def publish(self, messages: Sequence[bytes]) -> None:
+        self._maybe_fail()
+        self.published.extend(messages)
+
+    def ack(self, deliveries: Sequence[Delivery]) -> None:
+        self._maybe_fail()
+        self.acked.extend(deliveries)
+
+    def _maybe_fail(self) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise redis.ConnectionError("connection reset")
+
+
+class FakeLease:
+    def __init__(self) -> None:
+        self.owned = True
+        self.failures = 0
+
+    def renew(self) -> bool:
+        if self.failures:
+            self.failures -= 1
+            raise redis.ConnectionError("connection reset")
+        return self.owned
+
+
+def make_pump(writer: ResultWriter) -> tuple[ResultPump, FakeTransport, FakeLease, FakeTransport]:
+    results, lease, forwarded = FakeTransport(), FakeLease(), FakeTransport()
+    return ResultPump(writer, results, lease, lambda shard: forwarded), results, lease, forwarded  # type: ignore[arg-type]
+
+
+class TestResultPump:
+    def test_failed_ack_is_retried(self, payload_path: Path, writes: list[Path]) -> None:
+        pump, results, _, _ = make_pump(ResultWriter(str(payload_path)))
+        first = delivery(PAYLOAD)
+        pump.add([first])
+        results.failures = 1
+
+        with pytest.raises(redis.RedisError):
+            pump.run()
+        assert results.acked == [] and not pump.idle()
+
+        pump.run()
+        assert results.acked == [first]
+        assert writes == [payload_path]
+        assert pump.idle()
+
+    def test_failed_lease_renewal_keeps_results(self, payload_path: Path, writes: list[Path]) -> None:
+        pump, results, lease, _ = make_pump(ResultWriter(str(payload_path)))
+        first, second = delivery(PAYLOAD, task_id="t1"), delivery(PAYLOAD, seconds=1, task_id="t2")
+        pump.add([first, second])
+        lease.failures = 1
+
+        with pytest.raises(redis.RedisError):
+            pump.run()
+        assert writes == []
+
+        pump.run()
+        assert results.acked == [first, second]
+        assert read_json(payload_path) == PAYLOAD
+
+    def test_failed_forward_is_retried_without_duplicates(self, tmp_path: Path) -> None:
+        hosts = [f"pc-{n}" for n in range(20)]
+        other = next(host for host in hosts if shard_for(host, 2) == 1)
+        writer = ResultWriter(str(tmp_path / "{host}.json"), shards=2, shard_index=0)
+        pump, results, _, forwarded = make_pump(writer)
+        misrouted = [delivery(PAYLOAD, host=other, task_id="t1"), delivery(PAYLOAD, host=other, task_id="t2")]
+        pump.add(misrouted)
+        forwarded.failures = 1
+
+        with pytest.raises(redis.RedisError):
+            pump.run()
+        pump.run()
+        assert forwarded.published == [item.data for item in misrouted]
+        assert results.acked == misrouted
+
+    def test_lost_lease_drops_unwritten_results(self, payload_path: Path, writes: list[Path]) -> None:
+        pump, results, lease, _ = make_pump(ResultWriter(str(payload_path)))
+        lease.owned = False
+        pump.add([delivery(PAYLOAD)])
+        pump.run()
+        assert writes == [] and results.acked == []
+        assert pump.idle()
+
+
+def test_payload_path_for_sanitizes_host() -> None:
+    assert payload_path_for("/data/{host}.json", "../WS 01") == Path("/data/___WS_01.json")
+    assert payload_path_for("/data/{host}/payload.json", "..") == Path("/data/__/payload.json")
+    assert payload_path_for("/data/{host}/payload.json", ".") == Path("/data/_/payload.json")
+    assert payload_path_for("/data/{host}.json", ".hidden") == Path("/data/_hidden.json")
+    assert payload_path_for("/data/{host}.json", "ws-01.corp.local") == Path("/data/ws-01.corp.local.json")
+    assert payload_path_for("/data/{host}.json", "") == Path("/data/unknown.json")
+    assert payload_path_for("/data/payload.json", "ws-1") == Path("/data/payload.json")
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import sys
+from typing import Any
+
+import pytest
+
+from legacy.src.agent.inventory.simulated import SimulatedRegistry
+from legacy.src.agent.inventory.windows_registry import (
+    REG_DWORD,
+    REG_MULTI_SZ,
+    REG_SZ,
+    FieldSpec,
+    as_number,
+    collect_windows_inventory,
+    pick_fields,
+)
+
+CURRENT_VERSION = "HKEY_LOCAL_MACHINE\\Software\\Microsoft\\Windows NT\\CurrentVersion"
+
+
+class CountingWinreg(SimulatedRegistry):
+    """Fake ``winreg`` module that records which registry calls were made."""
+
+    def __init__(self, values: dict[str, Any]) -> None:
+        super().__init__({CURRENT_VERSION: values})
+        self.calls: list[str] = []
+
+    def QueryInfoKey(self, key: Any) -> tuple[int, int, int]:  # noqa: N802
+        self.calls.append("QueryInfoKey")
+        return super().QueryInfoKey(key)
+
+    def EnumValue(self, key: Any, index: int) -> tuple[str, Any, int]:  # noqa: N802
+        self.calls.append("EnumValue")
+        return super().EnumValue(key, index)
+
+    def QueryValueEx(self, key: Any, value_name: str) -> tuple[Any, int]:  # noqa: N802
+        self.calls.append("QueryValueEx")
+        return super().QueryValueEx(key, value_name)
+
+
+@pytest.fixture()
+def fake_winreg(monkeypatch: pytest.MonkeyPatch) -> CountingWinreg:
+    winreg = CountingWinreg(
+        {
+            "ProductName": "Windows 10 Pro",
+            "ReleaseId": "2009",
+            "CurrentBuildNumber": "19045",
+            "ubr": 3448,
+            "InstallDate": 1672531200,
+            "EditionID": "Professional",
+        }
+    )
+    monkeypatch.setitem(sys.modules, "winreg", winreg)
+    return winreg
+
+
+class TestCollectWindowsInventory:
+    def test_reads_key_in_one_enumeration_pass(self, fake_winreg: CountingWinreg) -> None:
+        payload = collect_windows_inventory()
+        assert payload == {
+            "os": {
+                "ProductName": "Windows 10 Pro",
+                "DisplayVersion": "2009",
+                "CurrentBuild": "19045",
+                "UBR": "3448",
+                "InstallDate": "1672531200",
+                "EditionID": "Professional",
+            }
+        }
+        assert fake_winreg.calls == ["QueryInfoKey"] + ["EnumValue"] * 6
+
+    def test_without_winreg_raises_runtime_error(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setitem(sys.modules, "winreg", None)
+        with pytest.raises(RuntimeError, match="only on Windows"):
+            collect_windows_inventory()
+
+
+class TestPickFields:
+    def test_blank_value_falls_back(self) -> None:
+        values = {"displayversion": ("", REG_SZ), "releaseid": ("1809", REG_SZ)}
+        assert pick_fields(values, [FieldSpec("DisplayVersion", fallbacks=("ReleaseId",))]) == {
+            "DisplayVersion": "1809"
+        }
+
+    def test_missing_field_is_blank(self) -> None:
+        assert pick_fields({}, [FieldSpec("EditionID")]) == {"EditionID": ""}
+
+    def test_multi_string_is_joined(self) -> None:
+        assert pick_fields({"x": (["a", "b"], REG_MULTI_SZ)}, [FieldSpec("x")]) == {"x": "a, b"}
+
+    @pytest.mark.parametrize(
+        ("value", "value_type", "expected"),
+        [(3448, REG_DWORD, "3448"), ("0042", REG_SZ, "42"), ("n/a", REG_SZ, "")],
+    )
+    def test_number_coercion(self, value: Any, value_type: int, expected: str) -> None:
+        assert as_number(value, value_type) == expected